@@ -0,0 +1,117 @@
+import os
+import random
+from typing import List
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+
+WORDS = (
+    "Netzwerk Sicherheit Konfiguration Server Client Datenbank Protokoll Analyse "
+    "Anforderung Prozess Projekt Qualität Risiko Schnittstelle Benutzer System "
+    "Architektur Dokumentation Test Betrieb Wartung Planung Umsetzung Kontrolle"
+).split()
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_pdf(path: str, pages: List[List[str]]):
+    """
+    Minimal text-only PDF (Helvetica, one line per entry) readable by pypdf.
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+def write_pptx(path: str, slides: int, rng: random.Random):
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    for k in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Folie {k + 1}: {rng.choice(WORDS)}"
+        body = slide.placeholders[1].text_frame
+        body.text = _sentence(rng)
+        for _ in range(4):
+            body.add_paragraph().text = _sentence(rng)
+        box = slide.shapes.add_textbox(Inches(1), Inches(6), Inches(8), Inches(1))
+        box.text_frame.text = _sentence(rng, 30)
+    prs.save(path)
+
+def write_assignment(path: str, tasks: int, rng: random.Random):
+    doc = Document()
+    doc.add_heading(f"Auftrag {os.path.splitext(os.path.basename(path))[0]}", level=1)
+    doc.add_paragraph(_sentence(rng, 40))
+    for k in range(1, tasks + 1):
+        doc.add_heading(f"Teilaufgabe {k}", level=2)
+        doc.add_paragraph(_sentence(rng, 25))
+        doc.add_paragraph("Antwort:")
+    doc.save(path)
+
+def write_template(path: str, tasks: int, pages: int, rng: random.Random):
+    """
+    Large assignment template: the first half of the tasks in an answer
+    table, the rest as headings with `pages` pages of text spread between them.
+    """
+    doc = Document()
+    doc.add_heading("Auftrag Vorlage", level=1)
+    table = doc.add_table(rows=0, cols=2)
+    for k in range(1, tasks // 2 + 1):
+        cells = table.add_row().cells
+        cells[0].text = f"Teilaufgabe {k}"
+        cells[1].text = "Lösung: ..."
+    # Roughly 8 paragraphs of 40 words per page
+    filler = max(1, pages * 8 // max(1, tasks - tasks // 2))
+    for k in range(tasks // 2 + 1, tasks + 1):
+        doc.add_heading(f"Teilaufgabe {k}", level=2)
+        for _ in range(filler):
+            doc.add_paragraph(_sentence(rng, 40))
+        doc.add_paragraph("Antwort:")
+    doc.save(path)
+
+def make_hz(base_path: str, name: str, assignments: int = 3, tasks: int = 3, pdfs: int = 2, pdf_pages: int = 50, pptx: int = 1, pptx_slides: int = 40, seed: int = 0) -> str:
+    """
+    Creates a synthetic HZ folder (Input/Assignments/Solutions) and returns its path.
+    Content is deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    hz_path = os.path.join(base_path, name)
+    for d in ["Input", "Assignments", "Solutions"]:
+        os.makedirs(os.path.join(hz_path, d), exist_ok=True)
+
+    for k in range(pdfs):
+        pages = [[_sentence(rng) for _ in range(60)] for _ in range(pdf_pages)]
+        write_pdf(os.path.join(hz_path, "Input", f"Skript_{k + 1}.pdf"), pages)
+    for k in range(pptx):
+        write_pptx(os.path.join(hz_path, "Input", f"Folien_{k + 1}.pptx"), pptx_slides, rng)
+    for k in range(assignments):
+        write_assignment(os.path.join(hz_path, "Assignments", f"Auftrag_{k + 1}.docx"), tasks, rng)
+    return hz_path
@@ -0,0 +1,48 @@
+import time
+import resource
+import threading
+import tracemalloc
+from typing import Dict
+
+class Probe:
+    """
+    Measures a benchmark run: wall clock, peak thread count (sampled),
+    peak Python heap (tracemalloc) and peak RSS of this process and its
+    children (e.g. the ingestion process pool).
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.results: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._peak_threads = 0
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._peak_threads = max(self._peak_threads, threading.active_count())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "Probe":
+        tracemalloc.start()
+        self._peak_threads = threading.active_count()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._start
+        self._stop.set()
+        self._sampler.join()
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # ru_maxrss is in KiB on Linux
+        self.results = {
+            "wall_s": wall,
+            # The sampler itself is not counted
+            "peak_threads": self._peak_threads - 1,
+            "peak_heap_mb": heap_peak / 2**20,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "peak_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        }
+        return False
@@ -0,0 +1,190 @@
+import os
+import json
+import asyncio
+import tempfile
+import typer
+from rich.console import Console
+from rich.table import Table
+import random
+import time
+from enum import Enum
+from benchmarks.fixtures import make_hz, write_template
+from benchmarks.metrics import Probe
+from src.agent.core import Agent
+from src.ingestion.index import HZIndex
+from src.ingestion.loader import load_many
+from src.llm.mock import MockConfig
+from src.utils.docx_editor import integrate_solution_to_docx
+
+app = typer.Typer()
+console = Console()
+
+class Engine(str, Enum):
+    thread = "thread"
+    asyncio = "async"
+    batch = "batch"
+
+def _report(title: str, results: dict, json_out: str):
+    table = Table(title=title)
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    for key, value in results.items():
+        table.add_row(key, f"{value:.3f}" if isinstance(value, float) else str(value))
+    console.print(table)
+    if json_out:
+        with open(json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+def _workspace(workdir: str) -> str:
+    path = os.path.abspath(workdir or tempfile.mkdtemp(prefix="ailb_bench_"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+@app.command()
+def pipeline(
+    assignments: int = typer.Option(3, help="Assignments in the synthetic HZ"),
+    tasks: int = typer.Option(5, help="Tasks per generated plan"),
+    engine: Engine = typer.Option(Engine.thread, help="Execution engine of the agent"),
+    max_concurrency: int = typer.Option(0, help="Max in-flight LLM calls (0 = agent default)"),
+    latency_ms: float = typer.Option(800.0, help="Median mock latency per call"),
+    latency_sigma: float = typer.Option(0.5, help="Lognormal spread of the latency"),
+    tokens_per_sec: float = typer.Option(80.0, help="Mock output speed (0 = instant)"),
+    error_rate: float = typer.Option(0.0, help="Share of calls failing with a 500"),
+    rate_limit_rate: float = typer.Option(0.0, help="Share of calls failing with a 429"),
+    qa_fail_rate: float = typer.Option(0.0, help="Share of QA reviews that do not PASS"),
+    qa_candidates: int = typer.Option(1, help="Candidate drafts per task (ranked in one QA call)"),
+    pdf_pages: int = typer.Option(20, help="Pages per synthetic input PDF"),
+    summarize_inputs: bool = typer.Option(False, help="Build the map-reduce input digest first"),
+    stream: bool = typer.Option(False, help="Stream drafts"),
+    seed: int = typer.Option(0),
+    workdir: str = typer.Option("", help="Where to build the synthetic HZ (default: temp dir)"),
+    json_out: str = typer.Option("", help="Also write the results as JSON to this file"),
+    check: bool = typer.Option(False, "--check", help="Exit with an error unless every task finished (offline check of an engine)")
+):
+    """
+    Runs the full agent pipeline over a synthetic HZ against the mock provider.
+    With --engine batch this goes through the in-process batch backend.
+    """
+    root = _workspace(workdir)
+    os.chdir(root)
+    hz_path = make_hz("data", "HZ_Bench", assignments=assignments, tasks=tasks, pdf_pages=pdf_pages, seed=seed)
+    hz = HZIndex("data").get("HZ_Bench")
+    console.print(f"Synthetic HZ at {os.path.join(root, hz_path)}")
+
+    agent = Agent(provider="mock", model="mock", cache_mode="bypass", max_concurrency=max_concurrency, stream_drafts=stream, qa_candidates=qa_candidates, summarize_inputs=summarize_inputs)
+
+    def log(message, ass_name=None):
+        # Only the per-phase timing summary at the end of the run
+        if message.startswith("Timing summary"):
+            console.print(message)
+    agent.log = log
+    finished = set()
+    agent.on_task_finished = lambda ass_name, i, text: finished.add((ass_name, i))
+    mock = agent.llm.client
+    mock.config = MockConfig(
+        latency_ms=latency_ms, latency_sigma=latency_sigma, tokens_per_sec=tokens_per_sec,
+        error_rate=error_rate, rate_limit_rate=rate_limit_rate, qa_fail_rate=qa_fail_rate,
+        tasks=tasks, seed=seed,
+    )
+
+    with Probe() as ingest:
+        input_texts = {path: content for path, content in load_many(hz.input_files).items() if content}
+
+    run_args = dict(hz_name=hz.name, assignment_paths=hz.assignment_files, input_texts=input_texts)
+    with Probe() as probe:
+        if engine == Engine.batch:
+            agent.run_batch(poll_interval=0.1, **run_args)
+        elif engine == Engine.asyncio:
+            asyncio.run(agent.arun(**run_args))
+        else:
+            agent.run(**run_args)
+
+    wall = probe.results["wall_s"]
+    results = {
+        "engine": engine.value,
+        "assignments": assignments,
+        "tasks": assignments * tasks,
+        "tasks_done": len(finished),
+        "ingest_s": ingest.results["wall_s"],
+        "llm_calls": mock.calls,
+        "injected_errors": mock.errors,
+        "calls_per_s": mock.calls / wall if wall else 0.0,
+        "tasks_per_s": assignments * tasks / wall if wall else 0.0,
+        **probe.results,
+    }
+    _report("Pipeline benchmark (mock provider)", results, json_out)
+    if check and len(finished) != assignments * tasks:
+        console.print(f"[red]Check failed: {len(finished)} of {assignments * tasks} tasks finished.[/red]")
+        raise typer.Exit(1)
+
+@app.command()
+def ingestion(
+    pdfs: int = typer.Option(4, help="Synthetic input PDFs"),
+    pdf_pages: int = typer.Option(200, help="Pages per PDF"),
+    pptx: int = typer.Option(2, help="Synthetic input PPTX files"),
+    pptx_slides: int = typer.Option(80, help="Slides per PPTX"),
+    workers: int = typer.Option(0, help="Parser processes (0 = CPU count)"),
+    seed: int = typer.Option(0),
+    workdir: str = typer.Option("", help="Where to build the synthetic HZ (default: temp dir)"),
+    json_out: str = typer.Option("", help="Also write the results as JSON to this file")
+):
+    """
+    Measures text extraction of large inputs: cold (parse) and warm (cache hit).
+    """
+    root = _workspace(workdir)
+    os.chdir(root)
+    make_hz("data", "HZ_Ingest", assignments=1, tasks=1, pdfs=pdfs, pdf_pages=pdf_pages, pptx=pptx, pptx_slides=pptx_slides, seed=seed)
+    hz = HZIndex("data").get("HZ_Ingest")
+    total_mb = sum(os.path.getsize(p) for p in hz.input_files) / 2**20
+
+    with Probe() as cold:
+        texts = load_many(hz.input_files, workers=workers or None)
+    with Probe() as warm:
+        load_many(hz.input_files, workers=workers or None)
+
+    results = {
+        "files": len(hz.input_files),
+        "input_mb": total_mb,
+        "chars": sum(len(t) for t in texts.values()),
+        "cold_s": cold.results["wall_s"],
+        "warm_s": warm.results["wall_s"],
+        "cold_mb_per_s": total_mb / cold.results["wall_s"] if cold.results["wall_s"] else 0.0,
+        "peak_rss_mb": cold.results["peak_rss_mb"],
+        "peak_rss_children_mb": cold.results["peak_rss_children_mb"],
+    }
+    _report("Ingestion benchmark", results, json_out)
+
+@app.command()
+def docx(
+    tasks: int = typer.Option(40, help="Tasks in the template"),
+    pages: int = typer.Option(80, help="Approximate pages of text in the template"),
+    repeat: int = typer.Option(5, help="Integration runs (the median is reported)"),
+    seed: int = typer.Option(0),
+    workdir: str = typer.Option("", help="Where to write the template (default: temp dir)"),
+    json_out: str = typer.Option("", help="Also write the results as JSON to this file")
+):
+    """
+    Measures integrating all task solutions into a large DOCX template.
+    """
+    root = _workspace(workdir)
+    template = os.path.join(root, "Vorlage.docx")
+    write_template(template, tasks, pages, random.Random(seed))
+    task_results = [{"task": f"Teilaufgabe {k}", "content": f"Lösung zu Teilaufgabe {k}."} for k in range(1, tasks + 1)]
+
+    timings = []
+    for k in range(repeat):
+        start = time.perf_counter()
+        integrate_solution_to_docx(template, os.path.join(root, f"Vorlage_{k}.docx"), task_results)
+        timings.append(time.perf_counter() - start)
+
+    results = {
+        "tasks": tasks,
+        "pages": pages,
+        "template_mb": os.path.getsize(template) / 2**20,
+        "integrate_median_s": sorted(timings)[len(timings) // 2],
+        "integrate_min_s": min(timings),
+    }
+    _report("DOCX integration benchmark", results, json_out)
+
+if __name__ == "__main__":
+    app()
@@ -1,14 +1,27 @@
 import os
+import re
 import time
+import asyncio
 import threading
-import concurrent.futures
-from typing import List, Dict, Callable, Optional
-from src.llm.client import LLMClient
-from src.agent.prompts import SYSTEM_PROMPT, PLANNER_PROMPT, WORKER_PROMPT, QA_PROMPT
-from src.utils.cost import count_tokens, calculate_cost
-from src.utils.docx_editor import append_solution_to_docx, verify_docx_integration, force_append_all_tasks
-from src.ingestion.loader import load_file_content
-from src.utils.text_cleaner import replace_sz, clean_ai_artifacts, restore_umlauts
+from typing import List, Dict, Callable, Optional, Tuple
+from src.llm.client import LLMClient, LLMResponse, SUMMARY_MODELS
+from src.llm.ratelimit import LLMError
+from src.llm.batch import BatchRunner, BatchRequest
+from src.llm.connections import close_async_clients
+from src.agent.journal import RunJournal
+from src.agent.jobqueue import FINISHED, TRANSIENT_ERRORS, Job, JobQueue, NewJob, PermanentJobError
+from src.agent.limits import BudgetExceeded, RunLimits
+from src.agent.scheduler import Node, TaskScheduler, PRIORITY_PLAN, PRIORITY_CONTINUE, PRIORITY_WORKER, current_queue_wait
+from src.agent.prompts import SYSTEM_PROMPT, PLANNER_PROMPT, CONTEXT_PROMPT, WORKER_PROMPT, QA_PROMPT, QA_JSON_PROMPT, RANK_PROMPT, RANK_CANDIDATE, SUMMARY_SYSTEM_PROMPT
+from src.agent.qa import QA_MODES, QAVerdict, parse_review, parse_ranking, best_candidate
+from src.utils.cost import count_tokens, estimate_tokens, calculate_cost
+from src.utils.pricing_data import BATCH_PRICE_FACTOR
+from src.utils.tracing import Tracer
+from src.utils.docx_editor import integrate_solution, verify_integration, force_append_tasks, save_docx
+from src.ingestion.loader import load_cached
+from src.ingestion.retrieval import build_index
+from src.ingestion.digest import DigestBuilder
+from src.utils.text_cleaner import StreamCleaner, clean_text
 
 # Try to import Streamlit context helpers for thread safety
 try:
@@ -17,16 +30,50 @@ except ImportError:
     add_script_run_ctx = None
     get_script_run_ctx = None
 
+def resolve_concurrency(max_concurrency: int = 0, max_parallel: int = 5, max_subtasks: int = 3) -> int:
+    """
+    In-flight LLM call limit of an Agent with these settings (0 = max_parallel x max_subtasks).
+    """
+    return max_concurrency or max_parallel * max_subtasks
+
 class Agent:
-    def __init__(self, provider="openai", model="gpt-4o", cost_limit: float = 0.0, max_parallel: int = 5, max_subtasks: int = 3, skip_qa: bool = False, max_qa_retries: int = 1, min_qa_score: float = 9.0, length_profile: str = "long"):
-        self.llm = LLMClient(provider=provider, model=model)
-        self.model = model
+    def __init__(self, provider="openai", model="gpt-4o", cost_limit: float = 0.0, max_parallel: int = 5, max_subtasks: int = 3, skip_qa: bool = False, max_qa_retries: int = 1, min_qa_score: float = 9.0, length_profile: str = "long", max_concurrency: int = 0, cache_mode: str = "use", use_retrieval: bool = True, retrieval_top_k: int = 8, context_token_budget: int = 6000, stream_drafts: bool = False, draft_throttle: float = 0.5, qa_mode: str = "json", qa_candidates: int = 1, summarize_inputs: bool = False, summary_model: str = "", digest_chars: int = 12000, limits: Optional[RunLimits] = None):
         self.max_parallel = max_parallel
         self.max_subtasks = max_subtasks
+        # Global limit for in-flight LLM calls: size of the shared scheduler
+        # pool in run(), semaphore in arun(), and of the HTTP connection pool
+        self.max_concurrency = resolve_concurrency(max_concurrency, max_parallel, max_subtasks)
+        self.llm = LLMClient(provider=provider, model=model, cache_mode=cache_mode, max_connections=self.max_concurrency)
+        self.model = model
         self.skip_qa = skip_qa
         self.max_qa_retries = max_qa_retries
         self.min_qa_score = min_qa_score
         self.length_profile = length_profile.lower()
+        # Retrieval: give each worker only the top-k input chunks relevant to its
+        # task (within context_token_budget) instead of the truncated full dump
+        self.use_retrieval = use_retrieval
+        self.retrieval_top_k = retrieval_top_k
+        self.context_token_budget = context_token_budget
+        self.context_index = None
+        # Input digest: summarize large input files map-reduce style with a
+        # cheap model into ~digest_chars, given to the planner and workers
+        # instead of truncating every file
+        self.summarize_inputs = summarize_inputs
+        self.summary_model = summary_model or SUMMARY_MODELS.get(self.llm.provider, model)
+        self.summary_llm = LLMClient(provider=provider, model=self.summary_model, cache_mode=cache_mode, max_connections=self.max_concurrency) if summarize_inputs and self.summary_model != model else self.llm
+        self.digest_chars = digest_chars
+        self.digest = ""
+        # Streaming: forward partial drafts through on_draft (at most every
+        # draft_throttle seconds) and abort drafts that run far over length
+        self.stream_drafts = stream_drafts
+        self.draft_throttle = draft_throttle
+        # QA: "json" asks for a score + issues, "text" is the free-form review.
+        # qa_candidates > 1 drafts K variants in parallel and ranks them in one
+        # QA call; only the best one is refined if none clears min_qa_score.
+        if qa_mode not in QA_MODES:
+            raise ValueError(f"Unknown QA mode: {qa_mode} (expected one of {', '.join(QA_MODES)})")
+        self.qa_mode = qa_mode
+        self.qa_candidates = max(1, qa_candidates)
         self.console = None  # Legacy CLI support
         self.lock = threading.Lock() # For thread-safe stats updates
         
@@ -39,11 +86,35 @@ class Agent:
             self.length_instruction = "Max. 200-250 Wörter pro Abschnitt."
 
         self.system_prompt_formatted = SYSTEM_PROMPT.format(length_instruction=self.length_instruction)
+        # Early abort for streamed drafts: 3x the per-section word budget
+        self.max_draft_words = {"short": 40, "normal": 120}.get(self.length_profile, 250) * 3
+        # Output tokens reserved per call against the budget (~2 tokens per German word)
+        self.reserved_output_tokens = self.max_draft_words * 2
         
         # State tracking
         self.total_cost = 0.0
-        self.cost_limit = cost_limit
-        self.accumulated_tokens = {"input": 0, "output": 0}
+        # Budget (and call slots) of the run, possibly shared with other agents
+        self.limits = limits or RunLimits(cost_limit)
+        self.cost_limit = self.limits.cost_limit
+        self.accumulated_tokens = {"input": 0, "output": 0, "cached": 0}
+        # Responses served from the local cache cost nothing and are counted apart
+        self.cache_stats = {"hits": 0, "saved_cost": 0.0}
+
+        # Async engine state (only used by arun)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._run_task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._qa_tasks = set()
+        self._skipped_qa = set()
+
+        # Per-run result journal (output/<HZ>/run_journal.jsonl)
+        self.journal: Optional[RunJournal] = None
+
+        # Context of a queued run in a worker process (see prepare_queued)
+        self._queued: Optional[Dict] = None
+
+        # Timing spans, exported to output/<HZ>/trace.* at the end of a run
+        self.tracer = Tracer()
         
         # Callbacks
         self.on_log: Optional[Callable[[str, Optional[str]], None]] = None # message, ass_name
@@ -66,27 +137,59 @@ class Agent:
         if self.on_log:
             self.on_log(message, ass_name)
 
-    def _track_usage(self, prompt: str, response: str):
-        in_tok = count_tokens(prompt, self.model)
-        out_tok = count_tokens(response, self.model)
+    def _track_usage(self, prompt: str, response: str, reservation: float = 0.0, model: Optional[str] = None):
+        # Provider-reported usage is exact and free; only count locally
+        # when it is missing (cache hits, providers without usage).
+        in_tok = getattr(response, "input_tokens", 0)
+        out_tok = getattr(response, "output_tokens", 0)
+        if not in_tok or not out_tok:
+            with self.tracer.span("tokenize"):
+                in_tok = in_tok or count_tokens(prompt, model or self.model)
+                out_tok = out_tok or count_tokens(response, model or self.model)
+        
+        # Prompt-cache reads and writes as reported by the provider
+        cached_tok = min(getattr(response, "cached_tokens", 0), in_tok)
         
-        cost = calculate_cost(self.model, in_tok, out_tok)
+        cost = calculate_cost(model or self.model, in_tok, out_tok, cached_tokens=cached_tok, cache_write_tokens=getattr(response, "cache_write_tokens", 0))
+        if getattr(response, "batch", False):
+            cost *= BATCH_PRICE_FACTOR
+        cache_hit = getattr(response, "cache_hit", False)
         
         with self.lock:
-            self.accumulated_tokens["input"] += in_tok
-            self.accumulated_tokens["output"] += out_tok
-            self.total_cost += cost
+            if cache_hit:
+                self.limits.release(reservation)
+                self.cache_stats["hits"] += 1
+                self.cache_stats["saved_cost"] += cost
+            else:
+                self.limits.commit(cost, reservation)
+                self.accumulated_tokens["input"] += in_tok
+                self.accumulated_tokens["output"] += out_tok
+                self.accumulated_tokens["cached"] += cached_tok
+                self.total_cost += cost
             
             if self.on_update:
                 self.on_update({
                     "total_cost": self.total_cost,
-                    "tokens": self.accumulated_tokens
+                    "tokens": self.accumulated_tokens,
+                    "cache": self.cache_stats
                 })
 
+    def _estimate_cost(self, prompt: str, model: Optional[str] = None) -> float:
+        return calculate_cost(model or self.model, estimate_tokens(prompt), self.reserved_output_tokens)
+
+    def _reserve(self, estimate: float) -> float:
+        """
+        Reserves the estimated cost of a call before it is made, so concurrent
+        calls cannot jointly overshoot cost_limit. Released by _track_usage
+        (or _release on failure).
+        """
+        return self.limits.reserve(estimate)
+
+    def _release(self, reservation: float):
+        self.limits.release(reservation)
+
     def _check_budget(self):
-        with self.lock:
-            if self.cost_limit > 0 and self.total_cost >= self.cost_limit:
-                raise Exception(f"Cost limit reached! (${self.total_cost:.4f} >= ${self.cost_limit:.4f})")
+        self.limits.check()
 
     def _check_signal(self):
         if os.path.exists(".skip_signal"):
@@ -98,75 +201,119 @@ class Agent:
             return True
         return False
 
-    def _process_task(self, ass_filename: str, task: str, i: int, total_tasks: int, full_context: str, assignment_text: str, user_instructions: str) -> str:
-        if "[SKIP]" in task.upper():
-            self.log(f"Skipping task {i+1} (Partner/External context detected).", ass_filename)
-            if self.on_task_finished:
-                self.on_task_finished(ass_filename, i, "[SKIPPED]")
-            return {"task": task, "content": "[Übersprungen, da Partnerarbeit oder externes Feedback erforderlich]"}
+    # --- Shared helpers (threaded and async engine) ---
 
-        self._check_budget()
-        self.log(f"Starting Task {i+1}/{total_tasks}: {task}", ass_filename)
-        
-        if self.on_section_start:
-            self.on_section_start(ass_filename, task, assignment_text, i, total_tasks)
+    def _build_context(self, input_texts: Dict[str, str], digest: Optional[str] = None):
+        full_context = ""
+        input_overview = ""
+        if digest is None:
+            digest = self._build_digest(input_texts) if self.summarize_inputs else ""
+        self.digest = digest
+        for filename, text in input_texts.items():
+            if not self.use_retrieval and not self.digest:
+                full_context += f"--- START FILE: {os.path.basename(filename)} ---\n{text[:20000]}...\n--- END FILE ---\n\n"
+            input_overview += f"- {os.path.basename(filename)}\n"
+
+        if self.digest:
+            input_overview += f"\nZusammenfassung der Materialien:\n{self.digest}"
+            if not self.use_retrieval:
+                full_context = self.digest
 
-        worker_input = WORKER_PROMPT.format(
-            current_task=task,
+        if self.use_retrieval:
+            with self.tracer.span("context.index", files=len(input_texts)):
+                self.context_index = build_index(input_texts)
+            self.log(f"Indexed input material: {len(self.context_index.chunks)} chunks.")
+        return full_context, input_overview
+
+    def _build_digest(self, input_texts: Dict[str, str]) -> str:
+        builder = DigestBuilder(
+            self._summary_call, self.summary_model, max_workers=self.max_concurrency,
+            digest_chars=self.digest_chars, thread_init=self._thread_init()
+        )
+        with self.tracer.span("context.digest", files=len(input_texts)) as span:
+            try:
+                digest = builder.build(input_texts)
+            except Exception as e:
+                self.log(f"⚠️ Summarizing the input material failed ({e}). Using the raw material instead.")
+                return ""
+            span.set(calls=digest.calls, chars=len(digest.text))
+        self.log(f"Input digest ({self.summary_model}): {len(digest.text)} chars, {digest.summarized} file(s) summarized, {digest.calls} summary calls.")
+        return digest.text
+
+    def _task_context(self, task: str, full_context: str) -> str:
+        if self.context_index is None:
+            return full_context
+        # Digest for the overview, the raw chunks relevant to this task for details
+        return self.digest + self.context_index.select_context(task, token_budget=self.context_token_budget, top_k=self.retrieval_top_k)
+
+    def _user_instructions(self, custom_prompt: str) -> str:
+        if custom_prompt:
+            return f"\nZUSÄTZLICHE BENUTZERANWEISUNGEN:\n{custom_prompt}\n"
+        return ""
+
+    def _planner_input(self, assignment_text: str, input_overview: str, user_instructions: str) -> str:
+        return PLANNER_PROMPT.format(
+            assignment_text=assignment_text[:50000],
+            input_overview=input_overview
+        ) + user_instructions
+
+    def _shared_prefix(self, full_context: str, assignment_text: str) -> str:
+        # Identical for the worker/QA/refinement calls of one task, and its
+        # assignment part for all tasks, so providers can serve it from cache.
+        # The assignment plus the digest (or the whole context without
+        # retrieval) is shared across tasks and may be cached explicitly.
+        common = self.digest if self.context_index is not None else full_context
+        self.llm.share_prefix(CONTEXT_PROMPT.split("{context_text}")[0].format(assignment_text=assignment_text) + common)
+        return CONTEXT_PROMPT.format(
             context_text=full_context,
             assignment_text=assignment_text
-        ) + user_instructions
-        
-        draft = self.llm.generate_text(
-            system_prompt=self.system_prompt_formatted,
-            user_prompt=worker_input
         )
-        self._track_usage(self.system_prompt_formatted + worker_input, draft)
-        
-        if self.on_draft:
-            self.on_draft(ass_filename, draft)
-        
-        # QA Loop
-        self._check_budget()
-        
-        if self.skip_qa:
-            self.log(f"Skipping QA Review for Task {i+1}.", ass_filename)
-        else:
-            self.log(f"QA Review for Task {i+1}...", ass_filename)
-            
-            qa_attempts = 0
-            while qa_attempts <= self.max_qa_retries:
-                if self._check_signal():
-                    break
 
-                qa_input = QA_PROMPT.format(
-                    assignment_text=assignment_text,
-                    generated_content=draft,
-                    min_score=self.min_qa_score
-                )
-                
-                review = self.llm.generate_text(
-                    system_prompt=self.system_prompt_formatted,
-                    user_prompt=qa_input
-                )
-                self._track_usage(self.system_prompt_formatted + qa_input, review)
-                
-                if self.on_qa_feedback:
-                    self.on_qa_feedback(ass_filename, review)
+    def _worker_input(self, task: str, user_instructions: str) -> str:
+        return WORKER_PROMPT.format(current_task=task) + user_instructions
 
-                if "PASS" in review:
-                    self.log(f"QA Passed for Task {i+1}.", ass_filename)
-                    break
-                
-                qa_attempts += 1
-                if qa_attempts > self.max_qa_retries:
-                    self.log(f"QA failed max retries for Task {i+1}.", ass_filename)
-                    break
-                    
-                self.log(f"QA failed (Attempt {qa_attempts}/{self.max_qa_retries}). Improving Task {i+1}...", ass_filename)
-                self._check_budget()
-                
-                refinement_input = f"""
+    def _qa_input(self, draft: str) -> str:
+        prompt = QA_JSON_PROMPT if self.qa_mode == "json" else QA_PROMPT
+        return prompt.format(
+            generated_content=draft,
+            min_score=self.min_qa_score
+        )
+
+    def _rank_input(self, drafts: List[str]) -> str:
+        return RANK_PROMPT.format(
+            count=len(drafts),
+            candidates="\n".join(RANK_CANDIDATE.format(id=k + 1, content=d) for k, d in enumerate(drafts)),
+            min_score=self.min_qa_score
+        )
+
+    def _candidate_count(self) -> int:
+        # Ranking needs a QA step
+        return 1 if self.skip_qa else self.qa_candidates
+
+    def _candidate_temperature(self, k: int) -> float:
+        # Distinct temperatures make the candidates differ (and keeps their
+        # response-cache keys apart)
+        return round(min(1.2, 0.7 + 0.15 * k), 2)
+
+    def _review(self, ass_filename: str, i: int, review: str) -> QAVerdict:
+        verdict = parse_review(review, self.min_qa_score)
+        self._emit_qa(ass_filename, i, verdict.summary())
+        return verdict
+
+    def _pick_candidate(self, ass_filename: str, i: int, drafts: List[str], review: str):
+        """
+        Picks the best ranked candidate. Returns (draft, verdict).
+        """
+        verdicts = parse_ranking(review, len(drafts), self.min_qa_score)
+        best = best_candidate(verdicts)
+        scores = ", ".join(f"{v.score:g}" if v.score is not None else "-" for v in verdicts)
+        self.log(f"Ranked {len(drafts)} candidates for Task {i+1} (scores: {scores}), using #{best+1}.", ass_filename)
+        self._emit_draft(ass_filename, i, drafts[best])
+        self._emit_qa(ass_filename, i, verdicts[best].summary())
+        return drafts[best], verdicts[best]
+
+    def _refinement_input(self, review: str, draft: str) -> str:
+        return f"""
                 Der Professor hat folgendes Feedback gegeben:
                 {review}
                 
@@ -175,55 +322,8 @@ class Agent:
                 Alter Entwurf:
                 {draft}
                 """
-                refined_draft = self.llm.generate_text(
-                    system_prompt=self.system_prompt_formatted,
-                    user_prompt=refinement_input
-                )
-                self._track_usage(self.system_prompt_formatted + refinement_input, refined_draft)
-                draft = refined_draft
-                
-                if self.on_draft:
-                        self.on_draft(ass_filename, draft)
-        
-        cleaned_text = restore_umlauts(replace_sz(clean_ai_artifacts(draft)))
-        result_data = {"task": task, "content": cleaned_text}
-        if self.on_task_finished:
-            # We still pass the markdown string to the callback for backward compatibility if needed, 
-            # but we could also pass the dict. Let's keep the callback string-based for now.
-            self.on_task_finished(ass_filename, i, f"## {task}\n\n{cleaned_text}")
-        return result_data
-
-    def process_assignment(self, ass_path: str, output_dir: str, full_context: str, input_overview: str, custom_prompt: str) -> str:
-        ass_filename = os.path.basename(ass_path)
-        self.log(f"Processing Assignment: {ass_filename}", ass_filename)
-        
-        assignment_text = load_file_content(ass_path)
-        if not assignment_text:
-            self.log(f"Skipping empty assignment: {ass_filename}", ass_filename)
-            return ""
-        
-        self.log(f"Loaded assignment text ({len(assignment_text)} chars).", ass_filename)
-
-        # 2. Plan
-        self._check_budget()
-        self.log(f"Creating a plan...", ass_filename)
-        
-        user_instructions = ""
-        if custom_prompt:
-            user_instructions = f"\nZUSÄTZLICHE BENUTZERANWEISUNGEN:\n{custom_prompt}\n"
 
-        planner_input = PLANNER_PROMPT.format(
-            assignment_text=assignment_text[:50000],
-            input_overview=input_overview
-        ) + user_instructions
-        
-        plan_response = self.llm.generate_text(
-            system_prompt=self.system_prompt_formatted,
-            user_prompt=planner_input
-        )
-        self._track_usage(self.system_prompt_formatted + planner_input, plan_response)
-        
-        import re
+    def _parse_plan(self, ass_filename: str, plan_response: str) -> List[str]:
         tasks = []
         for line in plan_response.split('\n'):
             line = line.strip()
@@ -245,42 +345,119 @@ class Agent:
             self.on_plan_generated(ass_filename, tasks)
 
         self.log(f"[{ass_filename}] Parsed {len(tasks)} tasks.")
-        
-        # 3. Execute Tasks (Parallelized)
-        task_results = [None] * len(tasks) # List of dicts {"task": ..., "content": ...}
-        
-        # Capture context for thread safety
-        ctx = get_script_run_ctx() if get_script_run_ctx else None
-        
-        def subtask_wrapper(index, task_str):
-             if add_script_run_ctx and ctx:
-                add_script_run_ctx(threading.current_thread(), ctx)
-             return self._process_task(
-                 ass_filename, task_str, index, len(tasks), full_context, assignment_text, user_instructions
-             )
-
-        # Use separate limit for subtask concurrency
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_subtasks) as executor:
-            future_to_index = {
-                executor.submit(subtask_wrapper, i, task): i 
-                for i, task in enumerate(tasks)
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_index):
-                idx = future_to_index[future]
-                try:
-                    part_result = future.result()
-                    task_results[idx] = part_result
-                except Exception as e:
-                    self.log(f"Error in task {idx}: {e}")
-                    task_results[idx] = {"task": tasks[idx], "content": f"Error: {e}"}
+        return tasks
+
+    def _skip_result(self, ass_filename: str, task: str, i: int) -> Dict[str, str]:
+        self.log(f"Skipping task {i+1} (Partner/External context detected).", ass_filename)
+        if self.on_task_finished:
+            self.on_task_finished(ass_filename, i, "[SKIPPED]")
+        return {"task": task, "content": "[Übersprungen, da Partnerarbeit oder externes Feedback erforderlich]"}
+
+    def _open_journal(self, output_dir: str, resume: bool):
+        self.journal = RunJournal(output_dir, resume=resume)
+        if resume:
+            done = sum(len(d) for d in self.journal.done.values())
+            self.log(f"Resuming run: {len(self.journal.plans)} plan(s), {done} completed task(s) in journal.")
+
+    def _close_journal(self):
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+
+    def _journaled_plan(self, ass_filename: str, assignment_text: str) -> Optional[List[str]]:
+        tasks = self.journal.get_plan(ass_filename, assignment_text) if self.journal else None
+        if tasks is None:
+            return None
+        self.log(f"Reusing journaled plan ({len(tasks)} tasks).", ass_filename)
+        if self.on_plan_generated:
+            self.on_plan_generated(ass_filename, tasks)
+        return tasks
+
+    def _record_plan(self, ass_filename: str, assignment_text: str, tasks: List[str]):
+        if self.journal:
+            self.journal.record_plan(ass_filename, assignment_text, tasks)
+
+    def _journaled_result(self, ass_filename: str, i: int) -> Optional[Dict[str, str]]:
+        result = self.journal.get_done(ass_filename, i) if self.journal else None
+        if result is None:
+            return None
+        self.log(f"Task {i+1} already completed in a previous run, skipping.", ass_filename)
+        if self.on_task_finished:
+            self.on_task_finished(ass_filename, i, f"## {result['task']}\n\n{result['content']}")
+        return result
+
+    def _trace_response(self, span, response: LLMResponse, stream_state: Optional[Dict] = None):
+        span.set(
+            input_tokens=getattr(response, "input_tokens", 0),
+            output_tokens=getattr(response, "output_tokens", 0),
+            cached_tokens=getattr(response, "cached_tokens", 0),
+            cache_hit=getattr(response, "cache_hit", False),
+            retries=getattr(response, "retries", 0),
+            limiter_wait_s=getattr(response, "limiter_wait", 0.0),
+            provider_s=getattr(response, "latency", 0.0),
+        )
+        if stream_state and stream_state["first_token"] is not None:
+            span.set(first_token_s=stream_state["first_token"])
+
+    def _finish_trace(self, output_dir: str):
+        """
+        Exports the spans of the run (JSONL + OTLP/JSON) and logs the per-phase summary.
+        """
+        if not self.tracer.spans:
+            return
+        try:
+            self.tracer.export_jsonl(os.path.join(output_dir, "trace.jsonl"))
+            self.tracer.export_otlp(os.path.join(output_dir, "trace.otlp.json"))
+        except OSError as e:
+            self.log(f"Could not export trace: {e}")
+        self.log("Timing summary:\n" + self.tracer.format_summary())
+        self.tracer.reset()
+
+    def _emit_draft(self, ass_filename: str, i: int, draft: str):
+        if self.journal:
+            self.journal.record_draft(ass_filename, i, draft)
+        if self.on_draft:
+            self.on_draft(ass_filename, clean_text(draft))
+
+    def _emit_qa(self, ass_filename: str, i: int, review: str):
+        if self.journal:
+            self.journal.record_qa(ass_filename, i, review)
+        if self.on_qa_feedback:
+            self.on_qa_feedback(ass_filename, review)
+
+    def _finish_task(self, ass_filename: str, task: str, i: int, draft: str) -> Dict[str, str]:
+        cleaned_text = clean_text(draft)
+        result_data = {"task": task, "content": cleaned_text}
+        if self.journal:
+            self.journal.record_done(ass_filename, i, task, cleaned_text)
+        if self.on_task_finished:
+            # We still pass the markdown string to the callback for backward compatibility if needed, 
+            # but we could also pass the dict. Let's keep the callback string-based for now.
+            self.on_task_finished(ass_filename, i, f"## {task}\n\n{cleaned_text}")
+        return result_data
+
+    def _failed_result(self, ass_filename: str, task: str, idx: int, error: Exception) -> Dict[str, str]:
+        self.log(f"Error in task {idx}: {error}", ass_filename)
+        return {"task": task, "content": "", "error": str(error), "retryable": isinstance(error, TRANSIENT_ERRORS)}
+
+    def _save_assignment(self, ass_path: str, output_dir: str, task_results: List[Dict[str, str]]) -> str:
+        ass_filename = os.path.basename(ass_path)
 
         # Filter out Nones
         task_results = [p for p in task_results if p is not None]
         
-        # Build full solution text for MD and report
-        assignment_solution_parts = [f"**{res['task']}**\n\n{res['content']}" for res in task_results]
+        # Build full solution text for MD and report (failed tasks only noted here)
+        assignment_solution_parts = [
+            f"**{res['task']}**\n\n" + (f"[Fehlgeschlagen: {res['error']}]" if res.get("error") else res['content'])
+            for res in task_results
+        ]
         full_solution_text = "\n\n".join(assignment_solution_parts)
+
+        # Provider errors must never end up in the student's document
+        failed = [res for res in task_results if res.get("error")]
+        if failed:
+            self.log(f"⚠️ {len(failed)} task(s) failed and are left out of the DOCX.", ass_filename)
+        task_results = [res for res in task_results if not res.get("error")]
         self.log(f"Generated solution length: {len(full_solution_text)} chars.", ass_filename)
 
         # Always save MD backup
@@ -294,70 +471,961 @@ class Agent:
         if ass_path.lower().endswith(".docx"):
             out_path = os.path.join(output_dir, ass_filename)
             self.log(f"Integrating solution into {out_path}...", ass_filename)
-            success = append_solution_to_docx(ass_path, out_path, task_results)
-            
-            # Verify integration
-            missing_indices = verify_docx_integration(out_path, task_results)
+            with self.tracer.span("docx.integrate", assignment=ass_filename, tasks=len(task_results)):
+                integration = integrate_solution(ass_path, task_results)
+            if integration is None:
+                self.log(f"Failed to integrate into DOCX. Check console.", ass_filename)
+                return report_part
+
+            # Verify integration against where each task was placed (still in memory)
+            with self.tracer.span("docx.verify", assignment=ass_filename) as span:
+                missing_indices = verify_integration(integration, task_results)
+                span.set(missing=len(missing_indices))
+            recovered = bool(missing_indices)
             if missing_indices:
                 self.log(f"⚠️ Verification failed: {len(missing_indices)} tasks missing in DOCX. Retrying simple append...", ass_filename)
-                missing_tasks = [task_results[i] for i in missing_indices]
-                retry_success = force_append_all_tasks(out_path, missing_tasks)
-                if retry_success:
-                    self.log(f"✅ Recovery successful. Missing tasks appended to end of document.", ass_filename)
-                else:
-                    self.log(f"❌ Recovery failed. Please use the MD backup.", ass_filename)
-            elif not success:
-                 self.log(f"Failed to integrate into DOCX. Check console.", ass_filename)
+                with self.tracer.span("docx.recover", assignment=ass_filename, tasks=len(missing_indices)):
+                    force_append_tasks(integration, task_results, missing_indices)
+                    missing_indices = verify_integration(integration, task_results)
+
+            with self.tracer.span("docx.save", assignment=ass_filename):
+                saved = save_docx(integration.doc, out_path)
+            if not saved:
+                self.log(f"❌ Saving the DOCX failed. Please use the MD backup.", ass_filename)
+            elif missing_indices:
+                self.log(f"❌ Recovery failed. Please use the MD backup.", ass_filename)
+            elif recovered:
+                self.log(f"✅ Recovery successful. Missing tasks appended to end of document.", ass_filename)
             else:
                 self.log(f"✅ DOCX integration verified successfully.", ass_filename)
         
         return report_part
 
-    def run(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str = "") -> str:
+    def _new_stream_state(self) -> Dict:
+        # "clean": the cleaned text so far, built incrementally for on_draft
+        return {"text": "", "clean": "", "cleaner": StreamCleaner(), "start": time.monotonic(), "last_emit": 0.0, "first_token": None}
+
+    def _on_stream_delta(self, ass_filename: str, i: int, state: Dict, delta: str) -> bool:
+        """
+        Accumulates a streamed delta and forwards the partial draft, cleaned
+        as the final text will be (throttled).
+        Returns True if the draft should be aborted early.
+        """
+        now = time.monotonic()
+        if state["first_token"] is None:
+            state["first_token"] = now - state["start"]
+            self.log(f"Task {i+1}: first token after {state['first_token']:.2f}s", ass_filename)
+        state["text"] += delta
+        if self.on_draft:
+            state["clean"] += state["cleaner"].feed(delta)
+            if now - state["last_emit"] >= self.draft_throttle:
+                state["last_emit"] = now
+                self.on_draft(ass_filename, state["clean"])
+        if len(state["text"].split()) > self.max_draft_words:
+            self.log(f"Task {i+1}: draft exceeds {self.max_draft_words} words, aborting stream early.", ass_filename)
+            return True
+        return False
+
+    # --- Threaded engine ---
+
+    def _summary_call(self, prompt: str) -> str:
+        """
+        One map or reduce step of the input digest, on the summary model.
+        """
+        with self.tracer.span("llm.summarize") as span, self.limits.slot():
+            reservation = self._reserve(self._estimate_cost(prompt, self.summary_model))
+            try:
+                response = self.summary_llm.generate_text(system_prompt=SUMMARY_SYSTEM_PROMPT, user_prompt=prompt, temperature=0.2)
+            except BaseException:
+                self._release(reservation)
+                raise
+            self._track_usage(prompt, response, reservation, model=self.summary_model)
+            self._trace_response(span, response)
+        return response
+
+    def _call(self, user_prompt: str, context: str = "", phase: str = "call", temperature: float = 0.7) -> str:
+        prompt = self.system_prompt_formatted + context + user_prompt
+        with self.tracer.span(f"llm.{phase}", queue_wait_s=current_queue_wait()) as span, self.limits.slot():
+            reservation = self._reserve(self._estimate_cost(prompt))
+            try:
+                response = self.llm.generate_text(
+                    system_prompt=self.system_prompt_formatted,
+                    user_prompt=user_prompt,
+                    temperature=temperature,
+                    context=context
+                )
+            except BaseException:
+                self._release(reservation)
+                raise
+            self._track_usage(prompt, response, reservation)
+            self._trace_response(span, response)
+        return response
+
+    def _draft_call(self, ass_filename: str, i: int, user_prompt: str, context: str = "", phase: str = "work") -> str:
+        """
+        Worker/refinement call. Streams through on_draft when stream_drafts is set.
+        """
+        if not self.stream_drafts:
+            draft = self._call(user_prompt, context, phase)
+        else:
+            prompt = self.system_prompt_formatted + context + user_prompt
+            with self.tracer.span(f"llm.{phase}", queue_wait_s=current_queue_wait(), stream=True) as span, self.limits.slot():
+                reservation = self._reserve(self._estimate_cost(prompt))
+                stream = self.llm.stream_text(
+                    system_prompt=self.system_prompt_formatted,
+                    user_prompt=user_prompt,
+                    context=context
+                )
+                state = self._new_stream_state()
+                try:
+                    for delta in stream:
+                        if self._on_stream_delta(ass_filename, i, state, delta):
+                            stream.close()
+                            break
+                except BaseException:
+                    self._release(reservation)
+                    raise
+                draft = stream.response if stream.response is not None else LLMResponse(state["text"])
+                self._track_usage(prompt, draft, reservation)
+                self._trace_response(span, draft, state)
+
+        self._emit_draft(ass_filename, i, draft)
+        return draft
+
+    def _make_plan(self, ass_path: str, input_overview: str, user_instructions: str) -> Tuple[str, List[str]]:
+        """
+        Loads an assignment and plans its tasks (or reuses the journaled plan).
+        No tasks for an empty assignment.
+        """
+        ass_filename = os.path.basename(ass_path)
+        self.log(f"Processing Assignment: {ass_filename}", ass_filename)
+
+        with self.tracer.span("load.assignment", assignment=ass_filename):
+            assignment_text = load_cached(ass_path)
+        if not assignment_text:
+            self.log(f"Skipping empty assignment: {ass_filename}", ass_filename)
+            return "", []
+
+        self.log(f"Loaded assignment text ({len(assignment_text)} chars).", ass_filename)
+
+        tasks = self._journaled_plan(ass_filename, assignment_text)
+        if tasks is None:
+            self._check_budget()
+            self.log(f"Creating a plan...", ass_filename)
+            plan_response = self._call(self._planner_input(assignment_text, input_overview, user_instructions), phase="plan")
+            tasks = self._parse_plan(ass_filename, plan_response)
+            self._record_plan(ass_filename, assignment_text, tasks)
+        return assignment_text, tasks
+
+    def _schedule_assignment(self, scheduler: TaskScheduler, ass_path: str, output_dir: str, full_context: str, input_overview: str, user_instructions: str, reports: List[str]):
+        """
+        Adds the plan node of an assignment plus its integration node. The plan
+        node adds one worker node per planned task; QA and refinement steps are
+        added as follow-up nodes. Integration runs once all of them finished.
+        """
+        ass_filename = os.path.basename(ass_path)
+        state = {"assignment_text": "", "tasks": [], "results": []}
+        nodes = {}
+
+        def plan():
+            try:
+                assignment_text, tasks = self._make_plan(ass_path, input_overview, user_instructions)
+            except Exception as e:
+                self.log(f"Error in assignment {ass_filename}: {e}")
+                return
+            if not tasks:
+                return
+
+            state["assignment_text"] = assignment_text
+            state["tasks"] = tasks
+            state["results"] = [None] * len(tasks)
+            for i in range(len(tasks)):
+                self._schedule_task(scheduler, nodes["integrate"], state, ass_filename, i, full_context, user_instructions)
+
+        def integrate():
+            if not state["tasks"]:
+                return
+            reports.append(self._save_assignment(ass_path, output_dir, state["results"]))
+
+        plan_node = scheduler.add(plan, priority=PRIORITY_PLAN, name=f"plan:{ass_filename}")
+        nodes["integrate"] = scheduler.add(integrate, priority=PRIORITY_CONTINUE, deps=[plan_node], name=f"integrate:{ass_filename}")
+
+    def _schedule_task(self, scheduler: TaskScheduler, integrate_node: Optional[Node], state: Dict, ass_filename: str, i: int, full_context: str, user_instructions: str):
+        task = state["tasks"][i]
+        total_tasks = len(state["tasks"])
+        assignment_text = state["assignment_text"]
+
+        if "[SKIP]" in task.upper():
+            state["results"][i] = self._skip_result(ass_filename, task, i)
+            return
+
+        done = self._journaled_result(ass_filename, i)
+        if done is not None:
+            state["results"][i] = done
+            return
+
+        prefix = self._shared_prefix(self._task_context(task, full_context), assignment_text)
+
+        def finish(draft: str):
+            state["results"][i] = self._finish_task(ass_filename, task, i, draft)
+
+        def follow_up(step: Callable[[], None], name: str, priority=PRIORITY_CONTINUE, deps=()):
+            def guarded():
+                try:
+                    step()
+                except Exception as e:
+                    state["results"][i] = self._failed_result(ass_filename, task, i, e)
+            return scheduler.add(guarded, priority=priority, deps=deps, blocks=[integrate_node] if integrate_node else [], name=f"{name}:{ass_filename}:{i}")
+
+        def announce():
+            self._check_budget()
+            self.log(f"Starting Task {i+1}/{total_tasks}: {task}", ass_filename)
+            
+            if self.on_section_start:
+                self.on_section_start(ass_filename, task, assignment_text, i, total_tasks)
+
+        def work():
+            announce()
+
+            draft = self._draft_call(ass_filename, i, self._worker_input(task, user_instructions), context=prefix)
+
+            if self.skip_qa:
+                self.log(f"Skipping QA Review for Task {i+1}.", ass_filename)
+                finish(draft)
+                return
+            self.log(f"QA Review for Task {i+1}...", ass_filename)
+            follow_up(lambda: review(draft, 0), "qa")
+
+        candidates: List[Optional[str]] = [None] * self._candidate_count()
+
+        def candidate(k: int):
+            if k == 0:
+                announce()
+            try:
+                candidates[k] = self._call(self._worker_input(task, user_instructions), context=prefix, phase="work", temperature=self._candidate_temperature(k))
+            except LLMError as e:
+                self.log(f"Candidate {k+1} for Task {i+1} failed: {e}", ass_filename)
+
+        def rank():
+            drafts = [c for c in candidates if c is not None]
+            if not drafts:
+                raise LLMError(f"All {len(candidates)} candidate drafts failed")
+            if len(drafts) == 1 or self._check_signal():
+                self._emit_draft(ass_filename, i, drafts[0])
+                review(drafts[0], 0)
+                return
+
+            self.log(f"Ranking {len(drafts)} candidates for Task {i+1}...", ass_filename)
+            try:
+                self._check_budget()
+                ranking = self._call(self._rank_input(drafts), context=prefix, phase="rank")
+            except (LLMError, BudgetExceeded) as e:
+                self.log(f"QA unavailable for Task {i+1}, keeping first candidate: {e}", ass_filename)
+                self._emit_draft(ass_filename, i, drafts[0])
+                finish(drafts[0])
+                return
+            draft, verdict = self._pick_candidate(ass_filename, i, drafts, ranking)
+            judge(draft, verdict, 0)
+
+        def review(draft: str, qa_attempts: int):
+            if self._check_signal():
+                finish(draft)
+                return
+
+            try:
+                self._check_budget()
+                feedback = self._call(self._qa_input(draft), context=prefix, phase="qa")
+            except (LLMError, BudgetExceeded) as e:
+                self.log(f"QA unavailable for Task {i+1}, keeping draft: {e}", ass_filename)
+                finish(draft)
+                return
+            
+            judge(draft, self._review(ass_filename, i, feedback), qa_attempts)
+
+        def judge(draft: str, verdict: QAVerdict, qa_attempts: int):
+            if verdict.passed:
+                self.log(f"QA Passed for Task {i+1}.", ass_filename)
+                finish(draft)
+                return
+            
+            qa_attempts += 1
+            if qa_attempts > self.max_qa_retries:
+                self.log(f"QA failed max retries for Task {i+1}.", ass_filename)
+                finish(draft)
+                return
+                
+            self.log(f"QA failed (Attempt {qa_attempts}/{self.max_qa_retries}). Improving Task {i+1}...", ass_filename)
+            follow_up(lambda: refine(verdict.feedback(), draft, qa_attempts), "refine")
+
+        def refine(feedback: str, draft: str, qa_attempts: int):
+            try:
+                self._check_budget()
+                new_draft = self._draft_call(ass_filename, i, self._refinement_input(feedback, draft), context=prefix, phase="refine")
+            except (LLMError, BudgetExceeded) as e:
+                self.log(f"Refinement failed for Task {i+1}, keeping previous draft: {e}", ass_filename)
+                finish(draft)
+                return
+            follow_up(lambda: review(new_draft, qa_attempts), "qa")
+
+        # Shortest expected worker calls first (prompt size as the estimate)
+        priority = (PRIORITY_WORKER, len(prefix) + len(task))
+        if len(candidates) > 1:
+            nodes = [follow_up(lambda k=k: candidate(k), f"work{k}", priority=priority) for k in range(len(candidates))]
+            follow_up(rank, "rank", deps=nodes)
+        else:
+            follow_up(work, "work", priority=priority)
+
+    def _thread_init(self) -> Callable[[], None]:
+        # Capture context if running in Streamlit
+        ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+        def thread_init():
+            # Apply context to the worker thread
+            if add_script_run_ctx and ctx:
+                add_script_run_ctx(threading.current_thread(), ctx)
+
+        return thread_init
+
+    def _new_scheduler(self, max_workers: int) -> TaskScheduler:
+        return TaskScheduler(max_workers, self._thread_init())
+
+    def process_assignment(self, ass_path: str, output_dir: str, full_context: str, input_overview: str, custom_prompt: str) -> str:
+        reports = []
+        scheduler = self._new_scheduler(self.max_subtasks)
+        self._schedule_assignment(scheduler, ass_path, output_dir, full_context, input_overview, self._user_instructions(custom_prompt), reports)
+        scheduler.run()
+        return reports[0] if reports else ""
+
+    def run(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str = "", resume: bool = False) -> str:
+        """
+        Runs all assignments as one DAG of planner/worker/QA/refinement calls
+        on a single pool of max_concurrency threads.
+        With resume=True, plans and tasks completed in the journal of a previous
+        run are reused instead of regenerated.
+        """
         self.log(f"Starting process for {hz_name}...")
         self.log(f"Model: {self.model} | Budget Cap: ${self.cost_limit}")
         self.log(f"Selected Assignments: {len(assignment_paths)}")
         
-        full_context = ""
-        input_overview = ""
-        for filename, text in input_texts.items():
-            full_context += f"--- START FILE: {os.path.basename(filename)} ---\n{text[:20000]}...\n--- END FILE ---\n\n"
-            input_overview += f"- {os.path.basename(filename)}\n"
+        full_context, input_overview = self._build_context(input_texts)
 
         output_dir = os.path.join("output", hz_name)
         os.makedirs(output_dir, exist_ok=True)
         
         final_reports = []
-        
-        # Capture context if running in Streamlit
-        ctx = get_script_run_ctx() if get_script_run_ctx else None
+        user_instructions = self._user_instructions(custom_prompt)
+        scheduler = self._new_scheduler(self.max_concurrency)
+        self._open_journal(output_dir, resume)
+        try:
+            for ass_path in assignment_paths:
+                self._schedule_assignment(scheduler, ass_path, output_dir, full_context, input_overview, user_instructions, final_reports)
+            scheduler.run()
+        finally:
+            self._close_journal()
+            self._finish_trace(output_dir)
+            self.llm.release_caches()
 
-        def assignment_wrapper(*args, **kwargs):
-            # Apply context to the worker thread
-            if add_script_run_ctx and ctx:
-                add_script_run_ctx(threading.current_thread(), ctx)
-            return self.process_assignment(*args, **kwargs)
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
-            futures = []
+        return "\n\n---\n\n".join(final_reports)
+
+    # --- Queue engine ---
+    # Plan, task and integration steps become jobs of a JobQueue, executed by
+    # worker processes (src/agent/worker.py) on this or other machines.
+
+    def _queue_config(self) -> Dict:
+        """
+        Settings the workers of a queued run build their Agent with.
+        """
+        return dict(
+            provider=self.llm.provider, model=self.model, cost_limit=self.cost_limit,
+            max_subtasks=self.max_subtasks, skip_qa=self.skip_qa, max_qa_retries=self.max_qa_retries,
+            min_qa_score=self.min_qa_score, length_profile=self.length_profile, cache_mode=self.llm.cache_mode,
+            use_retrieval=self.use_retrieval, retrieval_top_k=self.retrieval_top_k, context_token_budget=self.context_token_budget,
+            qa_mode=self.qa_mode, qa_candidates=self.qa_candidates, summarize_inputs=self.summarize_inputs,
+            summary_model=self.summary_model, digest_chars=self.digest_chars
+        )
+
+    def _run_single_task(self, ass_filename: str, i: int, tasks: List[str], assignment_text: str, full_context: str, user_instructions: str) -> Dict[str, str]:
+        """
+        Runs one planned task (draft, QA, refinement) on its own.
+        """
+        state = {"assignment_text": assignment_text, "tasks": tasks, "results": [None] * len(tasks)}
+        scheduler = self._new_scheduler(self.max_subtasks)
+        self._schedule_task(scheduler, None, state, ass_filename, i, full_context, user_instructions)
+        scheduler.run()
+        return state["results"][i]
+
+    def prepare_queued(self, hz_name: str, input_texts: Dict[str, str], custom_prompt: str = "", digest: Optional[str] = None):
+        """
+        Builds the context of a queued run, once per worker process, from the
+        digest built at submit time (None: build it here).
+        """
+        full_context, input_overview = self._build_context(input_texts, digest)
+        output_dir = os.path.join("output", hz_name)
+        os.makedirs(output_dir, exist_ok=True)
+        self._queued = {
+            "full_context": full_context,
+            "input_overview": input_overview,
+            "user_instructions": self._user_instructions(custom_prompt),
+            "output_dir": output_dir,
+        }
+
+    def execute_job(self, job: Job, queue: JobQueue) -> Tuple[Dict, List[NewJob]]:
+        """
+        Executes one job of a queued run prepared with prepare_queued().
+        Returns its result and the jobs it adds; raises if it failed (see
+        TRANSIENT_ERRORS for the failures that are retried).
+        """
+        ctx = self._queued
+        ass_path = job.payload["assignment"]
+        ass_filename = os.path.basename(ass_path)
+
+        if job.kind == "plan":
+            _, tasks = self._make_plan(ass_path, ctx["input_overview"], ctx["user_instructions"])
+            task_jobs = [
+                NewJob("task", {"assignment": ass_path, "index": i, "tasks": tasks}, group=job.group, priority=PRIORITY_WORKER)
+                for i in range(len(tasks))
+            ]
+            return {"tasks": tasks}, task_jobs
+
+        if job.kind == "task":
+            i, tasks = job.payload["index"], job.payload["tasks"]
+            result = self._run_single_task(ass_filename, i, tasks, load_cached(ass_path), ctx["full_context"], ctx["user_instructions"])
+            if result.get("error"):
+                raise (LLMError if result.get("retryable") else PermanentJobError)(result["error"])
+            return result, []
+
+        if job.kind == "integrate":
+            task_results = []
+            for task_job in queue.jobs(job.run_id, group=job.after):
+                if task_job.kind != "task":
+                    continue
+                if task_job.status == "done":
+                    task_results.append(task_job.result)
+                else:
+                    task = task_job.payload["tasks"][task_job.payload["index"]]
+                    task_results.append({"task": task, "content": "", "error": task_job.error or task_job.status})
+            if not task_results:
+                return {"report": ""}, []
+            return {"report": self._save_assignment(ass_path, ctx["output_dir"], task_results)}, []
+
+        raise ValueError(f"Unknown job kind: {job.kind}")
+
+    def _on_job_done(self, job: Job):
+        ass_filename = os.path.basename(job.payload["assignment"])
+        if job.status == "failed":
+            self.log(f"Job {job.kind} failed after {job.attempts} attempt(s): {job.error}", ass_filename)
+        elif job.kind == "plan":
+            self.log(f"Planned {len(job.result['tasks'])} tasks.", ass_filename)
+            if self.on_plan_generated:
+                self.on_plan_generated(ass_filename, job.result["tasks"])
+        elif job.kind == "task":
+            i = job.payload["index"]
+            self.log(f"Task {i+1} done ({job.worker}).", ass_filename)
+            if self.on_task_finished:
+                self.on_task_finished(ass_filename, i, f"## {job.result['task']}\n\n{job.result['content']}")
+        elif job.kind == "integrate":
+            self.log(f"Integrated ({job.worker}).", ass_filename)
+
+    def run_queued(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], queue: JobQueue, custom_prompt: str = "", resume: bool = False, poll_interval: float = 1.0) -> str:
+        """
+        Runs all assignments as jobs of `queue`: one plan job per assignment
+        (which adds one job per task) and one integration job that waits for
+        them. Worker processes do the work; this only submits the run, follows
+        its progress through the callbacks and returns the summary report.
+        With resume=True the newest unfinished run of the HZ is continued:
+        its failed jobs and integrations are queued again.
+        Interrupting the wait cancels the run's remaining jobs.
+        """
+        self.log(f"Starting queued process for {hz_name} (queue: {queue.path})...")
+        self.log(f"Model: {self.model} | Budget Cap: ${self.cost_limit}")
+
+        run_id = queue.latest_run(hz_name) if resume else None
+        if run_id:
+            requeued = queue.resume_run(run_id)
+            self.log(f"Resuming queued run {run_id}: {requeued} job(s) queued again.")
+        else:
+            jobs = []
             for ass_path in assignment_paths:
-                futures.append(
-                    executor.submit(
-                        assignment_wrapper, 
-                        ass_path, 
-                        output_dir, 
-                        full_context, 
-                        input_overview, 
-                        custom_prompt
+                group = os.path.basename(ass_path)
+                jobs.append(NewJob("plan", {"assignment": ass_path}, group=group, priority=PRIORITY_PLAN))
+                jobs.append(NewJob("integrate", {"assignment": ass_path}, after=group, priority=PRIORITY_CONTINUE))
+            # Summarized once here instead of once per worker process
+            cost_before = self.total_cost
+            digest = self._build_digest(input_texts) if self.summarize_inputs else ""
+            config = {"agent": self._queue_config(), "custom_prompt": custom_prompt, "digest": digest}
+            run_id = queue.create_run(hz_name, config, input_texts, jobs)
+            if self.total_cost > cost_before:
+                queue.add_cost(run_id, self.total_cost - cost_before)
+            self.log(f"Queued run {run_id}: {len(assignment_paths)} assignment(s). Waiting for workers...")
+
+        reported = set()
+        try:
+            while True:
+                jobs = queue.jobs(run_id)
+                for job in jobs:
+                    if job.status in ("done", "failed") and (job.id, job.status) not in reported:
+                        reported.add((job.id, job.status))
+                        self._on_job_done(job)
+
+                cost = queue.run_cost(run_id)
+                if cost != self.total_cost:
+                    self.total_cost = cost
+                    if self.on_update:
+                        self.on_update({"total_cost": self.total_cost, "tokens": self.accumulated_tokens, "cache": self.cache_stats})
+
+                if jobs and all(job.status in FINISHED for job in jobs):
+                    break
+                time.sleep(poll_interval)
+        except BaseException:
+            queue.cancel_run(run_id)
+            self.log(f"Queued run {run_id} cancelled.")
+            raise
+        queue.finish_run(run_id)
+
+        reports = [job.result.get("report") for job in jobs if job.kind == "integrate" and job.status == "done"]
+        return "\n\n---\n\n".join(report for report in reports if report)
+
+    # --- Async engine ---
+    # Every plan/worker/QA call is a coroutine on one event loop. A single
+    # semaphore (max_concurrency) bounds the in-flight LLM calls instead of
+    # the multiplied max_parallel x max_subtasks thread pools.
+
+    async def _acall(self, user_prompt: str, context: str = "", phase: str = "call", temperature: float = 0.7) -> str:
+        prompt = self.system_prompt_formatted + context + user_prompt
+        with self.tracer.span(f"llm.{phase}") as span:
+            queued = time.monotonic()
+            async with self._semaphore:
+                span.set(queue_wait_s=time.monotonic() - queued)
+                reservation = self._reserve(self._estimate_cost(prompt))
+                try:
+                    response = await self.llm.agenerate_text(
+                        system_prompt=self.system_prompt_formatted,
+                        user_prompt=user_prompt,
+                        temperature=temperature,
+                        context=context
                     )
-                )
+                except BaseException:
+                    self._release(reservation)
+                    raise
+            self._track_usage(prompt, response, reservation)
+            self._trace_response(span, response)
+        return response
+
+    async def _adraft_call(self, ass_filename: str, i: int, user_prompt: str, context: str = "", phase: str = "work") -> str:
+        if not self.stream_drafts:
+            draft = await self._acall(user_prompt, context, phase)
+        else:
+            prompt = self.system_prompt_formatted + context + user_prompt
+            with self.tracer.span(f"llm.{phase}", stream=True) as span:
+                queued = time.monotonic()
+                async with self._semaphore:
+                    span.set(queue_wait_s=time.monotonic() - queued)
+                    reservation = self._reserve(self._estimate_cost(prompt))
+                    stream = self.llm.astream_text(
+                        system_prompt=self.system_prompt_formatted,
+                        user_prompt=user_prompt,
+                        context=context
+                    )
+                    state = self._new_stream_state()
+                    try:
+                        async for delta in stream:
+                            if self._on_stream_delta(ass_filename, i, state, delta):
+                                await stream.aclose()
+                                break
+                    except BaseException:
+                        self._release(reservation)
+                        raise
+                draft = stream.response if stream.response is not None else LLMResponse(state["text"])
+                self._track_usage(prompt, draft, reservation)
+                self._trace_response(span, draft, state)
+
+        self._emit_draft(ass_filename, i, draft)
+        return draft
+
+    def skip_current(self):
+        """
+        Cancels all QA loops currently in flight (async mode). The affected tasks
+        keep their latest draft. Safe to call from any thread.
+        """
+        def _cancel():
+            for qa_task in list(self._qa_tasks):
+                self._skipped_qa.add(qa_task)
+                qa_task.cancel()
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(_cancel)
+
+    def cancel(self):
+        """
+        Cancels the whole async run. Safe to call from any thread.
+        """
+        if self._loop and self._run_task and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._run_task.cancel)
+
+    async def _watch_skip_signal(self):
+        # Bridges the file-based skip button of the GUI to Task.cancel()
+        while True:
+            await asyncio.sleep(0.5)
+            if self._check_signal():
+                self.skip_current()
+
+    async def _aqa_loop(self, ass_filename: str, i: int, prefix: str, state: Dict):
+        qa_attempts = 0
+        verdict = None
+        candidates = state.get("candidates", [])
+        if len(candidates) > 1:
+            self.log(f"Ranking {len(candidates)} candidates for Task {i+1}...", ass_filename)
+            ranking = await self._acall(self._rank_input(candidates), context=prefix, phase="rank")
+            state["draft"], verdict = self._pick_candidate(ass_filename, i, candidates, ranking)
+
+        while True:
+            if verdict is None:
+                review = await self._acall(self._qa_input(state["draft"]), context=prefix, phase="qa")
+                verdict = self._review(ass_filename, i, review)
+
+            if verdict.passed:
+                self.log(f"QA Passed for Task {i+1}.", ass_filename)
+                return
             
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    result = future.result()
-                    if result:
-                        final_reports.append(result)
-                except Exception as e:
-                    self.log(f"Error in assignment thread: {e}")
+            qa_attempts += 1
+            if qa_attempts > self.max_qa_retries:
+                self.log(f"QA failed max retries for Task {i+1}.", ass_filename)
+                return
+                
+            self.log(f"QA failed (Attempt {qa_attempts}/{self.max_qa_retries}). Improving Task {i+1}...", ass_filename)
+            self._check_budget()
+            
+            state["draft"] = await self._adraft_call(ass_filename, i, self._refinement_input(verdict.feedback(), state["draft"]), context=prefix, phase="refine")
+            verdict = None
+
+    async def _acandidates(self, ass_filename: str, i: int, prompt: str, prefix: str) -> List[str]:
+        """
+        Drafts qa_candidates variants of a task concurrently.
+        """
+        results = await asyncio.gather(*[
+            self._acall(prompt, context=prefix, phase="work", temperature=self._candidate_temperature(k))
+            for k in range(self._candidate_count())
+        ], return_exceptions=True)
+        drafts = []
+        for k, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, LLMError):
+                self.log(f"Candidate {k+1} for Task {i+1} failed: {result}", ass_filename)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                drafts.append(result)
+        if not drafts:
+            raise LLMError(f"All {len(results)} candidate drafts failed")
+        return drafts
+
+    async def _aprocess_task(self, ass_filename: str, task: str, i: int, total_tasks: int, full_context: str, assignment_text: str, user_instructions: str) -> Dict[str, str]:
+        if "[SKIP]" in task.upper():
+            return self._skip_result(ass_filename, task, i)
+
+        done = self._journaled_result(ass_filename, i)
+        if done is not None:
+            return done
+
+        self._check_budget()
+        self.log(f"Starting Task {i+1}/{total_tasks}: {task}", ass_filename)
+        
+        if self.on_section_start:
+            self.on_section_start(ass_filename, task, assignment_text, i, total_tasks)
+
+        prefix = self._shared_prefix(self._task_context(task, full_context), assignment_text)
+        candidates = []
+        if self._candidate_count() > 1:
+            candidates = await self._acandidates(ass_filename, i, self._worker_input(task, user_instructions), prefix)
+            draft = candidates[0]
+            if len(candidates) == 1:
+                self._emit_draft(ass_filename, i, draft)
+        else:
+            draft = await self._adraft_call(ass_filename, i, self._worker_input(task, user_instructions), context=prefix)
+        
+        if self.skip_qa:
+            self.log(f"Skipping QA Review for Task {i+1}.", ass_filename)
+        else:
+            self.log(f"QA Review for Task {i+1}...", ass_filename)
+            state = {"draft": draft, "candidates": candidates}
+            qa_task = asyncio.ensure_future(self._aqa_loop(ass_filename, i, prefix, state))
+            self._qa_tasks.add(qa_task)
+            try:
+                await qa_task
+            except (LLMError, BudgetExceeded) as e:
+                self.log(f"QA unavailable for Task {i+1}, keeping draft: {e}", ass_filename)
+            except asyncio.CancelledError:
+                # A skip only cancels the QA loop; a cancelled run propagates
+                if qa_task not in self._skipped_qa:
+                    raise
+                self.log(f"User requested skip. Keeping current draft for Task {i+1}.", ass_filename)
+            finally:
+                self._qa_tasks.discard(qa_task)
+                self._skipped_qa.discard(qa_task)
+            draft = state["draft"]
+        
+        return self._finish_task(ass_filename, task, i, draft)
+
+    async def aprocess_assignment(self, ass_path: str, output_dir: str, full_context: str, input_overview: str, custom_prompt: str) -> str:
+        ass_filename = os.path.basename(ass_path)
+        self.log(f"Processing Assignment: {ass_filename}", ass_filename)
+        
+        with self.tracer.span("load.assignment", assignment=ass_filename):
+            assignment_text = await asyncio.to_thread(load_cached, ass_path)
+        if not assignment_text:
+            self.log(f"Skipping empty assignment: {ass_filename}", ass_filename)
+            return ""
+        
+        self.log(f"Loaded assignment text ({len(assignment_text)} chars).", ass_filename)
+
+        user_instructions = self._user_instructions(custom_prompt)
+        tasks = self._journaled_plan(ass_filename, assignment_text)
+        if tasks is None:
+            self._check_budget()
+            self.log(f"Creating a plan...", ass_filename)
+            plan_response = await self._acall(self._planner_input(assignment_text, input_overview, user_instructions), phase="plan")
+            tasks = self._parse_plan(ass_filename, plan_response)
+            self._record_plan(ass_filename, assignment_text, tasks)
+
+        results = await asyncio.gather(*[
+            self._aprocess_task(ass_filename, task, i, len(tasks), full_context, assignment_text, user_instructions)
+            for i, task in enumerate(tasks)
+        ], return_exceptions=True)
+
+        task_results = []
+        for idx, result in enumerate(results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                result = self._failed_result(ass_filename, tasks[idx], idx, result)
+            task_results.append(result)
+
+        # python-docx work is blocking, keep it off the event loop
+        return await asyncio.to_thread(self._save_assignment, ass_path, output_dir, task_results)
+
+    async def _arun(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str, resume: bool) -> str:
+        self.log(f"Starting process for {hz_name} (async, max {self.max_concurrency} concurrent calls)...")
+        self.log(f"Model: {self.model} | Budget Cap: ${self.cost_limit}")
+        self.log(f"Selected Assignments: {len(assignment_paths)}")
+
+        full_context, input_overview = self._build_context(input_texts)
+
+        output_dir = os.path.join("output", hz_name)
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._open_journal(output_dir, resume)
+        watcher = asyncio.ensure_future(self._watch_skip_signal())
+        try:
+            results = await asyncio.gather(*[
+                self.aprocess_assignment(ass_path, output_dir, full_context, input_overview, custom_prompt)
+                for ass_path in assignment_paths
+            ], return_exceptions=True)
+        finally:
+            watcher.cancel()
+            self._close_journal()
+            self._finish_trace(output_dir)
+            self.llm.release_caches()
+
+        final_reports = []
+        for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, Exception):
+                self.log(f"Error in assignment: {result}")
+            elif result:
+                final_reports.append(result)
+
+        return "\n\n---\n\n".join(final_reports)
+
+    async def arun(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str = "", resume: bool = False) -> str:
+        """
+        Async variant of run(). Use `asyncio.run(agent.arun(...))` from sync code.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._run_task = asyncio.ensure_future(self._arun(hz_name, assignment_paths, input_texts, custom_prompt, resume))
+        try:
+            return await self._run_task
+        finally:
+            self._run_task = None
+            # The loop's SDK clients (and their connections) end with the run
+            await close_async_clients()
+
+    # --- Batch mode ---
+    # For non-interactive runs: every round of calls (plans, drafts, QA,
+    # refinements) across all assignments is submitted as one provider batch
+    # job. Slower, but billed at the batch discount and free of rate limits.
+
+    def _batch_round(self, runner: BatchRunner, requests: Dict[str, tuple], phase: str) -> Dict[str, object]:
+        """
+        requests: custom_id -> (user_prompt, context[, temperature]). Returns custom_id -> LLMResponse or LLMError.
+        """
+        if not requests:
+            return {}
+        # The whole round is reserved up front (at the full, undiscounted rate)
+        reservation = self._reserve(sum(
+            self._estimate_cost(self.system_prompt_formatted + req[1] + req[0])
+            for req in requests.values()
+        ))
+        try:
+            with self.tracer.span(f"batch.{phase}", requests=len(requests)):
+                results = runner.run([
+                    BatchRequest(custom_id=cid, system_prompt=self.system_prompt_formatted, user_prompt=req[0], context=req[1], temperature=req[2] if len(req) > 2 else 0.7)
+                    for cid, req in requests.items()
+                ])
+        finally:
+            self._release(reservation)
+        for cid, req in requests.items():
+            if not isinstance(results[cid], LLMError):
+                self._track_usage(self.system_prompt_formatted + req[1] + req[0], results[cid])
+        return results
+
+    def run_batch(self, hz_name: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str = "", poll_interval: float = 30.0, runner: Optional[BatchRunner] = None, resume: bool = False) -> str:
+        output_dir = os.path.join("output", hz_name)
+        os.makedirs(output_dir, exist_ok=True)
+        self._open_journal(output_dir, resume)
+        try:
+            return self._run_batch(hz_name, output_dir, assignment_paths, input_texts, custom_prompt, poll_interval, runner)
+        finally:
+            self._close_journal()
+            self._finish_trace(output_dir)
+            self.llm.release_caches()
+
+    def _run_batch(self, hz_name: str, output_dir: str, assignment_paths: List[str], input_texts: Dict[str, str], custom_prompt: str, poll_interval: float, runner: Optional[BatchRunner]) -> str:
+        self.log(f"Starting batch process for {hz_name}...")
+        self.log(f"Model: {self.model} | Budget Cap: ${self.cost_limit}")
+        self.log(f"Selected Assignments: {len(assignment_paths)}")
+
+        full_context, input_overview = self._build_context(input_texts)
+        user_instructions = self._user_instructions(custom_prompt)
+        runner = runner or BatchRunner(self.llm, poll_interval=poll_interval, log=self.log, max_concurrency=self.max_concurrency, limits=self.limits)
+
+        # 1. Plans
+        assignments = []
+        for ass_path in assignment_paths:
+            ass_filename = os.path.basename(ass_path)
+            with self.tracer.span("load.assignment", assignment=ass_filename):
+                assignment_text = load_cached(ass_path)
+            if not assignment_text:
+                self.log(f"Skipping empty assignment: {ass_filename}", ass_filename)
+                continue
+            assignments.append({"path": ass_path, "name": ass_filename, "text": assignment_text,
+                                "tasks": self._journaled_plan(ass_filename, assignment_text)})
+
+        plans = self._batch_round(runner, {
+            f"plan-{a}": (self._planner_input(ass["text"], input_overview, user_instructions), "")
+            for a, ass in enumerate(assignments) if ass["tasks"] is None
+        }, "plan")
+
+        # 2. Drafts
+        drafts = {}
+        prefixes = {}
+        for a, ass in enumerate(assignments):
+            if ass["tasks"] is None:
+                plan = plans[f"plan-{a}"]
+                if isinstance(plan, LLMError):
+                    self.log(f"Error in assignment {ass['name']}: {plan}")
+                    ass["tasks"] = []
+                    continue
+                ass["tasks"] = self._parse_plan(ass["name"], plan)
+                self._record_plan(ass["name"], ass["text"], ass["tasks"])
+            ass["results"] = [None] * len(ass["tasks"])
+            for i, task in enumerate(ass["tasks"]):
+                if "[SKIP]" in task.upper():
+                    ass["results"][i] = self._skip_result(ass["name"], task, i)
+                    continue
+                done = self._journaled_result(ass["name"], i)
+                if done is not None:
+                    ass["results"][i] = done
+                    continue
+                prefixes[(a, i)] = self._shared_prefix(self._task_context(task, full_context), ass["text"])
+                if self.on_section_start:
+                    self.on_section_start(ass["name"], task, ass["text"], i, len(ass["tasks"]))
+
+        # qa_candidates > 1: K variants per task, ranked in the first QA round
+        count = self._candidate_count()
+        results = self._batch_round(runner, {
+            f"work-{a}-{i}-{k}": (self._worker_input(assignments[a]["tasks"][i], user_instructions), prefix, self._candidate_temperature(k))
+            for (a, i), prefix in prefixes.items() for k in range(count)
+        }, "work")
+        candidates = {}
+        for (a, i) in prefixes:
+            ass = assignments[a]
+            variants = [results[f"work-{a}-{i}-{k}"] for k in range(count)]
+            ok = [v for v in variants if not isinstance(v, LLMError)]
+            if not ok:
+                ass["results"][i] = self._failed_result(ass["name"], ass["tasks"][i], i, variants[0])
+                continue
+            drafts[(a, i)] = ok[0]
+            candidates[(a, i)] = ok
+            if len(ok) == 1:
+                self._emit_draft(ass["name"], i, ok[0])
+
+        def ranked(a: int, i: int) -> bool:
+            return qa_attempts == 0 and len(candidates[(a, i)]) > 1
+
+        # 3. QA rounds: review all open drafts, refine the failing ones, repeat
+        open_tasks = [] if self.skip_qa else list(drafts)
+        qa_attempts = 0
+        while open_tasks:
+            try:
+                reviews = self._batch_round(runner, {
+                    f"qa-{a}-{i}-{qa_attempts}": (self._rank_input(candidates[(a, i)]) if ranked(a, i) else self._qa_input(drafts[(a, i)]), prefixes[(a, i)])
+                    for (a, i) in open_tasks
+                }, "qa")
+            except BudgetExceeded as e:
+                self.log(f"QA stopped, keeping the current drafts: {e}")
+                break
+            failing = []
+            for (a, i) in open_tasks:
+                ass_name = assignments[a]["name"]
+                review = reviews[f"qa-{a}-{i}-{qa_attempts}"]
+                if isinstance(review, LLMError):
+                    if ranked(a, i):
+                        self._emit_draft(ass_name, i, drafts[(a, i)])
+                    self.log(f"QA unavailable for Task {i+1}, keeping draft: {review}", ass_name)
+                    continue
+                if ranked(a, i):
+                    drafts[(a, i)], verdict = self._pick_candidate(ass_name, i, candidates[(a, i)], review)
+                else:
+                    verdict = self._review(ass_name, i, review)
+                if verdict.passed:
+                    self.log(f"QA Passed for Task {i+1}.", ass_name)
+                else:
+                    failing.append(((a, i), verdict))
+
+            qa_attempts += 1
+            if qa_attempts > self.max_qa_retries:
+                for (a, i), _ in failing:
+                    self.log(f"QA failed max retries for Task {i+1}.", assignments[a]["name"])
+                break
+
+            try:
+                refined = self._batch_round(runner, {
+                    f"refine-{a}-{i}-{qa_attempts}": (self._refinement_input(verdict.feedback(), drafts[(a, i)]), prefixes[(a, i)])
+                    for (a, i), verdict in failing
+                }, "refine")
+            except BudgetExceeded as e:
+                self.log(f"Refinement stopped, keeping the current drafts: {e}")
+                break
+            open_tasks = []
+            for (a, i), _ in failing:
+                new_draft = refined[f"refine-{a}-{i}-{qa_attempts}"]
+                if isinstance(new_draft, LLMError):
+                    self.log(f"Refinement failed for Task {i+1}, keeping previous draft: {new_draft}", assignments[a]["name"])
+                    continue
+                drafts[(a, i)] = new_draft
+                self._emit_draft(assignments[a]["name"], i, new_draft)
+                open_tasks.append((a, i))
+
+        # 4. Clean up and integrate
+        final_reports = []
+        for a, ass in enumerate(assignments):
+            if not ass["tasks"]:
+                continue
+            for (da, i), draft in drafts.items():
+                if da == a:
+                    ass["results"][i] = self._finish_task(ass["name"], ass["tasks"][i], i, draft)
+            final_reports.append(self._save_assignment(ass["path"], output_dir, ass["results"]))
 
-        return "\n\n---\n\n".join(final_reports)
\ No newline at end of file
+        return "\n\n---\n\n".join(final_reports)
@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+EVENT_KINDS = ("log", "plan", "section", "draft", "qa", "finished", "cost")
+# Only the latest value matters: a newer event replaces a still queued one
+COALESCED = {"draft", "cost"}
+
+@dataclass
+class AgentEvent:
+    kind: str
+    assignment: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    time: float = field(default_factory=time.time)
+    superseded: bool = False
+
+class EventQueue:
+    """
+    Bounded, thread-safe queue of agent events for a UI to consume.
+    Agent threads publish without blocking, the UI drains it periodically.
+    Draft and cost updates replace a queued one of the same assignment
+    instead of piling up; when the queue is full the oldest events are dropped.
+    """
+
+    def __init__(self, maxsize: int = 5000):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.events: Deque[AgentEvent] = deque()
+        self.latest: Dict[Tuple[str, Optional[str]], AgentEvent] = {}
+        self.dropped = 0
+
+    def publish(self, kind: str, assignment: Optional[str] = None, **data):
+        event = AgentEvent(kind, assignment, data)
+        with self.lock:
+            if kind in COALESCED:
+                queued = self.latest.get((kind, assignment))
+                if queued is not None:
+                    # Keep the order with other events: the new value goes to the end
+                    queued.superseded = True
+                    queued.data = {}
+                self.latest[(kind, assignment)] = event
+            if len(self.events) >= self.maxsize:
+                self.events.popleft()
+                self.dropped += 1
+            self.events.append(event)
+
+    def drain(self) -> List[AgentEvent]:
+        with self.lock:
+            events = [e for e in self.events if not e.superseded]
+            self.events.clear()
+            self.latest.clear()
+        return events
+
+    def connect(self, agent):
+        """
+        Routes the agent's callbacks into this queue.
+        """
+        def on_update(data):
+            # The agent keeps mutating its counters, publish a snapshot
+            self.publish("cost", total_cost=data["total_cost"], tokens=dict(data["tokens"]), cache=dict(data.get("cache", {})))
+
+        agent.on_log = lambda message, ass_name=None: self.publish("log", ass_name, message=message)
+        agent.on_update = on_update
+        agent.on_plan_generated = lambda ass_name, tasks: self.publish("plan", ass_name, tasks=list(tasks))
+        agent.on_section_start = lambda ass_name, task, reqs, i, total: self.publish("section", ass_name, task=task, reqs=reqs, index=i, total=total)
+        agent.on_draft = lambda ass_name, text: self.publish("draft", ass_name, text=text)
+        agent.on_qa_feedback = lambda ass_name, text: self.publish("qa", ass_name, text=text)
+        agent.on_task_finished = lambda ass_name, i, text: self.publish("finished", ass_name, index=i, text=text)
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from src.agent.limits import RunLimits
+from src.agent.scheduler import PRIORITY_WORKER
+from src.llm.ratelimit import LLMError
+
+DEFAULT_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(".cache", "jobs.sqlite"))
+
+JOB_KINDS = ("plan", "task", "integrate")
+# pending -> running -> done | failed | cancelled
+FINISHED = ("done", "failed", "cancelled")
+
+# Failures a later attempt may not hit again (provider, files, database).
+# Anything else (budget stop, bad input, bugs) fails the job right away.
+TRANSIENT_ERRORS = (LLMError, OSError, sqlite3.Error)
+
+class PermanentJobError(Exception):
+    """
+    A job failure that retrying cannot fix.
+    """
+
+@dataclass
+class NewJob:
+    kind: str
+    payload: Dict[str, Any]
+    group: str = ""  # jobs of one run another job can wait for
+    after: str = ""  # group (of the same run) that must be finished before this job runs
+    priority: int = PRIORITY_WORKER
+
+@dataclass
+class Job:
+    id: int
+    run_id: str
+    kind: str
+    payload: Dict[str, Any]
+    group: str = ""
+    after: str = ""
+    status: str = "pending"
+    attempts: int = 0
+    worker: str = ""
+    result: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+
+_JOB_COLUMNS = "id, run_id, kind, payload, grp, after, status, attempts, worker, result, error"
+
+def _job(row) -> Job:
+    id, run_id, kind, payload, grp, after, status, attempts, worker, result, error = row
+    return Job(id, run_id, kind, json.loads(payload), grp, after, status, attempts, worker or "", json.loads(result) if result else {}, error or "")
+
+class JobQueue:
+    """
+    Durable job queue in one SQLite file, shared by the agent submitting a run
+    and any number of worker processes, on this machine or on others that
+    share the directory.
+
+    Workers claim a job with a lease and extend it while they work on it; a
+    job whose worker died is claimed again once its lease ran out. Failed jobs
+    are retried with exponential backoff until max_attempts. A job with
+    `after` set is only claimed when no job of that group is unfinished.
+    Uses the rollback journal, not WAL: WAL needs shared memory, which
+    network file systems don't provide.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = 3, retry_delay: float = 10.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        # Autocommit; write transactions are opened explicitly (BEGIN IMMEDIATE)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id TEXT PRIMARY KEY,
+                    hz_name TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    inputs TEXT NOT NULL,
+                    cost REAL NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'running',
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    grp TEXT NOT NULL DEFAULT '',
+                    after TEXT NOT NULL DEFAULT '',
+                    priority INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    not_before REAL NOT NULL DEFAULT 0,
+                    lease_until REAL NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    result TEXT,
+                    error TEXT,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, priority, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_run ON jobs(run_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_grp ON jobs(run_id, grp, status)")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def _insert(self, conn: sqlite3.Connection, run_id: str, jobs: List[NewJob]):
+        now = time.time()
+        conn.executemany(
+            "INSERT INTO jobs (run_id, kind, payload, grp, after, priority, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, job.kind, json.dumps(job.payload, ensure_ascii=False), job.group, job.after, job.priority, now) for job in jobs]
+        )
+
+    # --- Runs ---
+
+    def create_run(self, hz_name: str, config: Dict[str, Any], input_texts: Dict[str, str], jobs: List[NewJob]) -> str:
+        run_id = f"{hz_name}-{uuid.uuid4().hex[:12]}"
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO runs (id, hz_name, config, inputs, created) VALUES (?, ?, ?, ?, ?)",
+                (run_id, hz_name, json.dumps(config, ensure_ascii=False), json.dumps(input_texts, ensure_ascii=False), time.time())
+            )
+            self._insert(conn, run_id, jobs)
+        return run_id
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT hz_name, config, inputs, status FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        hz_name, config, inputs, status = row
+        return {"id": run_id, "hz_name": hz_name, "config": json.loads(config), "inputs": json.loads(inputs), "status": status}
+
+    def run_status(self, run_id: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT status FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def latest_run(self, hz_name: str) -> Optional[str]:
+        """
+        The newest run of an HZ that was not finished (e.g. interrupted).
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id FROM runs WHERE hz_name = ? AND status != 'done' ORDER BY created DESC LIMIT 1", (hz_name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def resume_run(self, run_id: str) -> int:
+        """
+        Queues failed and cancelled jobs of a run again, plus its integrations
+        (they are cheap and need to pick up the retried tasks). Returns the number of jobs queued.
+        """
+        with self._transaction() as conn:
+            conn.execute("UPDATE runs SET status = 'running' WHERE id = ?", (run_id,))
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, not_before = 0, error = NULL, updated = ? "
+                "WHERE run_id = ? AND (status IN ('failed', 'cancelled') OR kind = 'integrate')",
+                (time.time(), run_id)
+            )
+            return cursor.rowcount
+
+    def cancel_run(self, run_id: str):
+        """
+        Cancels all unfinished jobs of a run. Jobs running right now finish,
+        but their results are discarded.
+        """
+        with self._transaction() as conn:
+            conn.execute("UPDATE runs SET status = 'cancelled' WHERE id = ?", (run_id,))
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE run_id = ? AND status IN ('pending', 'running')",
+                (time.time(), run_id)
+            )
+
+    def finish_run(self, run_id: str):
+        with self._transaction() as conn:
+            conn.execute("UPDATE runs SET status = 'done' WHERE id = ?", (run_id,))
+
+    def add_cost(self, run_id: str, cost: float):
+        with self._transaction() as conn:
+            conn.execute("UPDATE runs SET cost = cost + ? WHERE id = ?", (cost, run_id))
+
+    def run_cost(self, run_id: str) -> float:
+        with self.lock:
+            row = self.conn.execute("SELECT cost FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return row[0] if row else 0.0
+
+    # --- Jobs ---
+
+    def jobs(self, run_id: str, group: Optional[str] = None) -> List[Job]:
+        query = f"SELECT {_JOB_COLUMNS} FROM jobs WHERE run_id = ?"
+        args = [run_id]
+        if group is not None:
+            query += " AND grp = ?"
+            args.append(group)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY id", args).fetchall()
+        return [_job(row) for row in rows]
+
+    def claim(self, worker: str, lease: float) -> Optional[Job]:
+        """
+        Takes the most urgent runnable job: a pending one, or a running one
+        whose lease expired. The lease is valid for `lease` seconds.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            while True:
+                row = conn.execute(f"""
+                    SELECT {_JOB_COLUMNS} FROM jobs AS j
+                    WHERE ((status = 'pending' AND not_before <= ?) OR (status = 'running' AND lease_until < ?))
+                    AND (after = '' OR NOT EXISTS (
+                        SELECT 1 FROM jobs AS d WHERE d.run_id = j.run_id AND d.grp = j.after AND d.status IN ('pending', 'running')
+                    ))
+                    ORDER BY priority, id LIMIT 1
+                """, (now, now)).fetchone()
+                if row is None:
+                    return None
+                job = _job(row)
+                if job.status == "running" and job.attempts >= self.max_attempts:
+                    # Its worker died on the last attempt
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?",
+                        (f"Lease of {job.worker} expired after {job.attempts} attempt(s)", now, job.id)
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, worker = ?, updated = ? WHERE id = ?",
+                    (now + lease, worker, now, job.id)
+                )
+                job.status, job.attempts, job.worker = "running", job.attempts + 1, worker
+                return job
+
+    def extend(self, job: Job, lease: float) -> bool:
+        """
+        Renews the lease of a claimed job. False if the job was taken over or cancelled meanwhile.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease, job.id, job.worker)
+            )
+            return cursor.rowcount > 0
+
+    def complete(self, job: Job, result: Dict[str, Any], new_jobs: List[NewJob] = ()) -> bool:
+        """
+        Stores the result and queues the follow-up jobs in one transaction.
+        False (and nothing stored) if the job was taken over or cancelled meanwhile.
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (json.dumps(result, ensure_ascii=False), time.time(), job.id, job.worker)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._insert(conn, job.run_id, list(new_jobs))
+            return True
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """
+        Marks a claimed job as failed, or queues it again after a backoff while
+        attempts are left. Returns True if it will be retried.
+        """
+        now = time.time()
+        retry = retry and job.attempts < self.max_attempts
+        with self._transaction() as conn:
+            if retry:
+                conn.execute(
+                    "UPDATE jobs SET status = 'pending', not_before = ?, error = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                    (now + self.retry_delay * 2 ** (job.attempts - 1), error, now, job.id, job.worker)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                    (error, now, job.id, job.worker)
+                )
+        return retry
+
+    def idle(self) -> bool:
+        """
+        True when no job is pending or running, in any run.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM jobs WHERE status IN ('pending', 'running') LIMIT 1").fetchone()
+        return row is None
+
+class QueueLimits(RunLimits):
+    """
+    RunLimits of a queued run: the spent cost lives in the queue database, so
+    all worker processes of the run count against one budget.
+    """
+
+    def __init__(self, queue: JobQueue, run_id: str, cost_limit: float = 0.0, max_concurrency: int = 0):
+        super().__init__(cost_limit, max_concurrency)
+        self.queue = queue
+        self.run_id = run_id
+
+    def spent(self) -> float:
+        return self.queue.run_cost(self.run_id)
+
+    def commit(self, cost: float, reservation: float):
+        super().commit(cost, reservation)
+        if cost:
+            self.queue.add_cost(self.run_id, cost)
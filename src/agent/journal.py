@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+JOURNAL_FILENAME = "run_journal.jsonl"
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+class RunJournal:
+    """
+    Append-only JSONL record of a run under output/<HZ>/: plans, drafts,
+    QA verdicts and the final cleaned content of each task.
+
+    With resume=True the existing journal is read first, so a re-run can
+    reuse plans and skip tasks that were already completed. Otherwise the
+    journal starts empty.
+    """
+
+    def __init__(self, output_dir: str, resume: bool = False):
+        self.path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.lock = threading.Lock()
+        self.plans: Dict[str, Dict] = {}
+        self.done: Dict[str, Dict[int, Dict[str, str]]] = {}
+
+        if resume:
+            self._load()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+        os.makedirs(output_dir, exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn last line after a crash
+                    continue
+                if entry["type"] == "plan":
+                    self.plans[entry["assignment"]] = entry
+                    # A new plan invalidates results of an older one
+                    self.done[entry["assignment"]] = {}
+                elif entry["type"] == "task_done":
+                    self.done.setdefault(entry["assignment"], {})[entry["index"]] = {
+                        "task": entry["task"], "content": entry["content"]
+                    }
+
+    def _append(self, entry: Dict):
+        entry["ts"] = time.time()
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    # --- Reading (resume) ---
+
+    def get_plan(self, assignment: str, assignment_text: str) -> Optional[List[str]]:
+        """
+        Journaled plan, only if the assignment file is unchanged.
+        """
+        entry = self.plans.get(assignment)
+        if entry and entry.get("hash") == text_hash(assignment_text):
+            return entry["tasks"]
+        return None
+
+    def get_done(self, assignment: str, index: int) -> Optional[Dict[str, str]]:
+        return self.done.get(assignment, {}).get(index)
+
+    # --- Recording ---
+
+    def record_plan(self, assignment: str, assignment_text: str, tasks: List[str]):
+        self.plans[assignment] = {"tasks": tasks, "hash": text_hash(assignment_text)}
+        self.done[assignment] = {}
+        self._append({"type": "plan", "assignment": assignment, "hash": text_hash(assignment_text), "tasks": tasks})
+
+    def record_draft(self, assignment: str, index: int, text: str):
+        self._append({"type": "draft", "assignment": assignment, "index": index, "text": text})
+
+    def record_qa(self, assignment: str, index: int, review: str):
+        self._append({"type": "qa", "assignment": assignment, "index": index, "review": review})
+
+    def record_done(self, assignment: str, index: int, task: str, content: str):
+        self._append({"type": "task_done", "assignment": assignment, "index": index, "task": task, "content": content})
+
+def has_journal(output_dir: str) -> bool:
+    return os.path.exists(os.path.join(output_dir, JOURNAL_FILENAME))
@@ -0,0 +1,72 @@
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+class BudgetExceeded(Exception):
+    """
+    Raised when a call would exceed the cost limit of the run.
+    """
+
+class RunLimits:
+    """
+    Cost budget and LLM call slots of a run. An agent gets its own by
+    default; agents running side by side (several HZs at once) share one, so
+    together they stay within one budget and one concurrency limit.
+
+    The budget counts spent cost plus reservations of calls in flight.
+    Call slots (max_concurrency > 0) are taken by the threaded engine's calls.
+    """
+
+    def __init__(self, cost_limit: float = 0.0, max_concurrency: int = 0):
+        self.cost_limit = cost_limit
+        self.lock = threading.Lock()
+        self.total_cost = 0.0
+        # Estimated cost of calls currently in flight
+        self.reserved_cost = 0.0
+        self.slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+    def spent(self) -> float:
+        """
+        Cost counted against the budget; subclasses may add cost spent elsewhere.
+        """
+        return self.total_cost
+
+    def reserve(self, estimate: float) -> float:
+        with self.lock:
+            if self.cost_limit > 0:
+                committed = self.spent() + self.reserved_cost
+                if committed + estimate > self.cost_limit:
+                    raise BudgetExceeded(f"Cost limit reached! (${committed:.4f} spent/reserved + ~${estimate:.4f} > ${self.cost_limit:.4f})")
+            self.reserved_cost += estimate
+        return estimate
+
+    def release(self, reservation: float):
+        with self.lock:
+            self.reserved_cost -= reservation
+
+    def commit(self, cost: float, reservation: float):
+        """
+        Replaces a reservation by the actual cost of the call.
+        """
+        with self.lock:
+            self.reserved_cost -= reservation
+            self.total_cost += cost
+
+    def check(self):
+        if self.cost_limit <= 0:
+            return
+        with self.lock:
+            spent = self.spent()
+            if spent >= self.cost_limit:
+                raise BudgetExceeded(f"Cost limit reached! (${spent:.4f} >= ${self.cost_limit:.4f})")
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        if self.slots is None:
+            yield
+            return
+        self.slots.acquire()
+        try:
+            yield
+        finally:
+            self.slots.release()
@@ -24,17 +24,22 @@ WICHTIG:
 "
 """
 
+# Static prefix shared by the worker/QA/refinement calls of a task.
+# Sent as a separate block so providers can cache it. The assignment comes
+# first since it is the part shared across all tasks of an assignment.
+CONTEXT_PROMPT = """
+Aufgabe: {assignment_text}
+Kontext: {context_text}
+"""
+
 WORKER_PROMPT = """
 Task: {current_task}
-Kontext: {context_text}
-Aufgabe: {assignment_text}
 
 Erzeuge den Inhalt. Halte dich extrem kurz. Nur Fakten. Keine Einleitung.
 """
 
 QA_PROMPT = """
-Bewerte die Lösung (1-10) basierend auf:
-{assignment_text}
+Bewerte die Lösung (1-10) basierend auf der obigen Aufgabe.
 
 Lösung:
 {generated_content}
@@ -43,3 +48,50 @@ Note >= {min_score} = "PASS".
 Sei nicht zu streng. Wenn der Kern getroffen ist und es kurz ist, gib ein PASS.
 Falls nicht PASS, gib KURZE Stichpunkte zur Verbesserung.
 """
+
+# Structured QA (qa_mode="json"): the verdict comes from the score, not from
+# searching the answer for "PASS".
+QA_JSON_PROMPT = """
+Bewerte die Lösung (1-10) basierend auf der obigen Aufgabe.
+
+Lösung:
+{generated_content}
+
+Sei nicht zu streng. Wenn der Kern getroffen ist und es kurz ist, gib mindestens {min_score}.
+Antworte NUR mit JSON:
+{{"score": <1-10>, "issues": ["kurzer Verbesserungspunkt", ...]}}
+Bei einer Note >= {min_score} bleibt "issues" leer.
+"""
+
+# One QA call ranking several candidate drafts of the same task
+RANK_PROMPT = """
+Bewerte jede der folgenden {count} Lösungen (1-10) basierend auf der obigen Aufgabe.
+
+{candidates}
+
+Sei nicht zu streng. Wenn der Kern getroffen ist und es kurz ist, gib mindestens {min_score}.
+Antworte NUR mit JSON:
+{{"candidates": [{{"id": 1, "score": <1-10>, "issues": ["kurzer Verbesserungspunkt", ...]}}, ...]}}
+Bei einer Note >= {min_score} bleibt "issues" leer.
+"""
+
+RANK_CANDIDATE = """### Lösung {id}
+{content}
+"""
+
+# Input digest (summarize_inputs): map each chunk of an input file to a short
+# summary, then reduce the summaries per file. Runs on the cheap summary model.
+SUMMARY_SYSTEM_PROMPT = "Du fasst Lernmaterial für Informatikstudenten sachlich und knapp auf Deutsch zusammen."
+SUMMARY_MAP_PROMPT = """
+Fasse den folgenden Ausschnitt aus "{source}" (Teil {part} von {parts}) in höchstens {max_words} Wörtern zusammen.
+Behalte Fachbegriffe, Definitionen, Zahlen und Aufzählungen der Inhalte bei. Keine Einleitung, keine Bewertung.
+
+{text}
+"""
+
+SUMMARY_REDUCE_PROMPT = """
+Fasse die folgenden Teilzusammenfassungen von "{source}" zu einer Zusammenfassung mit höchstens {max_words} Wörtern zusammen.
+Behalte alle Fachbegriffe, Definitionen und Zahlen bei, entferne Wiederholungen. Keine Einleitung.
+
+{text}
+"""
@@ -0,0 +1,112 @@
+import re
+import json
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+QA_MODES = ("json", "text")
+
+# "Note: 8/10", "Note 7,5", "Score: 9"
+SCORE_PATTERN = re.compile(r'(?:note|score|bewertung)\s*[:=]?\s*(\d+(?:[.,]\d+)?)|(\d+(?:[.,]\d+)?)\s*/\s*10', re.IGNORECASE)
+PASS_PATTERN = re.compile(r'\bPASS\b')
+NEGATIONS = ("nicht", "kein", "not", "no")
+
+@dataclass
+class QAVerdict:
+    score: Optional[float]
+    issues: List[str] = field(default_factory=list)
+    passed: bool = False
+    raw: str = ""
+
+    def summary(self) -> str:
+        """
+        Human-readable verdict for logs, the GUI and the journal.
+        """
+        score = f"Note {self.score:g}/10" if self.score is not None else "Ohne Note"
+        if self.passed:
+            return f"PASS ({score})"
+        return "\n".join([score] + [f"- {issue}" for issue in self.issues]) if self.issues else (self.raw or score)
+
+    def feedback(self) -> str:
+        """
+        What the refinement prompt gets as review.
+        """
+        if self.issues:
+            return "\n".join(f"- {issue}" for issue in self.issues)
+        return self.raw
+
+def says_pass(text: str) -> bool:
+    """
+    True for a standalone PASS verdict, but not for "kein PASS" / "nicht PASS".
+    """
+    for match in PASS_PATTERN.finditer(text):
+        preceding = text[:match.start()].rstrip(' "\'').lower()
+        if not preceding.endswith(NEGATIONS):
+            return True
+    return False
+
+def _extract_json(text: str) -> Optional[object]:
+    # Models like to wrap JSON in ```json fences or add a sentence around it
+    start = min((p for p in (text.find("{"), text.find("[")) if p >= 0), default=-1)
+    end = max(text.rfind("}"), text.rfind("]"))
+    if start < 0 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+
+def _to_score(value) -> Optional[float]:
+    try:
+        return float(str(value).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+def _verdict(entry: dict, min_score: float, raw: str) -> QAVerdict:
+    score = _to_score(entry.get("score"))
+    issues = [str(issue) for issue in entry.get("issues") or [] if str(issue).strip()]
+    return QAVerdict(score=score, issues=issues, passed=score is not None and score >= min_score, raw=raw)
+
+def parse_review(text: str, min_score: float) -> QAVerdict:
+    """
+    Parses a QA answer. Prefers the JSON form {"score": .., "issues": [..]};
+    falls back to a score written in the text, then to a standalone PASS.
+    """
+    data = _extract_json(text)
+    if isinstance(data, dict) and "score" in data:
+        return _verdict(data, min_score, text)
+
+    match = SCORE_PATTERN.search(text)
+    if match:
+        score = _to_score(match.group(1) or match.group(2))
+        if score is not None and score <= 10:
+            return QAVerdict(score=score, passed=score >= min_score, raw=text)
+    return QAVerdict(score=None, passed=says_pass(text), raw=text)
+
+def parse_ranking(text: str, count: int, min_score: float) -> List[QAVerdict]:
+    """
+    Parses a ranking answer {"candidates": [{"id": 1, "score": .., "issues": [..]}, ..]}
+    into one verdict per candidate (in candidate order). Candidates the
+    reviewer left out get no score and never pass.
+    """
+    verdicts = [QAVerdict(score=None, raw=text) for _ in range(count)]
+    data = _extract_json(text)
+    if isinstance(data, dict):
+        data = data.get("candidates")
+    if not isinstance(data, list):
+        return verdicts
+    for position, entry in enumerate(data):
+        if not isinstance(entry, dict):
+            continue
+        try:
+            idx = int(entry.get("id", position + 1)) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= idx < count:
+            verdicts[idx] = _verdict(entry, min_score, text)
+    return verdicts
+
+def best_candidate(verdicts: List[QAVerdict]) -> int:
+    """
+    Index of the highest scored candidate (first one on ties or without scores).
+    """
+    return max(range(len(verdicts)), key=lambda k: (verdicts[k].score if verdicts[k].score is not None else -1, -k))
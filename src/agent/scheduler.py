@@ -0,0 +1,127 @@
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+import concurrent.futures
+from typing import Callable, Iterable, List, Optional, Any, Tuple
+
+# Lower runs first
+PRIORITY_PLAN = 0
+PRIORITY_CONTINUE = 1  # QA, refinement and integration of work already started
+PRIORITY_WORKER = 2
+
+# Seconds the node running in this thread spent in the ready queue
+_queue_wait: contextvars.ContextVar = contextvars.ContextVar("queue_wait", default=0.0)
+
+def current_queue_wait() -> float:
+    return _queue_wait.get()
+
+class Node:
+    def __init__(self, fn: Callable[[], Any], priority: Tuple, name: str):
+        self.fn = fn
+        self.priority = priority
+        self.name = name
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.state = "waiting"  # waiting -> ready -> running -> done
+        self.ready_at = 0.0
+        self.pending = 0  # unfinished dependencies
+        self.dependents: List["Node"] = []
+
+class TaskScheduler:
+    """
+    Runs a DAG of nodes on one shared thread pool.
+
+    Nodes become ready when all their dependencies have finished; ready nodes
+    are dispatched by priority (then insertion order). Running nodes may add
+    new nodes, so the graph can grow while it executes (e.g. a planner adding
+    its worker nodes). `blocks` makes a new node an extra dependency of nodes
+    that are not ready yet, such as an assignment's integration step.
+    If a dependency fails, its dependents fail with the same error.
+    """
+
+    def __init__(self, max_workers: int, thread_init: Optional[Callable[[], None]] = None):
+        self.max_workers = max_workers
+        self.thread_init = thread_init
+        self.cond = threading.Condition()
+        self.ready: List[Tuple[Tuple, int, Node]] = []
+        self.seq = itertools.count()
+        self.running = 0
+        self.unfinished = 0
+
+    def add(self, fn: Callable[[], Any], priority=PRIORITY_WORKER, deps: Iterable[Node] = (), blocks: Iterable[Node] = (), name: str = "") -> Node:
+        if not isinstance(priority, tuple):
+            priority = (priority,)
+        node = Node(fn, priority, name)
+        with self.cond:
+            self.unfinished += 1
+            failed = None
+            for dep in deps:
+                if dep.state != "done":
+                    node.pending += 1
+                    dep.dependents.append(node)
+                elif dep.error is not None:
+                    failed = dep.error
+            for blocked in blocks:
+                if blocked.state != "waiting":
+                    raise RuntimeError(f"Node '{blocked.name}' is already scheduled and cannot get new dependencies")
+                blocked.pending += 1
+                node.dependents.append(blocked)
+            if failed is not None:
+                self._finish(node, None, failed)
+            elif node.pending == 0:
+                self._push(node)
+            self.cond.notify_all()
+        return node
+
+    def _push(self, node: Node):
+        node.state = "ready"
+        node.ready_at = time.monotonic()
+        heapq.heappush(self.ready, (node.priority, next(self.seq), node))
+
+    def _finish(self, node: Node, result: Any, error: Optional[BaseException]):
+        # Caller holds the lock
+        node.result = result
+        node.error = error
+        node.state = "done"
+        self.unfinished -= 1
+        for dependent in node.dependents:
+            dependent.pending -= 1
+            if error is not None and dependent.error is None:
+                dependent.error = error
+            if dependent.pending == 0:
+                if dependent.error is not None:
+                    self._finish(dependent, None, dependent.error)
+                else:
+                    self._push(dependent)
+
+    def _execute(self, node: Node):
+        if self.thread_init:
+            self.thread_init()
+        result, error = None, None
+        token = _queue_wait.set(time.monotonic() - node.ready_at)
+        try:
+            result = node.fn()
+        except BaseException as e:
+            error = e
+        finally:
+            _queue_wait.reset(token)
+        with self.cond:
+            self.running -= 1
+            self._finish(node, result, error)
+            self.cond.notify_all()
+
+    def run(self):
+        """
+        Blocks until every node (including ones added while running) is done.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with self.cond:
+                while self.unfinished:
+                    while self.ready and self.running < self.max_workers:
+                        _, _, node = heapq.heappop(self.ready)
+                        node.state = "running"
+                        self.running += 1
+                        executor.submit(self._execute, node)
+                    self.cond.wait()
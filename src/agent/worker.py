@@ -0,0 +1,178 @@
+import os
+import socket
+import threading
+import multiprocessing
+import typer
+from typing import Dict, List, Sequence, Union
+from src.agent.core import Agent
+from src.agent.jobqueue import DEFAULT_QUEUE_PATH, TRANSIENT_ERRORS, Job, JobQueue, QueueLimits
+
+class Worker:
+    """
+    Executes jobs of a JobQueue on `threads` threads. Each queued run gets
+    one Agent per worker process, built from the run's config with its input
+    context prepared once (from the digest stored with the run), and shared
+    by the threads. The leases of the jobs
+    in progress are renewed every lease/3 seconds.
+    """
+
+    def __init__(self, queue: JobQueue, threads: int = 4, lease: float = 120.0, poll_interval: float = 1.0, exit_when_idle: bool = False, name: str = ""):
+        self.queue = queue
+        self.threads = max(1, threads)
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.exit_when_idle = exit_when_idle
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.agents: Dict[str, Agent] = {}
+        self.building: Dict[str, threading.Lock] = {}
+        self.held: Dict[int, Job] = {}
+        self.stopped = threading.Event()
+
+    def log(self, message: str):
+        print(f"Worker {self.name}: {message}", flush=True)
+
+    def _agent(self, run_id: str) -> Agent:
+        with self.lock:
+            if run_id in self.agents:
+                return self.agents[run_id]
+            building = self.building.setdefault(run_id, threading.Lock())
+        # Other runs' jobs go on while this one's context is built
+        with building:
+            if run_id not in self.agents:
+                run = self.queue.get_run(run_id)
+                if run is None:
+                    raise ValueError(f"Unknown run: {run_id}")
+                settings = run["config"]["agent"]
+                agent = Agent(**settings, limits=QueueLimits(self.queue, run_id, settings.get("cost_limit", 0.0)))
+                agent.prepare_queued(run["hz_name"], run["inputs"], run["config"].get("custom_prompt", ""), run["config"].get("digest"))
+                with self.lock:
+                    self.agents[run_id] = agent
+        return self.agents[run_id]
+
+    def _drop_finished_runs(self):
+        with self.lock:
+            run_ids = list(self.agents)
+        for run_id in run_ids:
+            if self.queue.run_status(run_id) != "running":
+                with self.lock:
+                    agent = self.agents.pop(run_id, None)
+                    self.building.pop(run_id, None)
+                if agent:
+                    agent.llm.release_caches()
+
+    def _execute(self, job: Job):
+        with self.lock:
+            self.held[job.id] = job
+        name = os.path.basename(job.payload.get("assignment", ""))
+        self.log(f"{job.kind} job {job.id} ({name}, attempt {job.attempts})")
+        try:
+            agent = self._agent(job.run_id)
+            result, new_jobs = agent.execute_job(job, self.queue)
+        except Exception as e:
+            # Budget stops and bad input or code fail the same way on every attempt
+            retry = self.queue.fail(job, str(e), retry=isinstance(e, TRANSIENT_ERRORS))
+            self.log(f"{job.kind} job {job.id} failed: {e}" + (" (will be retried)" if retry else ""))
+        else:
+            if not self.queue.complete(job, result, new_jobs):
+                self.log(f"{job.kind} job {job.id} was taken over or cancelled, result discarded.")
+        finally:
+            with self.lock:
+                self.held.pop(job.id, None)
+
+    def _heartbeat(self):
+        while not self.stopped.wait(self.lease / 3):
+            with self.lock:
+                jobs = list(self.held.values())
+            for job in jobs:
+                try:
+                    if not self.queue.extend(job, self.lease):
+                        self.log(f"Lost the lease of job {job.id}.")
+                except Exception as e:
+                    self.log(f"Could not renew the lease of job {job.id}: {e}")
+
+    def _loop(self):
+        while not self.stopped.is_set():
+            try:
+                job = self.queue.claim(self.name, self.lease)
+            except Exception as e:
+                # e.g. the database is locked for longer than the timeout
+                self.log(f"Claiming failed: {e}")
+                job = None
+            if job is not None:
+                self._execute(job)
+                continue
+            if self.exit_when_idle and self.queue.idle():
+                break
+            self._drop_finished_runs()
+            self.stopped.wait(self.poll_interval)
+
+    def run(self):
+        """
+        Works until stop() is called (or, with exit_when_idle, until no job is left).
+        """
+        self.log(f"Started with {self.threads} thread(s) on {self.queue.path}")
+        heartbeat = threading.Thread(target=self._heartbeat, daemon=True)
+        heartbeat.start()
+        loops = [threading.Thread(target=self._loop, name=f"worker-{i}") for i in range(self.threads)]
+        for thread in loops:
+            thread.start()
+        try:
+            for thread in loops:
+                thread.join()
+        finally:
+            self.stopped.set()
+
+    def stop(self):
+        self.stopped.set()
+
+def run_worker(queue_path: str = DEFAULT_QUEUE_PATH, threads: int = 4, lease: float = 120.0, exit_when_idle: bool = False):
+    Worker(JobQueue(queue_path), threads=threads, lease=lease, exit_when_idle=exit_when_idle).run()
+
+def split_threads(max_concurrency: int, count: int) -> List[int]:
+    """
+    Threads per worker process so that together they run at most
+    max_concurrency jobs: at most max_concurrency processes, the remainder
+    of the division going one each to the first ones.
+    """
+    count = min(count, max(1, max_concurrency))
+    return [max(1, max_concurrency // count + (1 if i < max_concurrency % count else 0)) for i in range(count)]
+
+def start_workers(count: int, queue_path: str = DEFAULT_QUEUE_PATH, threads: Union[int, Sequence[int]] = 4, lease: float = 120.0) -> List[multiprocessing.Process]:
+    """
+    Starts local worker processes (spawned, so they share no state with the caller).
+    `threads` is the thread count of each process, or a list with one per process.
+    """
+    context = multiprocessing.get_context("spawn")
+    if isinstance(threads, int):
+        threads = [threads] * count
+    processes = []
+    for i in range(count):
+        process = context.Process(target=run_worker, args=(queue_path, threads[i], lease))
+        process.start()
+        processes.append(process)
+    return processes
+
+def stop_workers(processes: List[multiprocessing.Process], timeout: float = 10.0):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout)
+
+app = typer.Typer()
+
+@app.command()
+def main(
+    queue_path: str = typer.Option(DEFAULT_QUEUE_PATH, "--queue", help="Job queue database (on a shared directory for several machines)"),
+    threads: int = typer.Option(4, help="Jobs worked on at once by this process"),
+    lease: float = typer.Option(120.0, help="Seconds before a job of an unresponsive worker is handed to another one"),
+    exit_when_idle: bool = typer.Option(False, "--exit-when-idle", help="Stop once no job is pending or running")
+):
+    """
+    Executes plan/task/integration jobs of queued runs (see `--queue` of src/main.py).
+    Run it from the project directory; on other machines that directory must be shared.
+    """
+    run_worker(queue_path, threads=threads, lease=lease, exit_when_idle=exit_when_idle)
+
+if __name__ == "__main__":
+    app()
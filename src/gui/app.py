@@ -4,9 +4,12 @@ import shutil
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor
-from src.ingestion.scanner import scan_directory
-from src.ingestion.loader import load_file_content
+from src.ingestion.index import HZIndex
+from src.ingestion.loader import load_many, load_cached
 from src.agent.core import Agent
+from src.agent.events import EventQueue
+from src.agent.journal import has_journal
+from src.utils.log_store import LogStore
 from src.utils.pricing_data import MODEL_DATA, PRICING_REGISTRY
 from src.utils.models import get_available_models
 
@@ -23,12 +26,14 @@ except ImportError:
 st.set_page_config(page_title="AI Student Agent", layout="wide", page_icon="🎓")
 
 # --- STATE MANAGEMENT ---
-if "logs" not in st.session_state:
-    st.session_state.logs = []
+if "log_store" not in st.session_state:
+    st.session_state.log_store = None
 if "cost" not in st.session_state:
     st.session_state.cost = 0.0
 if "tokens" not in st.session_state:
-    st.session_state.tokens = {"input": 0, "output": 0}
+    st.session_state.tokens = {"input": 0, "output": 0, "cached": 0}
+if "cache" not in st.session_state:
+    st.session_state.cache = {"hits": 0, "saved_cost": 0.0}
 if "is_running" not in st.session_state:
     st.session_state.is_running = False
 if "agent_future" not in st.session_state:
@@ -39,6 +44,27 @@ if "assignments_tasks" not in st.session_state:
     st.session_state.assignments_tasks = {} # filename -> data
 if "agent_result" not in st.session_state:
     st.session_state.agent_result = ""
+if "events" not in st.session_state:
+    st.session_state.events = EventQueue()
+
+# Live view refresh: the queue is drained by the monitor, panels redraw on their own
+MONITOR_INTERVAL = 0.5
+PANEL_INTERVAL = 1.0
+# Only what the panels show is kept in the session; full logs live in the LogStore
+RUN_LOG = ""
+LOG_PAGE_SIZE = 50
+DRAFT_PREVIEW_CHARS = 5000
+REQS_PREVIEW_CHARS = 2000
+
+# --- PROJECT INDEX ---
+@st.cache_resource
+def get_hz_index():
+    # Built once per server process and kept current by a filesystem observer.
+    # New uploads are pre-extracted in the background as soon as they land.
+    prefetch = ThreadPoolExecutor(max_workers=1)
+    index = HZIndex("data", on_new_file=lambda path: prefetch.submit(load_cached, path))
+    index.start()
+    return index
 
 # --- SIDEBAR ---
 st.sidebar.title("🎓 AI Student")
@@ -52,25 +78,29 @@ cost_col2.metric("Limit", f"${st.session_state.get('cost_limit', 1.0):.2f}")
 
 st.sidebar.text(f"In Tokens: {st.session_state.tokens['input']}")
 st.sidebar.text(f"Out Tokens: {st.session_state.tokens['output']}")
+st.sidebar.text(f"Cached In Tokens: {st.session_state.tokens.get('cached', 0)}")
+st.sidebar.text(f"Cache Hits: {st.session_state.cache['hits']} (saved ${st.session_state.cache['saved_cost']:.4f})")
 
-# --- CALLBACKS ---
+# --- EVENT HANDLERS ---
+# The agent publishes events from its worker threads onto st.session_state.events;
+# these handlers apply them to the session state on the script thread only.
 def log_callback(msg, ass_name=None):
     if ass_name and ass_name in st.session_state.assignments_tasks:
-        st.session_state.assignments_tasks[ass_name]["logs"].append(msg)
+        st.session_state.log_store.append(ass_name, msg)
         if len(msg) < 40 and not msg.startswith("Loaded"):
             st.session_state.assignments_tasks[ass_name]["status_msg"] = msg
     else:
-        st.session_state.logs.append(msg)
+        st.session_state.log_store.append(RUN_LOG, msg)
     
 def update_callback(data):
     st.session_state.cost = data["total_cost"]
     st.session_state.tokens = data["tokens"]
+    st.session_state.cache = data.get("cache", st.session_state.cache)
 
 def plan_callback(ass_name, tasks):
     st.session_state.assignments_tasks[ass_name] = {
         "tasks": tasks,
         "statuses": {i: "pending" for i in range(len(tasks))},
-        "logs": [],
         "draft": "",
         "reqs": "",
         "qa": "",
@@ -80,18 +110,18 @@ def plan_callback(ass_name, tasks):
 def section_callback(ass_name, task, reqs, i, total):
     if ass_name in st.session_state.assignments_tasks:
         st.session_state.assignments_tasks[ass_name]["statuses"][i] = "running"
-        st.session_state.assignments_tasks[ass_name]["reqs"] = reqs
+        st.session_state.assignments_tasks[ass_name]["reqs"] = reqs[:REQS_PREVIEW_CHARS]
         st.session_state.assignments_tasks[ass_name]["status_msg"] = f"Generating task {i+1}..."
     
 def draft_callback(ass_name, text):
     if ass_name in st.session_state.assignments_tasks:
-        st.session_state.assignments_tasks[ass_name]["draft"] = text
+        st.session_state.assignments_tasks[ass_name]["draft"] = text[:DRAFT_PREVIEW_CHARS]
         st.session_state.assignments_tasks[ass_name]["status_msg"] = "Reviewing..."
     
 def qa_callback(ass_name, text):
     if ass_name in st.session_state.assignments_tasks:
         st.session_state.assignments_tasks[ass_name]["qa"] = text
-        if "PASS" in text:
+        if text.startswith("PASS"):
             st.session_state.assignments_tasks[ass_name]["status_msg"] = "QA Passed ✅"
         else:
             st.session_state.assignments_tasks[ass_name]["status_msg"] = "QA Improvements..."
@@ -104,6 +134,25 @@ def task_finished_callback(ass_name, i, text):
             st.session_state.assignments_tasks[ass_name]["statuses"][i] = "done"
         st.session_state.assignments_tasks[ass_name]["status_msg"] = f"Task {i+1} complete"
 
+EVENT_HANDLERS = {
+    "log": lambda e: log_callback(e.data["message"], e.assignment),
+    "cost": lambda e: update_callback(e.data),
+    "plan": lambda e: plan_callback(e.assignment, e.data["tasks"]),
+    "section": lambda e: section_callback(e.assignment, e.data["task"], e.data["reqs"], e.data["index"], e.data["total"]),
+    "draft": lambda e: draft_callback(e.assignment, e.data["text"]),
+    "qa": lambda e: qa_callback(e.assignment, e.data["text"]),
+    "finished": lambda e: task_finished_callback(e.assignment, e.data["index"], e.data["text"]),
+}
+
+def pump_events() -> bool:
+    """
+    Applies all queued agent events. Returns True if new assignments showed up.
+    """
+    known = set(st.session_state.assignments_tasks)
+    for event in st.session_state.events.drain():
+        EVENT_HANDLERS[event.kind](event)
+    return set(st.session_state.assignments_tasks) != known
+
 def find_file_globally(filename, hz_list):
     found_in = []
     for hz in hz_list:
@@ -118,7 +167,7 @@ def render_file_list_with_delete(file_list):
         fc1.markdown(f":material/description: {fname}")
         if fc2.button(label="", icon=":material/delete:", key=f"del_{f}", help=f"Delete {fname}"):
             try:
-                os.remove(f); st.success(f"Deleted {fname}"); time.sleep(0.5); st.rerun()
+                os.remove(f); get_hz_index().refresh(force=True); st.success(f"Deleted {fname}"); time.sleep(0.5); st.rerun()
             except Exception as e: st.error(f"Error: {e}")
 
 def handle_upload(hz_name, category, uploaded_files, hz_list):
@@ -142,8 +191,80 @@ def save_files(hz_name, category, uploaded_files):
     for f in uploaded_files:
         dest = os.path.join(target_dir, f.name)
         with open(dest, "wb") as w: w.write(f.getvalue())
+    get_hz_index().refresh(force=True)
     st.success(f"Uploaded to {category}!"); time.sleep(0.5); st.rerun()
 
+# --- LIVE VIEW ---
+
+def render_log_viewer(key):
+    """
+    One page of a log as a single element, so drawing it costs the same
+    however long the run gets.
+    """
+    store = st.session_state.log_store
+    total = store.count(key) if store else 0
+    if not total:
+        st.caption("No messages yet."); return
+    pages = (total + LOG_PAGE_SIZE - 1) // LOG_PAGE_SIZE
+    # No max_value: it would change (and reset the widget) as the log grows
+    page = min(st.number_input("Page (1 = newest)", min_value=1, value=1, step=1, key=f"log_page_{key}"), pages)
+    st.caption(f"{total} messages, page {page} of {pages} · full log: {store.path(key)}")
+    st.code("\n".join(store.page(key, page - 1, LOG_PAGE_SIZE)), language=None)
+
+@st.fragment(run_every=MONITOR_INTERVAL)
+def live_monitor():
+    # Only this fragment reruns on the timer, not the whole script
+    if pump_events() or st.session_state.agent_future.done():
+        # New panels to create or the run is over: one full rerun
+        st.rerun()
+    st.info("Agent is working...")
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Cost", f"${st.session_state.cost:.4f}")
+    m2.metric("Tokens (in / out)", f"{st.session_state.tokens['input']} / {st.session_state.tokens['output']}")
+    m3.metric("Cache Hits", st.session_state.cache["hits"])
+    if st.button("Force Continue / Skip Step"):
+        with open(".skip_signal", "w") as f: f.write("skip")
+        st.warning("Signal sent...")
+    with st.expander("📜 Run Log"):
+        render_log_viewer(RUN_LOG)
+
+@st.fragment(run_every=PANEL_INTERVAL)
+def assignment_panel(ass_name):
+    data = st.session_state.assignments_tasks.get(ass_name)
+    if data is None: return
+    tasks, statuses = data["tasks"], data["statuses"]
+    done_count = sum(1 for s in statuses.values() if s == "done")
+    total = len(tasks) if tasks else 1
+    progress_val = min(1.0, max(0.0, done_count / total))
+    status = data.get('status_msg', 'Starting...')
+    
+    # Move status back into the toggleable bar with a distinctive separator
+    with st.expander(f"📁 {ass_name} ({int(progress_val*100)}%)  |  {status}", expanded=True):
+        st.progress(progress_val)
+        tbs = st.tabs(["📝 Task List", "📜 Logs", "👁️ Live Preview"])
+        with tbs[0]:
+            task_html = ""
+            for i, t in enumerate(tasks):
+                s = statuses.get(i, "pending")
+                if s == "done": style, icon = "color: gray; text-decoration: line-through;", "✅"
+                elif s == "skipped": style, icon = "color: orange; font-style: italic;", "⏭️"
+                elif s == "running": style, icon = "background-color: #1E90FF; color: white; padding: 3px 8px; border-radius: 5px; font-weight: bold;", "⚙️"
+                else: style, icon = "", "▫️"
+                task_html += f"<div style='margin-bottom: 5px; {style}'>{icon} {t}</div>"
+            st.markdown(task_html, unsafe_allow_html=True)
+        with tbs[1]:
+            render_log_viewer(ass_name)
+        with tbs[2]:
+            p1, p2, p3 = st.columns(3)
+            with p1: st.markdown("**Requirements**\n\n" + (f"> {data['reqs']}..." if data['reqs'] else "Waiting..."))
+            with p2: st.markdown("**Generated Draft**\n\n" + (f"```markdown\n{data['draft']}...\n```" if data['draft'] else "Waiting..."))
+            with p3: 
+                st.markdown("**QA Feedback**")
+                if data['qa']:
+                    if data['qa'].startswith("PASS"): st.success("✅ QA Passed!")
+                    else: st.warning(data['qa'])
+                else: st.info("Waiting...")
+
 # --- PAGES ---
 
 def page_dashboard():
@@ -175,6 +296,10 @@ def page_dashboard():
     with c3:
         cost_limit = st.number_input("Cost Limit ($)", value=1.0, step=0.1)
         st.session_state['cost_limit'] = cost_limit
+        cache_mode = st.selectbox("Response Cache", ["use", "refresh", "bypass"], help="refresh: ignore cached answers but store new ones")
+        use_retrieval = st.checkbox("Retrieval Context", value=True, help="Send each task only the most relevant input chunks")
+        context_budget = st.number_input("Context Budget (Tokens)", min_value=500, max_value=100000, value=6000, step=500, disabled=not use_retrieval)
+        summarize_inputs = st.checkbox("Summarize Inputs", value=False, help="Summarize large input files with a cheap model into a digest (cached) instead of truncating them")
         
     with c4:
         max_parallel = st.slider("Max Assignments", min_value=1, max_value=10, value=5)
@@ -182,15 +307,17 @@ def page_dashboard():
         
     with c5:
         skip_qa = st.checkbox("Skip QA")
+        stream_drafts = st.checkbox("Stream Drafts", value=True, help="Update the Live Preview while a draft is being generated")
         length_profile = st.selectbox("Length", ["Short", "Normal", "Long"], index=2)
         if not skip_qa:
             max_qa_retries = st.number_input("Max QA Retries", min_value=1, max_value=10, value=1)
             min_qa_score = st.number_input("Min Passing Score", min_value=1.0, max_value=10.0, value=9.0, step=0.5)
+            qa_candidates = st.number_input("Candidates per Task", min_value=1, max_value=5, value=1, help="Draft several variants in parallel and let one QA call pick the best (faster than refinement rounds, more tokens)")
         else:
-            max_qa_retries, min_qa_score = 0, 9.0
+            max_qa_retries, min_qa_score, qa_candidates = 0, 9.0, 1
 
     # Project Selection
-    hz_list = scan_directory("data")
+    hz_list = get_hz_index().snapshot()
     if not hz_list: st.warning("No projects found."); return
     hz_names = [hz.name for hz in hz_list]
     selected_hz_name = st.selectbox("Select Project (HZ)", hz_names)
@@ -213,78 +340,53 @@ def page_dashboard():
 
     # --- RUNNING STATE MONITORING ---
     if st.session_state.is_running:
+        pump_events()
         if st.session_state.agent_future.done():
             st.session_state.is_running = False
+            st.session_state.log_store.close()
             try: st.session_state.agent_result = st.session_state.agent_future.result()
             except Exception as e: st.error(f"Agent failed: {e}")
             st.rerun()
         else:
-            st.info("Agent is working...")
-            if st.button("Force Continue / Skip Step"):
-                with open(".skip_signal", "w") as f: f.write("skip")
-                st.warning("Signal sent...")
-
+            live_monitor()
             st.markdown("### 📊 Progress & Process")
             if not st.session_state.assignments_tasks: st.info("Waiting for plans...")
             else:
-                for ass_name, data in st.session_state.assignments_tasks.items():
-                    tasks, statuses = data["tasks"], data["statuses"]
-                    done_count = sum(1 for s in statuses.values() if s == "done")
-                    total = len(tasks) if tasks else 1
-                    progress_val = min(1.0, max(0.0, done_count / total))
-                    status = data.get('status_msg', 'Starting...')
-                    
-                    # Move status back into the toggleable bar with a distinctive separator
-                    with st.expander(f"📁 {ass_name} ({int(progress_val*100)}%)  |  {status}", expanded=True):
-                        st.progress(progress_val)
-                        tbs = st.tabs(["📝 Task List", "📜 Logs", "👁️ Live Preview"])
-                        with tbs[0]:
-                            task_html = ""
-                            for i, t in enumerate(tasks):
-                                s = statuses.get(i, "pending")
-                                if s == "done": style, icon = "color: gray; text-decoration: line-through;", "✅"
-                                elif s == "skipped": style, icon = "color: orange; font-style: italic;", "⏭️"
-                                elif s == "running": style, icon = "background-color: #1E90FF; color: white; padding: 3px 8px; border-radius: 5px; font-weight: bold;", "⚙️"
-                                else: style, icon = "", "▫️"
-                                task_html += f"<div style='margin-bottom: 5px; {style}'>{icon} {t}</div>"
-                            st.markdown(task_html, unsafe_allow_html=True)
-                        with tbs[1]:
-                            for l in data["logs"]: st.text(l)
-                        with tbs[2]:
-                            p1, p2, p3 = st.columns(3)
-                            with p1: st.markdown("**Requirements**\n\n" + (f"> {data['reqs'][:2000]}..." if data['reqs'] else "Waiting..."))
-                            with p2: st.markdown("**Generated Draft**\n\n" + (f"```markdown\n{data['draft'][:5000]}...\n```" if data['draft'] else "Waiting..."))
-                            with p3: 
-                                st.markdown("**QA Feedback**")
-                                if data['qa']:
-                                    if "PASS" in data['qa']: st.success("✅ QA Passed!")
-                                    else: st.warning(data['qa'])
-                                else: st.info("Waiting...")
-            time.sleep(0.5); st.rerun()
+                for ass_name in list(st.session_state.assignments_tasks):
+                    assignment_panel(ass_name)
 
     if st.session_state.agent_result:
         st.success("All Assignments Finished!")
         with st.expander("🎓 Final Combined Report"): st.markdown(st.session_state.agent_result)
 
     st.markdown("---")
-    if st.button("Start Agent", disabled=st.session_state.is_running):
+    b1, b2 = st.columns([1, 5])
+    with b1: start = st.button("Start Agent", disabled=st.session_state.is_running)
+    with b2: resume = has_journal(os.path.join("output", selected_hz_name)) and st.button("Resume previous run", disabled=st.session_state.is_running, help="Reuse plans and completed tasks from the last (interrupted) run")
+    if start or resume:
         if not selected_ass_paths: st.error("Select at least one assignment.")
         else:
-            st.session_state.is_running, st.session_state.logs, st.session_state.cost, st.session_state.tokens, st.session_state.assignments_tasks, st.session_state.agent_result = True, [], 0.0, {"input": 0, "output": 0}, {}, ""
+            st.session_state.is_running, st.session_state.cost, st.session_state.tokens, st.session_state.assignments_tasks, st.session_state.agent_result = True, 0.0, {"input": 0, "output": 0, "cached": 0}, {}, ""
+            if st.session_state.log_store: st.session_state.log_store.close()
+            st.session_state.log_store = LogStore(os.path.join("output", selected_hz_name, "logs"))
+            st.session_state.cache = {"hits": 0, "saved_cost": 0.0}
+            st.session_state.events = EventQueue()
             try:
-                agent = Agent(provider=agent_provider_arg, model=model, cost_limit=cost_limit, max_parallel=max_parallel, max_subtasks=max_subtasks, skip_qa=skip_qa, max_qa_retries=max_qa_retries, min_qa_score=min_qa_score, length_profile=length_profile)
-                agent.on_log, agent.on_update, agent.on_section_start, agent.on_draft, agent.on_qa_feedback, agent.on_plan_generated, agent.on_task_finished = log_callback, update_callback, section_callback, draft_callback, qa_callback, plan_callback, task_finished_callback
+                agent = Agent(provider=agent_provider_arg, model=model, cost_limit=cost_limit, max_parallel=max_parallel, max_subtasks=max_subtasks, skip_qa=skip_qa, max_qa_retries=max_qa_retries, min_qa_score=min_qa_score, length_profile=length_profile, cache_mode=cache_mode, use_retrieval=use_retrieval, context_token_budget=context_budget, stream_drafts=stream_drafts, qa_candidates=qa_candidates, summarize_inputs=summarize_inputs)
+                st.session_state.events.connect(agent)
                 with st.spinner("Loading context..."):
-                    in_txt = {}
-                    for f in current_hz.input_files: c = load_file_content(f); 
-                    if c: in_txt[f] = c
-                    for f in current_hz.solutions_files: c = load_file_content(f); 
-                    if c: in_txt[f"SOLUTION_REF_{os.path.basename(f)}"] = c
+                    # One copy of the file lists for loading and lookup
+                    input_files, solutions_files = list(current_hz.input_files), list(current_hz.solutions_files)
+                    with agent.tracer.span("load.inputs", files=len(input_files) + len(solutions_files)):
+                        loaded = load_many(input_files + solutions_files)
+                    in_txt = {f: loaded[f] for f in input_files if loaded[f]}
+                    for f in solutions_files:
+                        if loaded[f]: in_txt[f"SOLUTION_REF_{os.path.basename(f)}"] = loaded[f]
                 ctx = get_script_run_ctx() if get_script_run_ctx else None
                 def run_with_ctx(*args, **kwargs):
                     if add_script_run_ctx and ctx: add_script_run_ctx(threading.current_thread(), ctx)
                     return agent.run(*args, **kwargs)
-                st.session_state.agent_future = st.session_state.executor.submit(run_with_ctx, hz_name=selected_hz_name, assignment_paths=selected_ass_paths, input_texts=in_txt, custom_prompt=custom_prompt)
+                st.session_state.agent_future = st.session_state.executor.submit(run_with_ctx, hz_name=selected_hz_name, assignment_paths=selected_ass_paths, input_texts=in_txt, custom_prompt=custom_prompt, resume=resume)
                 st.rerun()
             except Exception as e: st.error(f"Error: {e}"); st.session_state.is_running = False
 
@@ -296,11 +398,12 @@ def page_project_manager():
             if new_name:
                 try:
                     for d in ["Input", "Assignments", "Solutions"]: os.makedirs(os.path.join("data", new_name, d), exist_ok=True)
+                    get_hz_index().refresh(force=True)
                     st.success(f"Created {new_name}"); time.sleep(0.5); st.rerun()
                 except Exception as e: st.error(f"Error: {e}")
             else: st.error("Enter a name.")
     st.markdown("---")
-    hz_list = scan_directory("data")
+    hz_list = get_hz_index().snapshot()
     for hz in hz_list:
         with st.expander(hz.name):
             c1, c2, c3 = st.columns(3)
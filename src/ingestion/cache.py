@@ -0,0 +1,114 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional, Tuple
+
+DEFAULT_EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(".cache", "extraction.sqlite"))
+
+def file_signature(file_path: str) -> Tuple[str, int, int]:
+    st = os.stat(file_path)
+    return os.path.abspath(file_path), st.st_size, st.st_mtime_ns
+
+def file_hash(file_path: str) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class ExtractionCache:
+    """
+    On-disk store of extracted document text.
+    Texts are keyed by the file's content hash, so copies and renames hit too.
+    A (path, size, mtime) index skips re-hashing files that did not change.
+    Input digests (chunk/file summaries, see src/ingestion/digest.py) are
+    kept next to the texts they were made from.
+    """
+
+    def __init__(self, path: str = DEFAULT_EXTRACTION_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS texts (
+                    sha256 TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self.conn.commit()
+
+    def content_hash(self, file_path: str) -> str:
+        """
+        Hash of the file, reusing the stored one while size and mtime are unchanged.
+        """
+        path, size, mtime_ns = file_signature(file_path)
+        with self.lock:
+            row = self.conn.execute("SELECT size, mtime_ns, sha256 FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == size and row[1] == mtime_ns:
+            return row[2]
+        digest = file_hash(file_path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, digest)
+            )
+            self.conn.commit()
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM texts WHERE sha256 = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, digest: str, text: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO texts (sha256, text, created) VALUES (?, ?, ?)",
+                (digest, text, time.time())
+            )
+            self.conn.commit()
+
+    def get_summary(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_summary(self, key: str, text: str):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, text, created) VALUES (?, ?, ?)",
+                (key, text, time.time())
+            )
+            self.conn.commit()
+
+_default_cache: Optional[ExtractionCache] = None
+_default_lock = threading.Lock()
+
+def get_extraction_cache() -> ExtractionCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ExtractionCache()
+        return _default_cache
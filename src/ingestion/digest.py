@@ -0,0 +1,140 @@
+import os
+import hashlib
+import threading
+import contextvars
+import concurrent.futures
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from src.agent.prompts import SUMMARY_MAP_PROMPT, SUMMARY_REDUCE_PROMPT
+from src.ingestion.cache import ExtractionCache, get_extraction_cache
+from src.ingestion.retrieval import chunk_text
+
+# German words are ~7 chars including the space; turns char budgets into word limits
+CHARS_PER_WORD = 7
+# Reduce rounds before summaries that still don't fit are taken as they are
+MAX_REDUCE_ROUNDS = 4
+
+@dataclass
+class Digest:
+    text: str
+    calls: int = 0  # summary calls made (cache hits not counted)
+    summarized: int = 0  # files that did not fit and were summarized
+
+def _key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def _file_block(source: str, text: str, summarized: bool) -> str:
+    label = " (Zusammenfassung)" if summarized else ""
+    return f"--- START FILE: {os.path.basename(source)}{label} ---\n{text}\n--- END FILE ---\n\n"
+
+class DigestBuilder:
+    """
+    Map-reduce summarization of the input material into one compact digest.
+    Each file gets an equal share of `digest_chars`. Files that fit are taken
+    verbatim; larger ones are split into chunks summarized in parallel (map),
+    whose summaries are summarized again in groups until they fit (reduce).
+    Every summary is cached in the extraction cache, keyed by model and
+    prompt, and so is the finished digest.
+    """
+
+    def __init__(self, summarize: Callable[[str], str], model: str, max_workers: int = 4, digest_chars: int = 12000, chunk_chars: int = 12000, min_file_chars: int = 1500, cache: Optional[ExtractionCache] = None, thread_init: Optional[Callable[[], None]] = None):
+        self.summarize = summarize
+        self.model = model
+        self.max_workers = max(1, max_workers)
+        self.digest_chars = digest_chars
+        self.chunk_chars = chunk_chars
+        # Map summaries are kept short enough that ~8 of them fit one reduce call
+        self.part_chars = max(min_file_chars, chunk_chars // 8)
+        self.min_file_chars = min_file_chars
+        self.cache = cache or get_extraction_cache()
+        self.thread_init = thread_init
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _summarize(self, prompt: str) -> str:
+        key = _key("summary", self.model, prompt)
+        cached = self.cache.get_summary(key)
+        if cached is not None:
+            return cached
+        text = str(self.summarize(prompt)).strip()
+        with self.lock:
+            self.calls += 1
+        if text:
+            self.cache.set_summary(key, text)
+        return text
+
+    def _run(self, executor, prompts: List[str]) -> List[str]:
+        # Each call gets its own copy of the context, so tracing spans nest
+        futures = [executor.submit(contextvars.copy_context().run, self._summarize, p) for p in prompts]
+        return [f.result() for f in futures]
+
+    def _groups(self, parts: List[str]) -> List[List[str]]:
+        groups, current, size = [], [], 0
+        for part in parts:
+            if current and size + len(part) > self.chunk_chars:
+                groups.append(current)
+                current, size = [], 0
+            current.append(part)
+            size += len(part)
+        if current:
+            groups.append(current)
+        return groups
+
+    def build(self, input_texts: Dict[str, str]) -> Digest:
+        texts = {source: text for source, text in input_texts.items() if text and text.strip()}
+        if not texts:
+            return Digest("")
+        budget = max(self.min_file_chars, self.digest_chars // len(texts))
+
+        digest_key = _key("digest", self.model, str(budget), *[_key(source, text) for source, text in texts.items()])
+        cached = self.cache.get_summary(digest_key)
+        if cached is not None:
+            return Digest(cached)
+
+        # source -> current parts (chunk texts, then summaries)
+        pending = {source: text for source, text in texts.items() if len(text) > budget}
+        summaries: Dict[str, str] = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, initializer=self.thread_init) as executor:
+            # Map: all chunks of all files at once
+            jobs = []
+            for source, text in pending.items():
+                chunks = chunk_text(text, source, chunk_chars=self.chunk_chars, overlap=0)
+                single = len(chunks) == 1
+                for chunk in chunks:
+                    jobs.append((source, SUMMARY_MAP_PROMPT.format(
+                        source=os.path.basename(source), part=chunk.index + 1, parts=len(chunks),
+                        max_words=(budget if single else self.part_chars) // CHARS_PER_WORD, text=chunk.text
+                    )))
+            parts: Dict[str, List[str]] = {source: [] for source in pending}
+            for (source, _), summary in zip(jobs, self._run(executor, [p for _, p in jobs])):
+                parts[source].append(summary)
+
+            # Reduce: one level per round, across all files, until each file fits its budget
+            rounds = 0
+            while parts:
+                for source in [s for s, p in parts.items() if len(p) == 1 or len("\n\n".join(p)) <= budget or rounds >= MAX_REDUCE_ROUNDS]:
+                    summaries[source] = "\n\n".join(parts.pop(source))
+                jobs = []
+                for source, file_parts in parts.items():
+                    groups = self._groups(file_parts)
+                    target = budget if len(groups) == 1 else self.part_chars
+                    for group in groups:
+                        jobs.append((source, SUMMARY_REDUCE_PROMPT.format(
+                            source=os.path.basename(source), max_words=target // CHARS_PER_WORD, text="\n\n".join(group)
+                        )))
+                reduced: Dict[str, List[str]] = {source: [] for source in parts}
+                for (source, _), summary in zip(jobs, self._run(executor, [p for _, p in jobs])):
+                    reduced[source].append(summary)
+                parts = reduced
+                rounds += 1
+
+        text = "".join(
+            _file_block(source, summaries.get(source, texts[source]), source in summaries)
+            for source in texts
+        )
+        self.cache.set_summary(digest_key, text)
+        return Digest(text, calls=self.calls, summarized=len(summaries))
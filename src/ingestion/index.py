@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import threading
+from dataclasses import asdict, replace
+from typing import Callable, Dict, List, Optional
+from src.ingestion.scanner import HZData, CATEGORIES, scan_hz, is_visible_file
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+DEFAULT_INDEX_PATH = os.path.join(".cache", "hz_index.json")
+
+def _dir_mtimes(hz_path: str) -> Dict[str, int]:
+    """
+    mtime of every directory in an HZ tree. Adding, removing or renaming an
+    entry changes its parent's mtime, so this detects changes without
+    listing any files.
+    """
+    mtimes = {}
+    for root, _, _ in os.walk(hz_path):
+        try:
+            mtimes[root] = os.stat(root).st_mtime_ns
+        except OSError:
+            pass
+    return mtimes
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, index: "HZIndex"):
+        self.index = index
+
+    def on_created(self, event):
+        self.index._on_change(event.src_path, event.is_directory, created=True)
+
+    def on_deleted(self, event):
+        self.index._on_change(event.src_path, event.is_directory, created=False)
+
+    def on_moved(self, event):
+        self.index._on_change(event.src_path, event.is_directory, created=False)
+        self.index._on_change(event.dest_path, event.is_directory, created=True)
+
+class HZIndex:
+    """
+    Persistent index of the HZ tree under `base_path`.
+
+    Built once (or loaded from `persist_path` and validated by directory
+    mtimes), then kept current by a watchdog observer. Without watchdog, or
+    if the observer can't start, snapshot() falls back to an mtime-diff
+    refresh at most every `poll_interval` seconds.
+    `on_new_file(path)` is called for files that appear while watching,
+    e.g. to pre-extract new uploads.
+    HZData objects handed out are never modified; a change stores a new one.
+    """
+
+    def __init__(self, base_path: str = "data", persist_path: Optional[str] = DEFAULT_INDEX_PATH, on_new_file: Optional[Callable[[str], None]] = None, poll_interval: float = 2.0):
+        # File paths are reported relative to base_path as given, like scan_directory
+        self.base_path = base_path
+        self.abs_base_path = os.path.abspath(base_path)
+        self.persist_path = persist_path
+        self.on_new_file = on_new_file
+        self.poll_interval = poll_interval
+        self.lock = threading.RLock()
+        self.observer = None
+        self.last_refresh = 0.0
+
+        self.hz: Dict[str, HZData] = {}
+        self.signatures: Dict[str, Dict[str, int]] = {}
+        self.base_mtime = 0
+        self._snapshot: Optional[List[HZData]] = None
+
+        if not self._load():
+            self.rebuild()
+        else:
+            self.refresh(force=True)
+
+    # --- Reading ---
+
+    def snapshot(self) -> List[HZData]:
+        """
+        Current list of HZs. O(1) while the observer is running.
+        """
+        if self.observer is None:
+            self.refresh()
+        with self.lock:
+            if self._snapshot is None:
+                self._snapshot = [self.hz[name] for name in sorted(self.hz)]
+            return self._snapshot
+
+    def get(self, name: str) -> Optional[HZData]:
+        self.snapshot()
+        with self.lock:
+            return self.hz.get(name)
+
+    # --- Building and refreshing ---
+
+    def rebuild(self):
+        with self.lock:
+            self.hz.clear()
+            self.signatures.clear()
+            if os.path.exists(self.base_path):
+                self.base_mtime = os.stat(self.base_path).st_mtime_ns
+                for entry in os.scandir(self.base_path):
+                    if entry.is_dir():
+                        self._rescan(entry.name)
+            self._changed()
+
+    def invalidate(self, hz_name: str):
+        """
+        Rescans one HZ right away, e.g. after the GUI changed its files.
+        """
+        with self.lock:
+            self._rescan(hz_name)
+            self._changed()
+
+    def refresh(self, force: bool = False):
+        """
+        mtime-diff refresh: only HZs whose directory mtimes changed are rescanned.
+        """
+        now = time.monotonic()
+        if not force and now - self.last_refresh < self.poll_interval:
+            return
+        self.last_refresh = now
+        if not os.path.exists(self.base_path):
+            with self.lock:
+                if self.hz:
+                    self.hz.clear()
+                    self.signatures.clear()
+                    self._changed()
+            return
+
+        with self.lock:
+            changed = False
+            base_mtime = os.stat(self.base_path).st_mtime_ns
+            if base_mtime != self.base_mtime:
+                # HZ folders were added or removed
+                self.base_mtime = base_mtime
+                names = {e.name for e in os.scandir(self.base_path) if e.is_dir()}
+                for name in set(self.signatures) - names:
+                    self._rescan(name)
+                for name in names - set(self.signatures):
+                    self._rescan(name)
+                changed = True
+            for name, signature in list(self.signatures.items()):
+                for directory, mtime in signature.items():
+                    try:
+                        current = os.stat(directory).st_mtime_ns
+                    except OSError:
+                        current = None
+                    if current != mtime:
+                        self._rescan(name)
+                        changed = True
+                        break
+            if changed:
+                self._changed()
+
+    def _rescan(self, name: str):
+        # Caller holds the lock
+        hz_path = os.path.join(self.base_path, name)
+        hz_data = scan_hz(hz_path) if os.path.isdir(hz_path) else None
+        if hz_data is None:
+            self.hz.pop(name, None)
+            if os.path.isdir(hz_path):
+                # Keep watching folders that may still get their subfolders
+                self.signatures[name] = _dir_mtimes(hz_path)
+            else:
+                self.signatures.pop(name, None)
+            return
+        self.hz[name] = hz_data
+        self.signatures[name] = _dir_mtimes(hz_path)
+
+    def _changed(self):
+        # Caller holds the lock
+        self._snapshot = None
+        self._save()
+
+    # --- Watching ---
+
+    def start(self) -> bool:
+        """
+        Starts the filesystem observer. Returns False if only polling is available.
+        """
+        if Observer is None or not os.path.exists(self.base_path):
+            return False
+        try:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), self.base_path, recursive=True)
+            observer.daemon = True
+            observer.start()
+        except Exception as e:
+            print(f"HZ index: filesystem observer unavailable, polling instead: {e}")
+            return False
+        self.observer = observer
+        return True
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+
+    def _on_change(self, path: str, is_directory: bool, created: bool):
+        rel = os.path.relpath(os.path.abspath(path), self.abs_base_path)
+        parts = rel.split(os.sep)
+        if parts[0] in (".", "..") or not parts[0]:
+            return
+        name = parts[0]
+        is_tracked_file = (
+            not is_directory and len(parts) >= 3 and parts[1] in CATEGORIES and is_visible_file(parts[-1])
+        )
+        with self.lock:
+            hz_data = self.hz.get(name)
+            if is_tracked_file and hz_data is not None:
+                # Plain file add/remove: no rescan needed. Callers may hold
+                # the old HZData, so its lists are copied, not changed
+                category = CATEGORIES[parts[1]]
+                files = getattr(hz_data, category)
+                file_path = os.path.join(hz_data.path, *parts[1:])
+                if created and file_path not in files:
+                    hz_data = replace(hz_data, **{category: files + [file_path]})
+                elif not created and file_path in files:
+                    hz_data = replace(hz_data, **{category: [f for f in files if f != file_path]})
+                self.hz[name] = hz_data
+                self.signatures[name] = _dir_mtimes(os.path.join(self.base_path, name))
+            else:
+                self._rescan(name)
+                hz_data = self.hz.get(name)
+                if hz_data is not None:
+                    self.base_mtime = os.stat(self.base_path).st_mtime_ns
+            self._changed()
+
+        if created and is_tracked_file and self.on_new_file and hz_data is not None:
+            try:
+                self.on_new_file(os.path.join(hz_data.path, *parts[1:]))
+            except Exception as e:
+                print(f"HZ index: on_new_file failed for {path}: {e}")
+
+    # --- Persistence ---
+
+    def _save(self):
+        if not self.persist_path:
+            return
+        data = {
+            "base_path": self.abs_base_path,
+            "base_mtime": self.base_mtime,
+            "hz": [asdict(h) for h in self.hz.values()],
+            "signatures": self.signatures,
+        }
+        try:
+            directory = os.path.dirname(self.persist_path)
+            if directory: os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.persist_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print(f"HZ index: could not persist index: {e}")
+
+    def _load(self) -> bool:
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("base_path") != self.abs_base_path:
+                return False
+            with self.lock:
+                self.base_mtime = data["base_mtime"]
+                self.hz = {h["name"]: HZData(**h) for h in data["hz"]}
+                self.signatures = data["signatures"]
+                self._snapshot = None
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
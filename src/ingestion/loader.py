@@ -1,8 +1,11 @@
 import os
+import multiprocessing
+import concurrent.futures
 from docx import Document
 from pypdf import PdfReader
 from pptx import Presentation
-from typing import Optional
+from typing import Optional, List, Dict
+from src.ingestion.cache import ExtractionCache, get_extraction_cache
 
 def load_docx(file_path: str) -> str:
     """Reads text from a .docx file."""
@@ -64,3 +67,65 @@ def load_file_content(file_path: str) -> str:
              return ""
     else:
         return f"[Skipped unsupported file type: {ext}]"
+
+CACHEABLE_EXTENSIONS = {".docx", ".pdf", ".pptx", ".txt", ".md"}
+
+def _cache_lookup(file_path: str, cache: ExtractionCache):
+    """
+    Returns (digest, text) where text is None on a miss. digest is None for
+    files that are not cached (unsupported types, unreadable files).
+    """
+    if os.path.splitext(file_path)[1].lower() not in CACHEABLE_EXTENSIONS:
+        return None, None
+    try:
+        digest = cache.content_hash(file_path)
+    except OSError as e:
+        print(f"Error hashing {file_path}: {e}")
+        return None, None
+    return digest, cache.get(digest)
+
+def load_cached(file_path: str, cache: Optional[ExtractionCache] = None) -> str:
+    """
+    load_file_content with the on-disk extraction cache in front of it.
+    """
+    cache = cache or get_extraction_cache()
+    digest, text = _cache_lookup(file_path, cache)
+    if text is not None:
+        return text
+    text = load_file_content(file_path)
+    # Empty results usually mean a parse error; don't pin those
+    if digest and text:
+        cache.set(digest, text)
+    return text
+
+def load_many(paths: List[str], workers: Optional[int] = None, cache: Optional[ExtractionCache] = None) -> Dict[str, str]:
+    """
+    Loads many files at once. Cache hits are served directly, the misses are
+    parsed in a process pool (CPU-bound parsing uses all cores).
+    Returns {path: text} in the order of `paths`.
+    """
+    cache = cache or get_extraction_cache()
+    results: Dict[str, str] = {}
+    misses = []
+    digests = {}
+    for path in paths:
+        digest, text = _cache_lookup(path, cache)
+        if text is not None:
+            results[path] = text
+        else:
+            misses.append(path)
+            digests[path] = digest
+
+    if len(misses) > 1 and workers != 1:
+        # Spawned, not forked: callers run threads (GUI, parallel HZs)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            parsed = dict(zip(misses, executor.map(load_file_content, misses)))
+    else:
+        parsed = {path: load_file_content(path) for path in misses}
+
+    for path, text in parsed.items():
+        if digests[path] and text:
+            cache.set(digests[path], text)
+        results[path] = text
+
+    return {path: results[path] for path in paths}
@@ -0,0 +1,131 @@
+import os
+import re
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
+
+# Rough token estimate used for the context budget (4 chars ~= 1 token)
+CHARS_PER_TOKEN = 4
+
+# Frequent German/English function words carry no retrieval signal
+STOPWORDS = {
+    "der", "die", "das", "und", "oder", "ein", "eine", "einer", "eines", "einem", "einen",
+    "ist", "sind", "im", "in", "zu", "mit", "von", "für", "auf", "den", "dem", "des",
+    "sie", "es", "wie", "was", "wird", "werden", "nicht", "auch", "an", "als", "bei",
+    "the", "and", "or", "of", "to", "is", "are", "a", "an", "for", "on", "with"
+}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+@dataclass
+class Chunk:
+    source: str
+    index: int
+    text: str
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def chunk_text(text: str, source: str, chunk_chars: int = 1500, overlap: int = 200) -> List[Chunk]:
+    """
+    Splits text into chunks of roughly `chunk_chars`, preferring paragraph
+    boundaries. Consecutive chunks overlap by up to `overlap` chars so facts
+    spanning a boundary are not lost.
+    """
+    chunks = []
+    current = ""
+    for para in re.split(r"\n\s*\n|\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        # Hard-split paragraphs that are longer than a whole chunk
+        while len(para) > chunk_chars:
+            head, para = para[:chunk_chars], para[chunk_chars - overlap:]
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(head)
+        if current and len(current) + len(para) + 1 > chunk_chars:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n{para}" if current else para
+    if current.strip():
+        chunks.append(current)
+    return [Chunk(source=source, index=i, text=c) for i, c in enumerate(chunks)]
+
+class BM25Index:
+    """
+    Okapi BM25 over text chunks with an inverted index, so a query only
+    touches the chunks that share at least one term with it.
+    """
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.doc_len: List[int] = []
+
+        for idx, chunk in enumerate(chunks):
+            tf = Counter(tokenize(chunk.text))
+            self.doc_len.append(sum(tf.values()))
+            for term, freq in tf.items():
+                self.postings[term].append((idx, freq))
+
+        n = len(chunks)
+        self.avgdl = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self.postings.items()
+        }
+
+    def search(self, query: str, top_k: int = 8) -> List[Tuple[Chunk, float]]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for idx, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[idx] / (self.avgdl or 1))
+                scores[idx] += idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(self.chunks[idx], score) for idx, score in ranked]
+
+    def select_context(self, query: str, token_budget: int = 6000, top_k: int = 8) -> str:
+        """
+        Returns the best matching chunks for `query` that fit into `token_budget`,
+        formatted like the full-context dump (grouped per file, in document order).
+        """
+        budget_chars = token_budget * CHARS_PER_TOKEN
+        selected = []
+        used = 0
+        for chunk, _ in self.search(query, top_k):
+            if used + len(chunk.text) > budget_chars:
+                continue
+            selected.append(chunk)
+            used += len(chunk.text)
+
+        # Nothing matched (e.g. very generic task): fall back to the start of each file
+        if not selected:
+            for chunk in self.chunks:
+                if chunk.index == 0 and used + len(chunk.text) <= budget_chars:
+                    selected.append(chunk)
+                    used += len(chunk.text)
+
+        by_source: Dict[str, List[Chunk]] = defaultdict(list)
+        for chunk in sorted(selected, key=lambda c: (c.source, c.index)):
+            by_source[chunk.source].append(chunk)
+
+        context = ""
+        for source, chunks in by_source.items():
+            body = "\n[...]\n".join(c.text for c in chunks)
+            context += f"--- START FILE: {os.path.basename(source)} (Auszug) ---\n{body}\n--- END FILE ---\n\n"
+        return context
+
+def build_index(input_texts: Dict[str, str], chunk_chars: int = 1500) -> BM25Index:
+    chunks = []
+    for filename, text in input_texts.items():
+        if text:
+            chunks.extend(chunk_text(text, filename, chunk_chars=chunk_chars))
+    return BM25Index(chunks)
@@ -1,6 +1,12 @@
 import os
 from dataclasses import dataclass, field
-from typing import List, Dict
+from typing import List, Optional
+
+CATEGORIES = {
+    "Input": "input_files",
+    "Assignments": "assignment_files",
+    "Solutions": "solutions_files",
+}
 
 @dataclass
 class HZData:
@@ -10,6 +16,31 @@ class HZData:
     assignment_files: List[str] = field(default_factory=list)
     solutions_files: List[str] = field(default_factory=list)
 
+def is_visible_file(filename: str) -> bool:
+    # Ignore temp/hidden files
+    return not filename.startswith("~") and not filename.startswith(".")
+
+def scan_hz(hz_path: str) -> Optional[HZData]:
+    """
+    Scans a single HZ folder. Returns None if it has none of the expected subfolders.
+    """
+    hz_data = HZData(name=os.path.basename(hz_path), path=hz_path)
+    found = False
+    for category, attr in CATEGORIES.items():
+        category_dir = os.path.join(hz_path, category)
+        if not os.path.exists(category_dir):
+            continue
+        found = True
+        files = getattr(hz_data, attr)
+        for root, _, filenames in os.walk(category_dir):
+            for file in filenames:
+                if is_visible_file(file):
+                    files.append(os.path.join(root, file))
+    
+    # Always add the HZ if it's a directory in the data folder, 
+    # assuming it's a valid project container.
+    return hz_data if found else None
+
 def scan_directory(base_path: str = "data") -> List[HZData]:
     """
     Scans the base_path for HZ folders (Handlungsziel).
@@ -29,38 +60,8 @@ def scan_directory(base_path: str = "data") -> List[HZData]:
     # Iterate over top-level directories in base_path
     for entry in os.scandir(base_path):
         if entry.is_dir():
-            hz_name = entry.name
-            hz_path = entry.path
-            
-            hz_data = HZData(name=hz_name, path=hz_path)
-            
-            # Check for Input folder
-            input_dir = os.path.join(hz_path, "Input")
-            if os.path.exists(input_dir):
-                for root, _, files in os.walk(input_dir):
-                    for file in files:
-                        if not file.startswith("~") and not file.startswith("."): # Ignore temp/hidden files
-                            hz_data.input_files.append(os.path.join(root, file))
-            
-            # Check for Assignments folder
-            assignments_dir = os.path.join(hz_path, "Assignments")
-            if os.path.exists(assignments_dir):
-                for root, _, files in os.walk(assignments_dir):
-                    for file in files:
-                        if not file.startswith("~") and not file.startswith("."):
-                            hz_data.assignment_files.append(os.path.join(root, file))
-                            
-            # Check for Solutions folder
-            solutions_dir = os.path.join(hz_path, "Solutions")
-            if os.path.exists(solutions_dir):
-                for root, _, files in os.walk(solutions_dir):
-                    for file in files:
-                        if not file.startswith("~") and not file.startswith("."):
-                            hz_data.solutions_files.append(os.path.join(root, file))
-            
-            # Always add the HZ if it's a directory in the data folder, 
-            # assuming it's a valid project container.
-            if os.path.exists(input_dir) or os.path.exists(assignments_dir) or os.path.exists(solutions_dir):
+            hz_data = scan_hz(entry.path)
+            if hz_data:
                 hz_list.append(hz_data)
                 
     return hz_list
@@ -0,0 +1,209 @@
+import io
+import json
+import time
+import contextlib
+import concurrent.futures
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+from src.agent.limits import RunLimits
+from src.llm.client import LLMClient, LLMResponse, _usage_anthropic
+from src.llm.ratelimit import LLMError
+
+BatchResult = Union[LLMResponse, LLMError]
+
+@dataclass
+class BatchRequest:
+    custom_id: str  # [a-zA-Z0-9_-], max 64 chars (Anthropic limit)
+    system_prompt: str
+    user_prompt: str
+    context: str = ""
+    temperature: float = 0.7
+
+class OpenAIBatchBackend:
+    """
+    OpenAI Batch API: JSONL upload, batch job, output file download.
+    """
+
+    def __init__(self, llm: LLMClient):
+        self.llm = llm
+        self.client = llm.client
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        lines = []
+        for r in requests:
+            lines.append(json.dumps({
+                "custom_id": r.custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.llm.model,
+                    "messages": self.llm._openai_messages(r.system_prompt, r.user_prompt, r.context),
+                    "temperature": r.temperature
+                }
+            }, ensure_ascii=False))
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_file = self.client.files.create(file=("batch_input.jsonl", io.BytesIO(payload)), purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        return batch.id
+
+    def poll(self, batch_id: str) -> bool:
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("failed", "expired", "cancelled"):
+            raise LLMError(f"OpenAI batch {batch_id} ended with status '{batch.status}'")
+        return batch.status == "completed"
+
+    def fetch(self, batch_id: str) -> Dict[str, BatchResult]:
+        batch = self.client.batches.retrieve(batch_id)
+        results: Dict[str, BatchResult] = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                body = response.get("body") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    results[entry["custom_id"]] = LLMError(f"Batch request failed: {entry.get('error') or body}")
+                    continue
+                usage = body.get("usage") or {}
+                results[entry["custom_id"]] = LLMResponse(body["choices"][0]["message"]["content"], usage={
+                    "input_tokens": usage.get("prompt_tokens", 0),
+                    "output_tokens": usage.get("completion_tokens", 0),
+                    "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0),
+                })
+        return results
+
+class AnthropicBatchBackend:
+    """
+    Anthropic Message Batches API.
+    """
+
+    def __init__(self, llm: LLMClient):
+        self.llm = llm
+        self.client = llm.client
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        batch = self.client.messages.batches.create(requests=[
+            {
+                "custom_id": r.custom_id,
+                "params": {
+                    "model": self.llm.model,
+                    "max_tokens": 4096,
+                    "temperature": r.temperature,
+                    "system": self.llm._anthropic_system(r.system_prompt, r.context),
+                    "messages": [{"role": "user", "content": r.user_prompt}]
+                }
+            }
+            for r in requests
+        ])
+        return batch.id
+
+    def poll(self, batch_id: str) -> bool:
+        return self.client.messages.batches.retrieve(batch_id).processing_status == "ended"
+
+    def fetch(self, batch_id: str) -> Dict[str, BatchResult]:
+        results: Dict[str, BatchResult] = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                results[entry.custom_id] = LLMResponse(message.content[0].text, usage=_usage_anthropic(message))
+            else:
+                error = getattr(entry.result, "error", None) or entry.result.type
+                results[entry.custom_id] = LLMError(f"Batch request failed: {error}")
+        return results
+
+class LocalBatchBackend:
+    """
+    In-process stand-in for the batch endpoints: runs the requests directly
+    through the LLMClient, up to `max_concurrency` at once (each holding a
+    call slot of `limits`, if given). Used for providers without a batch API
+    and for checking the batch path offline with the mock provider.
+    """
+
+    def __init__(self, llm: LLMClient, max_concurrency: int = 8, limits: Optional[RunLimits] = None):
+        self.llm = llm
+        self.max_concurrency = max(1, max_concurrency)
+        self.limits = limits
+        self._batches: Dict[str, Dict[str, BatchResult]] = {}
+        self._submitted = 0
+
+    def _run(self, r: BatchRequest) -> BatchResult:
+        with self.limits.slot() if self.limits else contextlib.nullcontext():
+            try:
+                return self.llm.generate_text(r.system_prompt, r.user_prompt, r.temperature, context=r.context)
+            except LLMError as e:
+                return e
+
+    def submit(self, requests: List[BatchRequest]) -> str:
+        self._submitted += 1
+        batch_id = f"local-{self._submitted}"
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_concurrency, max(1, len(requests)))) as executor:
+            outcomes = list(executor.map(self._run, requests))
+        self._batches[batch_id] = {r.custom_id: outcome for r, outcome in zip(requests, outcomes)}
+        return batch_id
+
+    def poll(self, batch_id: str) -> bool:
+        return True
+
+    def fetch(self, batch_id: str) -> Dict[str, BatchResult]:
+        return self._batches.pop(batch_id)
+
+def make_backend(llm: LLMClient, max_concurrency: int = 8, limits: Optional[RunLimits] = None):
+    if llm.provider == "openai":
+        return OpenAIBatchBackend(llm)
+    if llm.provider == "anthropic":
+        return AnthropicBatchBackend(llm)
+    print(f"No batch API for {llm.provider}, running batch requests directly ({max_concurrency} at once).")
+    return LocalBatchBackend(llm, max_concurrency, limits)
+
+class BatchRunner:
+    """
+    Submits a list of requests as one provider batch and blocks until the
+    results are in. Cached responses are served locally and never submitted.
+    Results of real batch jobs are marked with `batch=True` (discounted pricing).
+    """
+
+    def __init__(self, llm: LLMClient, backend=None, poll_interval: float = 30.0, log=print, max_concurrency: int = 8, limits: Optional[RunLimits] = None):
+        self.llm = llm
+        self.backend = backend or make_backend(llm, max_concurrency, limits)
+        self.poll_interval = poll_interval
+        self.log = log
+
+    def run(self, requests: List[BatchRequest]) -> Dict[str, BatchResult]:
+        results: Dict[str, BatchResult] = {}
+        todo = []
+        keys = {}
+        for r in requests:
+            key = self.llm._cache_key(r.system_prompt, r.user_prompt, r.temperature, r.context)
+            cached = self.llm._cache_lookup(key)
+            if cached is not None:
+                results[r.custom_id] = cached
+            else:
+                keys[r.custom_id] = key
+                todo.append(r)
+
+        if not todo:
+            return results
+
+        batch_id = self.backend.submit(todo)
+        self.log(f"Submitted batch {batch_id} ({len(todo)} requests, {len(results)} cached).")
+        started = time.monotonic()
+        while not self.backend.poll(batch_id):
+            time.sleep(self.poll_interval)
+            self.log(f"Waiting for batch {batch_id}... ({int(time.monotonic() - started)}s)")
+
+        fetched = self.backend.fetch(batch_id)
+        is_remote = not isinstance(self.backend, LocalBatchBackend)
+        for r in todo:
+            result = fetched.get(r.custom_id, LLMError(f"Batch result missing for {r.custom_id}"))
+            if isinstance(result, LLMResponse):
+                self.llm._cache_store(keys[r.custom_id], str(result))
+                result.batch = is_remote
+            results[r.custom_id] = result
+        return results
@@ -0,0 +1,134 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "500")) * 1024 * 1024)
+DEFAULT_TTL_SECONDS = int(float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400)
+
+# Per-run switch for LLMClient:
+#   "use"     - read and write the cache
+#   "refresh" - ignore existing entries but store the new responses
+#   "bypass"  - don't touch the cache at all
+CACHE_MODES = ("use", "refresh", "bypass")
+
+# Writes between two full recounts of the stored size (which also drop
+# expired entries); other processes sharing the file change it too
+RECOUNT_INTERVAL = 1000
+
+def make_cache_key(provider: str, model: str, system_prompt: str, user_prompt: str, temperature: float) -> str:
+    """
+    Content address of a request. Any change in the inputs gives a new key.
+    """
+    payload = json.dumps([provider, model, system_prompt, user_prompt, round(float(temperature), 4)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Persistent LLM response store backed by SQLite.
+    Entries expire after `ttl_seconds`; once the stored text exceeds `max_bytes`
+    the least recently used entries are evicted. The stored size is kept as a
+    running total instead of being summed on every write.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.writes = 0
+
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            self._recount()
+            self.conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT response, created, size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            response, created, size = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                self.total_bytes -= size
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            return response
+
+    def set(self, key: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            self.total_bytes += size - (old[0] if old else 0)
+            self.writes += 1
+            if self.writes % RECOUNT_INTERVAL == 0:
+                self._recount()
+            self._evict()
+            self.conn.commit()
+
+    def _recount(self):
+        # Caller holds the lock
+        if self.ttl_seconds:
+            self.conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        # Caller holds the lock
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        stale = []
+        for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total - freed <= self.max_bytes:
+                break
+            stale.append((key,))
+            freed += size
+        self.conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        self.total_bytes -= freed
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+            self.total_bytes = 0
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+def get_default_cache() -> ResponseCache:
+    """
+    Process-wide cache instance shared by all LLMClients.
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
@@ -1,82 +1,674 @@
 import os
+import time
+import asyncio
+import hashlib
+import threading
 import openai
 import anthropic
-from google import genai
 from google.genai import types
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Iterator, AsyncIterator
 from dotenv import load_dotenv
+from src.llm.cache import ResponseCache, CACHE_MODES, make_cache_key, get_default_cache
+from src.llm.ratelimit import LLMError, MAX_RETRIES, get_rate_limiter, is_retryable, status_code, retry_after_seconds, backoff_delay
+from src.llm.mock import MockProvider
+from src.llm.connections import OPENAI_COMPATIBLE, get_client, get_async_client, provider_endpoint
+from src.utils.cost import estimate_tokens
 
 load_dotenv()
 
+# Cheap default model per provider for summarizing the input material
+SUMMARY_MODELS = {
+    "openai": "gpt-4o-mini",
+    "anthropic": "claude-3-haiku-20240307",
+    "gemini": "gemini-2.0-flash",
+    "deepseek": "deepseek-chat",
+    "openrouter": "deepseek/deepseek-chat",
+    "mock": "mock",
+}
+
+# Gemini rejects CachedContent below a minimum token count, so small
+# prefixes are sent inline instead (~4 chars per token).
+GEMINI_MIN_CACHE_CHARS = 4096 * 4
+GEMINI_CACHE_TTL = 900  # seconds
+# A cache that expires sooner than this is extended before it is used
+GEMINI_CACHE_RENEW_MARGIN = 120
+
+class LLMResponse(str):
+    """
+    Generated text plus metadata about how it was produced.
+    Behaves like a plain string for existing callers.
+    Token counts are the provider-reported usage (0 if unavailable),
+    latency is the wall time of the request in seconds including retries,
+    of which limiter_wait was spent waiting for the rate limiter.
+    """
+    cache_hit: bool = False
+    batch: bool = False  # produced by a provider batch job (discounted)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0  # written to the provider's prompt cache (billed extra)
+    latency: float = 0.0
+    retries: int = 0
+    limiter_wait: float = 0.0
+
+    def __new__(cls, text: str, cache_hit: bool = False, usage: Optional[Dict[str, int]] = None, latency: float = 0.0, retries: int = 0, limiter_wait: float = 0.0):
+        obj = super().__new__(cls, text or "")
+        obj.cache_hit = cache_hit
+        obj.latency = latency
+        obj.retries = retries
+        obj.limiter_wait = limiter_wait
+        usage = usage or {}
+        obj.input_tokens = usage.get("input_tokens", 0)
+        obj.output_tokens = usage.get("output_tokens", 0)
+        obj.cached_tokens = usage.get("cached_tokens", 0)
+        obj.cache_write_tokens = usage.get("cache_write_tokens", 0)
+        return obj
+
+def _usage_openai(response) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "input_tokens": usage.prompt_tokens or 0,
+        "output_tokens": usage.completion_tokens or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+def _usage_anthropic(response) -> Dict[str, int]:
+    usage = getattr(response, "usage", None)
+    if not usage:
+        return {}
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    # Anthropic reports the uncached remainder in input_tokens
+    return {
+        "input_tokens": (usage.input_tokens or 0) + cache_read + cache_write,
+        "output_tokens": usage.output_tokens or 0,
+        "cached_tokens": cache_read,
+        "cache_write_tokens": cache_write,
+    }
+
+def _usage_gemini(response) -> Dict[str, int]:
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return {}
+    return {
+        "input_tokens": usage.prompt_token_count or 0,
+        "output_tokens": usage.candidates_token_count or 0,
+        "cached_tokens": usage.cached_content_token_count or 0,
+    }
+
+class TextStream:
+    """
+    Iterator over the text deltas of a streamed completion.
+    Once exhausted, `response` holds the full LLMResponse (with usage).
+    Stopping early via close() aborts the request; `response` stays None.
+    """
+
+    def __init__(self):
+        self.response: Optional[LLMResponse] = None
+        self._deltas: Optional[Iterator[str]] = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        return next(self._deltas)
+
+    def close(self):
+        self._deltas.close()
+
+class AsyncTextStream:
+    """
+    Async counterpart of TextStream.
+    """
+
+    def __init__(self):
+        self.response: Optional[LLMResponse] = None
+        self._deltas: Optional[AsyncIterator[str]] = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        return await self._deltas.__anext__()
+
+    async def aclose(self):
+        await self._deltas.aclose()
+
 class LLMClient:
-    def __init__(self, provider: str = "openai", model: str = "gpt-4o"):
+    def __init__(self, provider: str = "openai", model: str = "gpt-4o", cache: Optional[ResponseCache] = None, cache_mode: str = "use", max_connections: int = 0):
         self.provider = provider.lower()
         self.model = model
+        # Connection pool size for this client's calls (0 = registry default)
+        self.max_connections = max_connections
+
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {cache_mode} (expected one of {', '.join(CACHE_MODES)})")
+        self.cache_mode = cache_mode
+        self.cache = None if cache_mode == "bypass" else (cache or get_default_cache())
+
+        # Gemini CachedContent per shared prefix: (name, expiry as time.time());
+        # None = caching not possible. Only prefixes registered via
+        # share_prefix() are cached, the rest of a context is sent inline.
+        self._gemini_caches: Dict[str, Optional[Tuple[str, float]]] = {}
+        self._gemini_lock = threading.Lock()
+        # Keys whose cache is being created or renewed right now
+        self._gemini_pending: set = set()
+        self._shared_prefixes: set = set()
+
+        # Shared with every other client of the same provider/model
+        self.limiter = get_rate_limiter(self.provider, self.model)
         
-        # Initialize clients based on provider
-        if self.provider == "openai":
-            self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        elif self.provider == "anthropic":
-            self.client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-            
-        elif self.provider == "gemini":
-            self.client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-            
-        elif self.provider == "deepseek":
-             # DeepSeek is compatible with OpenAI SDK
-            self.client = openai.OpenAI(
-                api_key=os.getenv("DEEPSEEK_API_KEY"),
-                base_url="https://api.deepseek.com"
-            )
-            
-        elif self.provider == "openrouter":
-            # OpenRouter is compatible with OpenAI SDK
-            self.client = openai.OpenAI(
-                api_key=os.getenv("OPENROUTER_API_KEY"),
-                base_url="https://openrouter.ai/api/v1"
-            )
+        if self.provider == "mock":
+            # Offline provider for benchmarks (see src/llm/mock.py)
+            self.client = MockProvider()
+        elif self.provider in OPENAI_COMPATIBLE or self.provider in ("anthropic", "gemini"):
+            # SDK clients come from the process-wide registry, so all LLMClients
+            # of a provider share one connection pool (DeepSeek and OpenRouter
+            # use the OpenAI SDK)
+            self._api_key, self._base_url = provider_endpoint(self.provider)
+            self.client = get_client(self.provider, self._api_key, self._base_url, max_connections)
         else:
             raise ValueError(f"Unknown provider: {self.provider}")
 
-    def generate_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.7) -> str:
+    @property
+    def async_client(self):
         """
-        Generates text based on the provider.
+        Async SDK client used by agenerate_text, from the registry (one per
+        event loop). Gemini exposes its async surface via `.aio`.
         """
-        try:
-            if self.provider in ["openai", "deepseek", "openrouter"]:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    temperature=temperature
-                )
-                return response.choices[0].message.content
+        if self.provider == "mock":
+            return self.client
+        return get_async_client(self.provider, self._api_key, self._base_url, self.max_connections)
 
-            elif self.provider == "anthropic":
-                response = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=4096,
-                    temperature=temperature,
-                    system=system_prompt,
-                    messages=[
-                        {"role": "user", "content": user_prompt}
-                    ]
-                )
-                return response.content[0].text
+    def _cache_key(self, system_prompt: str, user_prompt: str, temperature: float, context: str) -> str:
+        if context:
+            system_prompt = f"{system_prompt}\n\n{context}"
+        return make_cache_key(self.provider, self.model, system_prompt, user_prompt, temperature)
+
+    def _cache_lookup(self, key: str) -> Optional[LLMResponse]:
+        if self.cache is None or self.cache_mode != "use":
+            return None
+        cached = self.cache.get(key)
+        return LLMResponse(cached, cache_hit=True) if cached is not None else None
+
+    def _cache_store(self, key: str, text: str):
+        if self.cache is not None and text:
+            self.cache.set(key, text)
 
-            elif self.provider == "gemini":
-                response = self.client.models.generate_content(
+    # --- Request building ---
+    # `context` is the static prefix (course material + assignment) shared by
+    # many calls. It is always placed directly after the system prompt so the
+    # provider sees an identical prefix:
+    #   OpenAI-compatible: appended to the system message (automatic prefix caching)
+    #   Anthropic: separate system block marked with cache_control
+    #   Gemini: CachedContent holding the system instruction + the part of the
+    #           context shared across tasks (share_prefix), the rest inline
+
+    def _openai_messages(self, system_prompt: str, user_prompt: str, context: str) -> List[Dict]:
+        system_content = f"{system_prompt}\n\n{context}" if context else system_prompt
+        return [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    def _anthropic_system(self, system_prompt: str, context: str):
+        if not context:
+            return system_prompt
+        return [
+            {"type": "text", "text": system_prompt},
+            {"type": "text", "text": context, "cache_control": {"type": "ephemeral"}}
+        ]
+
+    def share_prefix(self, prefix: str):
+        """
+        Marks a start of `context` that many calls share (e.g. assignment plus
+        digest). Gemini caches only such prefixes as CachedContent.
+        """
+        if self.provider == "gemini" and len(prefix) >= GEMINI_MIN_CACHE_CHARS:
+            with self._gemini_lock:
+                self._shared_prefixes.add(prefix)
+
+    def _gemini_request(self, system_prompt: str, user_prompt: str, temperature: float, context: str):
+        """
+        (contents, config) of a Gemini call. The longest shared prefix of the
+        context comes from a CachedContent, the remainder is sent inline.
+        """
+        with self._gemini_lock:
+            shared = max((p for p in self._shared_prefixes if context.startswith(p)), key=len, default="")
+        cache_name = self._gemini_cached_content(system_prompt, shared) if shared else None
+        if cache_name:
+            rest = context[len(shared):]
+            contents = [rest, user_prompt] if rest.strip() else user_prompt
+            return contents, types.GenerateContentConfig(cached_content=cache_name, temperature=temperature)
+        system_instruction = f"{system_prompt}\n\n{context}" if context else system_prompt
+        return user_prompt, types.GenerateContentConfig(system_instruction=system_instruction, temperature=temperature)
+
+    def _gemini_cached_content(self, system_prompt: str, prefix: str) -> Optional[str]:
+        """
+        Name of the CachedContent for a shared prefix, created or renewed as
+        needed; None sends the prefix inline. The SDK calls run outside the
+        lock, and calls arriving while one is in flight go inline meanwhile.
+        """
+        key = hashlib.sha256(f"{system_prompt}\0{prefix}".encode("utf-8")).hexdigest()
+        with self._gemini_lock:
+            entry = self._gemini_caches.get(key, ())
+            if entry is None or key in self._gemini_pending:
+                return entry[0] if entry else None
+            if entry and entry[1] - time.time() > GEMINI_CACHE_RENEW_MARGIN:
+                return entry[0]
+            self._gemini_pending.add(key)
+
+        result = entry
+        try:
+            if entry:
+                # About to expire on the server: extend it, or create it again if it is gone
+                try:
+                    self.client.caches.update(name=entry[0], config=types.UpdateCachedContentConfig(ttl=f"{GEMINI_CACHE_TTL}s"))
+                    result = (entry[0], time.time() + GEMINI_CACHE_TTL)
+                except Exception:
+                    entry = ()
+            if not entry:
+                cached = self.client.caches.create(
                     model=self.model,
-                    contents=user_prompt,
-                    config=types.GenerateContentConfig(
+                    config=types.CreateCachedContentConfig(
                         system_instruction=system_prompt,
-                        temperature=temperature
+                        contents=[prefix],
+                        ttl=f"{GEMINI_CACHE_TTL}s"
                     )
                 )
-                return response.text
-
+                result = (cached.name, time.time() + GEMINI_CACHE_TTL)
         except Exception as e:
-            return f"Error generating text with {self.provider}: {e}"
\ No newline at end of file
+            if is_retryable(e):
+                # Rate limit, server error or timeout: inline this time, retry on the next call
+                print(f"Gemini context cache not created ({e}), sending prefix inline for now.")
+                result = ()
+            else:
+                # Model without caching support or prefix too small: send inline
+                print(f"Gemini context caching unavailable, sending prefix inline: {e}")
+                result = None
+        finally:
+            with self._gemini_lock:
+                self._gemini_pending.discard(key)
+                if result == ():
+                    self._gemini_caches.pop(key, None)
+                else:
+                    self._gemini_caches[key] = result
+        return result[0] if result else None
+
+    def release_caches(self):
+        """
+        Deletes the provider-side context caches created by this client (Gemini
+        bills their storage until they expire). Call at the end of a run.
+        """
+        with self._gemini_lock:
+            entries = [entry for entry in self._gemini_caches.values() if entry]
+            self._gemini_caches.clear()
+            self._shared_prefixes.clear()
+        for name, _ in entries:
+            try:
+                self.client.caches.delete(name=name)
+            except Exception as e:
+                print(f"Could not delete Gemini cache {name}: {e}")
+
+    # --- Rate limiting and retries ---
+    # Every attempt first takes capacity from the shared limiter (estimated
+    # input tokens), transient failures are retried with jittered backoff,
+    # and anything else surfaces as LLMError instead of generated text.
+
+    def _estimate_tokens(self, system_prompt: str, user_prompt: str, context: str) -> int:
+        # Only used to reserve limiter capacity; corrected by the reported usage
+        return estimate_tokens(system_prompt) + estimate_tokens(context) + estimate_tokens(user_prompt)
+
+    def _handle_failure(self, exc: Exception, attempt: int) -> float:
+        """
+        Returns the backoff delay before the next attempt or raises LLMError.
+        """
+        if isinstance(exc, LLMError):
+            raise exc
+        retry_after = retry_after_seconds(exc)
+        if status_code(exc) == 429:
+            self.limiter.on_rate_limited(retry_after)
+        if not is_retryable(exc) or attempt >= MAX_RETRIES:
+            raise LLMError(f"Error generating text with {self.provider}: {exc}") from exc
+        delay = backoff_delay(attempt, retry_after)
+        print(f"{self.provider}/{self.model}: {type(exc).__name__} (attempt {attempt + 1}/{MAX_RETRIES + 1}), retrying in {delay:.1f}s")
+        return delay
+
+    def _on_success(self, usage: Dict[str, int]):
+        self.limiter.on_success()
+        self.limiter.consume(usage.get("output_tokens", 0))
+
+    def _with_retries(self, call, est_tokens: int):
+        """
+        Returns (text, usage, stats); stats holds the retry count and the
+        time spent waiting for the rate limiter.
+        """
+        attempt = 0
+        waited = 0.0
+        while True:
+            wait_start = time.monotonic()
+            self.limiter.acquire(est_tokens)
+            waited += time.monotonic() - wait_start
+            try:
+                text, usage = call()
+            except Exception as e:
+                time.sleep(self._handle_failure(e, attempt))
+                attempt += 1
+                continue
+            self._on_success(usage)
+            return text, usage, {"retries": attempt, "limiter_wait": waited}
+
+    async def _awith_retries(self, call, est_tokens: int):
+        attempt = 0
+        waited = 0.0
+        while True:
+            wait_start = time.monotonic()
+            await self.limiter.aacquire(est_tokens)
+            waited += time.monotonic() - wait_start
+            try:
+                text, usage = await call()
+            except Exception as e:
+                await asyncio.sleep(self._handle_failure(e, attempt))
+                attempt += 1
+                continue
+            self._on_success(usage)
+            return text, usage, {"retries": attempt, "limiter_wait": waited}
+
+    def generate_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, context: str = "") -> LLMResponse:
+        """
+        Generates text based on the provider.
+        `context` is an optional static prefix that providers may cache across calls.
+        Successful responses are stored in the response cache.
+        Raises LLMError if the provider keeps failing.
+        """
+        key = self._cache_key(system_prompt, user_prompt, temperature, context)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+
+        start = time.monotonic()
+        text, usage, stats = self._with_retries(
+            lambda: self._call_provider(system_prompt, user_prompt, temperature, context),
+            self._estimate_tokens(system_prompt, user_prompt, context)
+        )
+
+        self._cache_store(key, text)
+        return LLMResponse(text, usage=usage, latency=time.monotonic() - start, **stats)
+
+    def _call_provider(self, system_prompt: str, user_prompt: str, temperature: float, context: str) -> Tuple[str, Dict[str, int]]:
+        if self.provider in OPENAI_COMPATIBLE:
+            raw = self.client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=self._openai_messages(system_prompt, user_prompt, context),
+                temperature=temperature
+            )
+            self.limiter.update_from_headers(raw.headers)
+            response = raw.parse()
+            return response.choices[0].message.content, _usage_openai(response)
+
+        elif self.provider == "anthropic":
+            raw = self.client.messages.with_raw_response.create(
+                model=self.model,
+                max_tokens=4096,
+                temperature=temperature,
+                system=self._anthropic_system(system_prompt, context),
+                messages=[
+                    {"role": "user", "content": user_prompt}
+                ]
+            )
+            self.limiter.update_from_headers(raw.headers)
+            response = raw.parse()
+            return response.content[0].text, _usage_anthropic(response)
+
+        elif self.provider == "gemini":
+            contents, config = self._gemini_request(system_prompt, user_prompt, temperature, context)
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=config
+            )
+            return response.text, _usage_gemini(response)
+
+        elif self.provider == "mock":
+            return self.client.complete(system_prompt, user_prompt, context)
+
+    async def agenerate_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, context: str = "") -> LLMResponse:
+        """
+        Async counterpart of generate_text using the providers' async SDK clients.
+        """
+        key = self._cache_key(system_prompt, user_prompt, temperature, context)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            return cached
+
+        start = time.monotonic()
+        text, usage, stats = await self._awith_retries(
+            lambda: self._acall_provider(system_prompt, user_prompt, temperature, context),
+            self._estimate_tokens(system_prompt, user_prompt, context)
+        )
+
+        self._cache_store(key, text)
+        return LLMResponse(text, usage=usage, latency=time.monotonic() - start, **stats)
+
+    async def _acall_provider(self, system_prompt: str, user_prompt: str, temperature: float, context: str) -> Tuple[str, Dict[str, int]]:
+        client = self.async_client
+        if self.provider in OPENAI_COMPATIBLE:
+            raw = await client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=self._openai_messages(system_prompt, user_prompt, context),
+                temperature=temperature
+            )
+            self.limiter.update_from_headers(raw.headers)
+            response = raw.parse()
+            return response.choices[0].message.content, _usage_openai(response)
+
+        elif self.provider == "anthropic":
+            raw = await client.messages.with_raw_response.create(
+                model=self.model,
+                max_tokens=4096,
+                temperature=temperature,
+                system=self._anthropic_system(system_prompt, context),
+                messages=[
+                    {"role": "user", "content": user_prompt}
+                ]
+            )
+            self.limiter.update_from_headers(raw.headers)
+            response = raw.parse()
+            return response.content[0].text, _usage_anthropic(response)
+
+        elif self.provider == "gemini":
+            # CachedContent creation is a one-off sync call per prefix
+            contents, config = await asyncio.to_thread(self._gemini_request, system_prompt, user_prompt, temperature, context)
+            response = await client.models.generate_content(
+                model=self.model,
+                contents=contents,
+                config=config
+            )
+            return response.text, _usage_gemini(response)
+
+        elif self.provider == "mock":
+            return await client.acomplete(system_prompt, user_prompt, context)
+
+    # --- Streaming ---
+
+    def stream_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, context: str = "") -> TextStream:
+        """
+        Streams the completion as text deltas. Cache hits are yielded as one delta.
+        """
+        stream = TextStream()
+        stream._deltas = self._stream_deltas(stream, system_prompt, user_prompt, temperature, context)
+        return stream
+
+    def _stream_deltas(self, stream: TextStream, system_prompt: str, user_prompt: str, temperature: float, context: str) -> Iterator[str]:
+        key = self._cache_key(system_prompt, user_prompt, temperature, context)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            stream.response = cached
+            yield str(cached)
+            return
+
+        # Failures before the first delta are retried like generate_text;
+        # once text has been yielded the error is raised to the consumer.
+        start = time.monotonic()
+        parts = []
+        usage: Dict[str, int] = {}
+        est_tokens = self._estimate_tokens(system_prompt, user_prompt, context)
+        attempt = 0
+        waited = 0.0
+        while True:
+            wait_start = time.monotonic()
+            self.limiter.acquire(est_tokens)
+            waited += time.monotonic() - wait_start
+            try:
+                for delta in self._provider_stream(system_prompt, user_prompt, temperature, context, usage):
+                    parts.append(delta)
+                    yield delta
+            except Exception as e:
+                if parts:
+                    raise LLMError(f"Error generating text with {self.provider}: {e}") from e
+                time.sleep(self._handle_failure(e, attempt))
+                attempt += 1
+                continue
+            self._on_success(usage)
+            break
+
+        text = "".join(parts)
+        self._cache_store(key, text)
+        stream.response = LLMResponse(text, usage=usage, latency=time.monotonic() - start, retries=attempt, limiter_wait=waited)
+
+    def _provider_stream(self, system_prompt: str, user_prompt: str, temperature: float, context: str, usage: Dict[str, int]) -> Iterator[str]:
+        # Fills `usage` once the provider reports it (end of stream)
+        if self.provider in OPENAI_COMPATIBLE:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._openai_messages(system_prompt, user_prompt, context),
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    usage.update(_usage_openai(chunk))
+
+        elif self.provider == "anthropic":
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                temperature=temperature,
+                system=self._anthropic_system(system_prompt, context),
+                messages=[
+                    {"role": "user", "content": user_prompt}
+                ]
+            ) as response:
+                for text in response.text_stream:
+                    yield text
+                usage.update(_usage_anthropic(response.get_final_message()))
+
+        elif self.provider == "gemini":
+            contents, config = self._gemini_request(system_prompt, user_prompt, temperature, context)
+            for chunk in self.client.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=config
+            ):
+                if chunk.text:
+                    yield chunk.text
+                if getattr(chunk, "usage_metadata", None):
+                    usage.update(_usage_gemini(chunk))
+
+        elif self.provider == "mock":
+            yield from self.client.stream(system_prompt, user_prompt, context, usage)
+
+    def astream_text(self, system_prompt: str, user_prompt: str, temperature: float = 0.7, context: str = "") -> AsyncTextStream:
+        """
+        Async counterpart of stream_text.
+        """
+        stream = AsyncTextStream()
+        stream._deltas = self._astream_deltas(stream, system_prompt, user_prompt, temperature, context)
+        return stream
+
+    async def _astream_deltas(self, stream: AsyncTextStream, system_prompt: str, user_prompt: str, temperature: float, context: str) -> AsyncIterator[str]:
+        key = self._cache_key(system_prompt, user_prompt, temperature, context)
+        cached = self._cache_lookup(key)
+        if cached is not None:
+            stream.response = cached
+            yield str(cached)
+            return
+
+        start = time.monotonic()
+        parts = []
+        usage: Dict[str, int] = {}
+        est_tokens = self._estimate_tokens(system_prompt, user_prompt, context)
+        attempt = 0
+        waited = 0.0
+        while True:
+            wait_start = time.monotonic()
+            await self.limiter.aacquire(est_tokens)
+            waited += time.monotonic() - wait_start
+            try:
+                async for delta in self._aprovider_stream(system_prompt, user_prompt, temperature, context, usage):
+                    parts.append(delta)
+                    yield delta
+            except Exception as e:
+                if parts:
+                    raise LLMError(f"Error generating text with {self.provider}: {e}") from e
+                await asyncio.sleep(self._handle_failure(e, attempt))
+                attempt += 1
+                continue
+            self._on_success(usage)
+            break
+
+        text = "".join(parts)
+        self._cache_store(key, text)
+        stream.response = LLMResponse(text, usage=usage, latency=time.monotonic() - start, retries=attempt, limiter_wait=waited)
+
+    async def _aprovider_stream(self, system_prompt: str, user_prompt: str, temperature: float, context: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+        client = self.async_client
+        if self.provider in OPENAI_COMPATIBLE:
+            response = await client.chat.completions.create(
+                model=self.model,
+                messages=self._openai_messages(system_prompt, user_prompt, context),
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    usage.update(_usage_openai(chunk))
+
+        elif self.provider == "anthropic":
+            async with client.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                temperature=temperature,
+                system=self._anthropic_system(system_prompt, context),
+                messages=[
+                    {"role": "user", "content": user_prompt}
+                ]
+            ) as response:
+                async for text in response.text_stream:
+                    yield text
+                usage.update(_usage_anthropic(await response.get_final_message()))
+
+        elif self.provider == "gemini":
+            contents, config = await asyncio.to_thread(self._gemini_request, system_prompt, user_prompt, temperature, context)
+            async for chunk in await client.models.generate_content_stream(
+                model=self.model,
+                contents=contents,
+                config=config
+            ):
+                if chunk.text:
+                    yield chunk.text
+                if getattr(chunk, "usage_metadata", None):
+                    usage.update(_usage_gemini(chunk))
+
+        elif self.provider == "mock":
+            async for delta in client.astream(system_prompt, user_prompt, context, usage):
+                yield delta
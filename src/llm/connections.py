@@ -0,0 +1,180 @@
+import os
+import atexit
+import asyncio
+import inspect
+import importlib
+import importlib.util
+import threading
+import weakref
+import httpx
+import openai
+import anthropic
+from google import genai
+from google.genai import types
+from typing import Any, Dict, List, Optional, Tuple
+
+# OpenAI-compatible providers: provider -> (api key env var, base_url)
+OPENAI_COMPATIBLE = {
+    "openai": ("OPENAI_API_KEY", None),
+    "deepseek": ("DEEPSEEK_API_KEY", "https://api.deepseek.com"),
+    "openrouter": ("OPENROUTER_API_KEY", "https://openrouter.ai/api/v1"),
+}
+API_KEY_ENV = {**{p: key_env for p, (key_env, _) in OPENAI_COMPATIBLE.items()}, "anthropic": "ANTHROPIC_API_KEY", "gemini": "GEMINI_API_KEY"}
+
+# Seconds. Reads are long since a non-streamed draft can take minutes;
+# "pool" is the wait for a free connection when all are busy.
+CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("LLM_HTTP_READ_TIMEOUT", "300"))
+WRITE_TIMEOUT = 60.0
+POOL_TIMEOUT = 120.0
+# Idle connections are kept this long; the SDK default (5s) drops them
+# between calls the rate limiter spaces out
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE", "60"))
+# Pool size when no concurrency is configured
+DEFAULT_MAX_CONNECTIONS = 20
+# HTTP/2 (one multiplexed connection per host) needs the optional h2 package
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+def provider_endpoint(provider: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (api_key, base_url) of a provider from the environment.
+    """
+    base_url = OPENAI_COMPATIBLE[provider][1] if provider in OPENAI_COMPATIBLE else None
+    key_env = API_KEY_ENV.get(provider)
+    return (os.getenv(key_env) if key_env else None), base_url
+
+def _http_module(sdk):
+    # The HTTP package an SDK is built on: httpx, or httpx2 in newer releases
+    return importlib.import_module(sdk.DefaultHttpxClient.__mro__[1].__module__.split(".")[0])
+
+def _pool_options(http, max_connections: int) -> Dict[str, Any]:
+    return dict(
+        limits=http.Limits(max_connections=max_connections, max_keepalive_connections=max_connections, keepalive_expiry=KEEPALIVE_EXPIRY),
+        timeout=http.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT, write=WRITE_TIMEOUT, pool=POOL_TIMEOUT),
+        http2=HTTP2,
+    )
+
+def _build(provider: str, api_key: Optional[str], base_url: Optional[str], max_connections: int, asynchronous: bool):
+    if provider in OPENAI_COMPATIBLE:
+        options = _pool_options(_http_module(openai), max_connections)
+        if asynchronous:
+            return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=options["timeout"], http_client=openai.DefaultAsyncHttpxClient(**options))
+        return openai.OpenAI(api_key=api_key, base_url=base_url, timeout=options["timeout"], http_client=openai.DefaultHttpxClient(**options))
+
+    if provider == "anthropic":
+        options = _pool_options(_http_module(anthropic), max_connections)
+        if asynchronous:
+            return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, timeout=options["timeout"], http_client=anthropic.DefaultAsyncHttpxClient(**options))
+        return anthropic.Anthropic(api_key=api_key, base_url=base_url, timeout=options["timeout"], http_client=anthropic.DefaultHttpxClient(**options))
+
+    if provider == "gemini":
+        # google-genai builds its httpx clients itself from these arguments
+        options = _pool_options(httpx, max_connections)
+        client_args = {"limits": options["limits"], "http2": options["http2"]}
+        http_options = types.HttpOptions(
+            base_url=base_url, timeout=int(READ_TIMEOUT * 1000),
+            client_args=client_args, async_client_args=client_args
+        )
+        client = genai.Client(api_key=api_key, http_options=http_options)
+        # Async calls go through the client's .aio surface
+        return client.aio if asynchronous else client
+
+    raise ValueError(f"Unknown provider: {provider}")
+
+def _close(client):
+    close = getattr(client, "close", None)
+    if close:
+        close()
+
+async def _aclose(client):
+    # Gemini's async surface has aclose(), the other SDKs an async close()
+    close = getattr(client, "aclose", None) or getattr(client, "close", None)
+    if close:
+        result = close()
+        if inspect.isawaitable(result):
+            await result
+
+class ClientRegistry:
+    """
+    Process-wide SDK clients keyed by (provider, base_url, api_key), each on
+    one keep-alive connection pool with explicit timeouts, so every LLMClient
+    of a provider reuses the same connections and TLS sessions.
+
+    Sync clients are shared by all threads. Async clients are kept per event
+    loop, since their connections belong to the loop that opened them.
+    A request for a larger pool than the existing one replaces it; clients
+    handed out earlier keep working on the old pool, which is closed with
+    the registry (sync, at exit) or with its loop (async, close_loop()).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clients: Dict[Tuple, Tuple[int, Any]] = {}
+        self.retired: List[Any] = []
+        self.async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Tuple[int, Any]]]" = weakref.WeakKeyDictionary()
+        self.async_retired: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, List[Any]]" = weakref.WeakKeyDictionary()
+
+    def _get(self, clients: Dict[Tuple, Tuple[int, Any]], retired: List[Any], provider: str, api_key: Optional[str], base_url: Optional[str], max_connections: int, asynchronous: bool):
+        max_connections = max(max_connections, DEFAULT_MAX_CONNECTIONS)
+        key = (provider, base_url, api_key)
+        entry = clients.get(key)
+        if entry is None or entry[0] < max_connections:
+            if entry is not None:
+                # Calls in flight may still use it, so it is closed later
+                retired.append(entry[1])
+            entry = (max_connections, _build(provider, api_key, base_url, max_connections, asynchronous))
+            clients[key] = entry
+        return entry[1]
+
+    def get(self, provider: str, api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 0):
+        with self.lock:
+            return self._get(self.clients, self.retired, provider, api_key, base_url, max_connections, asynchronous=False)
+
+    def get_async(self, provider: str, api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 0):
+        """
+        Async client for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = self.async_clients.setdefault(loop, {})
+            retired = self.async_retired.setdefault(loop, [])
+            return self._get(clients, retired, provider, api_key, base_url, max_connections, asynchronous=True)
+
+    def close(self):
+        """
+        Closes the sync clients, current and replaced ones.
+        """
+        with self.lock:
+            clients = [client for _, client in self.clients.values()] + self.retired
+            self.clients, self.retired = {}, []
+        for client in clients:
+            try:
+                _close(client)
+            except Exception as e:
+                print(f"Closing an SDK client failed: {e}")
+
+    async def close_loop(self):
+        """
+        Closes the async clients of the running event loop; call it before
+        the loop ends, since their connections cannot be closed after that.
+        """
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            clients = [client for _, client in self.async_clients.pop(loop, {}).values()] + self.async_retired.pop(loop, [])
+        for client in clients:
+            try:
+                await _aclose(client)
+            except Exception as e:
+                print(f"Closing an async SDK client failed: {e}")
+
+_registry = ClientRegistry()
+atexit.register(_registry.close)
+
+def get_client(provider: str, api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 0):
+    return _registry.get(provider, api_key, base_url, max_connections)
+
+def get_async_client(provider: str, api_key: Optional[str], base_url: Optional[str] = None, max_connections: int = 0):
+    return _registry.get_async(provider, api_key, base_url, max_connections)
+
+async def close_async_clients():
+    await _registry.close_loop()
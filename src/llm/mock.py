@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Iterator, AsyncIterator
+
+# Markers of the planner and QA prompts (src/agent/prompts.py)
+PLAN_MARKER = "Erstelle einen Plan"
+QA_MARKER = "Bewerte die Lösung"
+RANK_MARKER = "Bewerte jede der folgenden"
+JSON_MARKER = "Antworte NUR mit JSON"
+ISSUES = ["Mehr Bezug zum Kontext", "Beispiele ergänzen"]
+
+FILLER = (
+    "Die Analyse zeigt, dass die Anforderungen im Kontext der Aufgabe sinnvoll umgesetzt "
+    "werden können. Dabei werden die wichtigsten Punkte aus den Unterlagen berücksichtigt "
+    "und mit Beispielen aus der Praxis ergänzt."
+).split()
+
+class MockAPIError(Exception):
+    """
+    Injected provider failure; looks like an SDK APIStatusError to the retry logic.
+    """
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Mock provider error {status_code}")
+        self.status_code = status_code
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 800.0       # median time to first token
+    latency_sigma: float = 0.5      # lognormal spread of the latency
+    tokens_per_sec: float = 80.0    # output speed (0 = instant)
+    error_rate: float = 0.0         # share of calls failing with a 500
+    rate_limit_rate: float = 0.0    # share of calls failing with a 429
+    retry_after: float = 1.0        # Retry-After sent with injected 429s
+    qa_fail_rate: float = 0.0       # share of QA reviews that do not PASS
+    tasks: int = 3                  # tasks per generated plan
+    draft_words: int = 200
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency_ms=float(os.getenv("MOCK_LATENCY_MS", cls.latency_ms)),
+            latency_sigma=float(os.getenv("MOCK_LATENCY_SIGMA", cls.latency_sigma)),
+            tokens_per_sec=float(os.getenv("MOCK_TOKENS_PER_SEC", cls.tokens_per_sec)),
+            error_rate=float(os.getenv("MOCK_ERROR_RATE", cls.error_rate)),
+            rate_limit_rate=float(os.getenv("MOCK_RATE_LIMIT_RATE", cls.rate_limit_rate)),
+            retry_after=float(os.getenv("MOCK_RETRY_AFTER", cls.retry_after)),
+            qa_fail_rate=float(os.getenv("MOCK_QA_FAIL_RATE", cls.qa_fail_rate)),
+            tasks=int(os.getenv("MOCK_TASKS", cls.tasks)),
+            draft_words=int(os.getenv("MOCK_DRAFT_WORDS", cls.draft_words)),
+            seed=int(os.getenv("MOCK_SEED", cls.seed)),
+        )
+
+class MockProvider:
+    """
+    Offline stand-in for an LLM API (provider "mock") for benchmarks and dry
+    runs: canned plans, drafts and PASS reviews with simulated latency,
+    throughput and injected 429/500 errors.
+
+    Every outcome is derived from the seed, the prompt and how often that
+    prompt was sent before, so runs are reproducible regardless of thread
+    scheduling.
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig.from_env()
+        self.lock = threading.Lock()
+        self.seen: Dict[str, int] = {}
+        self.calls = 0
+        self.errors = 0
+
+    def _rng(self, system_prompt: str, user_prompt: str, context: str) -> random.Random:
+        digest = hashlib.sha256(f"{system_prompt}\x00{context}\x00{user_prompt}".encode("utf-8")).hexdigest()
+        with self.lock:
+            self.calls += 1
+            attempt = self.seen.get(digest, 0)
+            self.seen[digest] = attempt + 1
+        return random.Random(f"{self.config.seed}:{digest}:{attempt}")
+
+    def _plan(self, rng: random.Random):
+        # Stable float draws, consumed in the same order for every call
+        latency = self.config.latency_ms / 1000 * rng.lognormvariate(0, self.config.latency_sigma)
+        failure = rng.random()
+        quality = rng.random()
+        return latency, failure, quality
+
+    def _failure(self, failure: float) -> Optional[MockAPIError]:
+        if failure < self.config.rate_limit_rate:
+            return MockAPIError(429, self.config.retry_after)
+        if failure < self.config.rate_limit_rate + self.config.error_rate:
+            return MockAPIError(500)
+        return None
+
+    def _text(self, user_prompt: str, quality: float, rng: random.Random) -> str:
+        if PLAN_MARKER in user_prompt:
+            return "\n".join(f"{k}. Teilaufgabe {k}" for k in range(1, self.config.tasks + 1))
+        if RANK_MARKER in user_prompt:
+            count = user_prompt.count("### Lösung ")
+            return json.dumps({"candidates": [
+                {"id": k + 1, "score": 9, "issues": []} if rng.random() >= self.config.qa_fail_rate
+                else {"id": k + 1, "score": 6, "issues": ISSUES}
+                for k in range(count)
+            ]})
+        if QA_MARKER in user_prompt:
+            passed = quality >= self.config.qa_fail_rate
+            if JSON_MARKER in user_prompt:
+                return json.dumps({"score": 9 if passed else 6, "issues": [] if passed else ISSUES})
+            if passed:
+                return "Note: 9/10\nPASS"
+            return "Note: 6/10\n" + "\n".join(f"- {issue}" for issue in ISSUES)
+        return " ".join(rng.choice(FILLER) for _ in range(self.config.draft_words))
+
+    def _usage(self, system_prompt: str, user_prompt: str, context: str, text: str) -> Dict[str, int]:
+        return {
+            "input_tokens": (len(system_prompt) + len(context) + len(user_prompt)) // 4,
+            "output_tokens": len(text) // 4,
+            "cached_tokens": 0,
+        }
+
+    def _prepare(self, system_prompt: str, user_prompt: str, context: str) -> Tuple[float, Optional[MockAPIError], str, Dict[str, int]]:
+        rng = self._rng(system_prompt, user_prompt, context)
+        latency, failure, quality = self._plan(rng)
+        error = self._failure(failure)
+        if error:
+            with self.lock:
+                self.errors += 1
+            # Errors come back after half the usual latency
+            return latency / 2, error, "", {}
+        text = self._text(user_prompt, quality, rng)
+        return latency, None, text, self._usage(system_prompt, user_prompt, context, text)
+
+    def _generation_time(self, usage: Dict[str, int]) -> float:
+        if self.config.tokens_per_sec <= 0:
+            return 0.0
+        return usage["output_tokens"] / self.config.tokens_per_sec
+
+    def complete(self, system_prompt: str, user_prompt: str, context: str = "") -> Tuple[str, Dict[str, int]]:
+        latency, error, text, usage = self._prepare(system_prompt, user_prompt, context)
+        if error:
+            time.sleep(latency)
+            raise error
+        time.sleep(latency + self._generation_time(usage))
+        return text, usage
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, context: str = "") -> Tuple[str, Dict[str, int]]:
+        latency, error, text, usage = self._prepare(system_prompt, user_prompt, context)
+        if error:
+            await asyncio.sleep(latency)
+            raise error
+        await asyncio.sleep(latency + self._generation_time(usage))
+        return text, usage
+
+    def stream(self, system_prompt: str, user_prompt: str, context: str, usage: Dict[str, int]) -> Iterator[str]:
+        latency, error, text, final_usage = self._prepare(system_prompt, user_prompt, context)
+        time.sleep(latency)
+        if error:
+            raise error
+        words = text.split(" ")
+        delay = self._generation_time(final_usage) / max(1, len(words))
+        for k, word in enumerate(words):
+            time.sleep(delay)
+            yield word if k == 0 else " " + word
+        usage.update(final_usage)
+
+    async def astream(self, system_prompt: str, user_prompt: str, context: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+        latency, error, text, final_usage = self._prepare(system_prompt, user_prompt, context)
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        words = text.split(" ")
+        delay = self._generation_time(final_usage) / max(1, len(words))
+        for k, word in enumerate(words):
+            await asyncio.sleep(delay)
+            yield word if k == 0 else " " + word
+        usage.update(final_usage)
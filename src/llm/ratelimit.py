@@ -0,0 +1,217 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from typing import Dict, Optional, Tuple, Mapping
+
+# Default budgets per provider (requests/min, tokens/min). Override with
+# LLM_RPM / LLM_TPM; the limiter adapts to rate-limit headers at runtime.
+DEFAULT_LIMITS = {
+    "openai": (500, 300_000),
+    "anthropic": (50, 40_000),
+    "gemini": (150, 1_000_000),
+    "deepseek": (300, 1_000_000),
+    "openrouter": (200, 400_000),
+    "mock": (100_000, 100_000_000),
+}
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+class LLMError(Exception):
+    """
+    Raised when a provider call fails for good (non-retryable or retries exhausted).
+    """
+
+def status_code(exc: Exception) -> Optional[int]:
+    code = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    if code is None and getattr(exc, "response", None) is not None:
+        code = getattr(exc.response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+def is_retryable(exc: Exception) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # Connection errors and timeouts carry no status code
+    name = type(exc).__name__
+    return "Connection" in name or "Timeout" in name
+
+def response_headers(obj) -> Mapping[str, str]:
+    response = getattr(obj, "response", None)
+    headers = getattr(response, "headers", None) if response is not None else getattr(obj, "headers", None)
+    return headers or {}
+
+def _parse_duration(value: str) -> Optional[float]:
+    """
+    Parses '20', '1.5s', '120ms' or '6m0s' (OpenAI reset headers) into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total, num = 0.0, ""
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch.isdigit() or ch == ".":
+            num += ch
+        elif value.startswith("ms", i):
+            total += float(num or 0) / 1000; num = ""; i += 1
+        elif ch in "hms":
+            total += float(num or 0) * {"h": 3600, "m": 60, "s": 1}[ch]; num = ""
+        else:
+            return None
+        i += 1
+    return total
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with full jitter; honours Retry-After when given.
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, 1)
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, shared by all clients
+    of one (provider, model). Concurrent callers queue in acquire() instead of
+    bursting into 429s. On a 429 the effective rate is cut and then recovers
+    gradually (AIMD), so throughput settles near the provider's ceiling.
+    """
+
+    def __init__(self, rpm: int, tpm: int):
+        self.max_rpm = float(rpm)
+        self.max_tpm = float(tpm)
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.requests = self.rpm
+        self.tokens = self.tpm
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """
+        Takes capacity if available. Returns 0 on success, else seconds to wait.
+        """
+        # A single request larger than the whole bucket may pass once it is full
+        tokens = min(tokens, self.tpm)
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.requests >= 1 and self.tokens >= tokens:
+                self.requests -= 1
+                self.tokens -= tokens
+                return 0.0
+            wait_req = (1 - self.requests) * 60 / self.rpm if self.requests < 1 else 0.0
+            wait_tok = (tokens - self.tokens) * 60 / self.tpm if self.tokens < tokens else 0.0
+            return max(wait_req, wait_tok, 0.01)
+
+    def acquire(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int):
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def consume(self, tokens: int):
+        """
+        Debits tokens only known after the call (e.g. output tokens).
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= tokens
+
+    def on_success(self):
+        # Additive increase back towards the configured ceiling
+        with self.lock:
+            self.rpm = min(self.max_rpm, self.rpm + self.max_rpm * 0.05)
+            self.tpm = min(self.max_tpm, self.tpm + self.max_tpm * 0.05)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        # Multiplicative decrease and a pause for everyone sharing the key
+        with self.lock:
+            self.rpm = max(1.0, self.rpm * 0.7)
+            self.tpm = max(1000.0, self.tpm * 0.7)
+            self.requests = min(self.requests, 0.0)
+            pause = retry_after if retry_after is not None else 1.0
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def update_from_headers(self, headers: Mapping[str, str]):
+        """
+        Adapts to OpenAI-style (x-ratelimit-*) and Anthropic-style
+        (anthropic-ratelimit-*) headers.
+        """
+        if not headers:
+            return
+        def get(*names):
+            for name in names:
+                value = headers.get(name)
+                if value is not None:
+                    return value
+            return None
+        try:
+            limit_req = get("x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit")
+            limit_tok = get("x-ratelimit-limit-tokens", "anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-input-tokens-limit")
+            remaining_req = get("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+            remaining_tok = get("x-ratelimit-remaining-tokens", "anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-input-tokens-remaining")
+            with self.lock:
+                self._refill(time.monotonic())
+                if limit_req:
+                    self.max_rpm = float(limit_req)
+                    self.rpm = min(self.rpm, self.max_rpm)
+                if limit_tok:
+                    self.max_tpm = float(limit_tok)
+                    self.tpm = min(self.tpm, self.max_tpm)
+                # The server's view wins if it has less capacity left than we think
+                if remaining_req is not None:
+                    self.requests = min(self.requests, float(remaining_req))
+                if remaining_tok is not None:
+                    self.tokens = min(self.tokens, float(remaining_tok))
+        except ValueError:
+            pass
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    headers = response_headers(exc)
+    if headers.get("retry-after-ms"):
+        return float(headers["retry-after-ms"]) / 1000
+    return _parse_duration(headers.get("retry-after") or "")
+
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str, model: str) -> RateLimiter:
+    """
+    Process-wide limiter per (provider, model).
+    """
+    key = (provider, model)
+    with _limiters_lock:
+        if key not in _limiters:
+            rpm, tpm = DEFAULT_LIMITS.get(provider, (60, 100_000))
+            rpm = int(os.getenv("LLM_RPM", rpm))
+            tpm = int(os.getenv("LLM_TPM", tpm))
+            _limiters[key] = RateLimiter(rpm, tpm)
+        return _limiters[key]
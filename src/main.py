@@ -1,10 +1,22 @@
 import os
+import time
+import atexit
+import asyncio
 import typer
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
 from rich.console import Console
+from rich.live import Live
 from rich.progress import Progress, SpinnerColumn, TextColumn
-from src.ingestion.scanner import scan_directory
-from src.ingestion.loader import load_file_content
-from src.agent.core import Agent
+from rich.table import Table
+from src.ingestion.index import HZIndex
+from src.ingestion.scanner import HZData
+from src.ingestion.loader import load_many
+from src.agent.core import Agent, resolve_concurrency
+from src.agent.events import EventQueue
+from src.agent.limits import RunLimits
+from src.agent.jobqueue import DEFAULT_QUEUE_PATH, JobQueue
+from src.agent.worker import split_threads, start_workers, stop_workers
 from pathlib import Path
 
 app = typer.Typer()
@@ -14,7 +26,22 @@ console = Console()
 def start(
     data_dir: str = "data",
     provider: str = typer.Option("openai", help="LLM Provider: openai, anthropic, gemini, deepseek, openrouter"),
-    model: str = typer.Option("gpt-4o", help="Model name (e.g. gpt-4o, claude-3-opus, gemini-pro)")
+    model: str = typer.Option("gpt-4o", help="Model name (e.g. gpt-4o, claude-3-opus, gemini-pro)"),
+    async_engine: bool = typer.Option(False, "--async-engine", help="Run all LLM calls as coroutines on one event loop"),
+    batch: bool = typer.Option(False, "--batch", help="Submit calls through the provider batch API (cheaper, may take hours)"),
+    max_concurrency: int = typer.Option(0, help="Max in-flight LLM calls, shared by all assignments (0 = max_parallel x max_subtasks)"),
+    cache_mode: str = typer.Option("use", help="Response cache: use, refresh (ignore hits, store new) or bypass"),
+    retrieval: bool = typer.Option(True, help="Send each task only the most relevant input chunks instead of the truncated full context"),
+    context_budget: int = typer.Option(6000, help="Token budget for retrieved context per task"),
+    qa_mode: str = typer.Option("json", help="QA answers: json (score + issues) or text (free-form review)"),
+    qa_candidates: int = typer.Option(1, help="Draft K variants per task in parallel and rank them in one QA call"),
+    summarize_inputs: bool = typer.Option(False, "--summarize-inputs", help="Summarize large input files (map-reduce, cached) into a digest for planner and workers instead of truncating them"),
+    summary_model: str = typer.Option("", help="Model for the input digest (default: a cheap model of the provider)"),
+    resume: bool = typer.Option(False, "--resume", help="Continue an interrupted run: reuse journaled plans and skip completed tasks"),
+    parallel_hz: int = typer.Option(1, "--parallel-hz", help="Run up to N HZs at once under one shared concurrency limit (inputs of the next HZs load meanwhile)"),
+    queue: bool = typer.Option(False, "--queue", help="Run plan/task/integration steps as jobs of a persistent queue, executed by worker processes"),
+    queue_path: str = typer.Option(DEFAULT_QUEUE_PATH, help="Job queue database; put it on a shared directory to add workers on other machines"),
+    queue_workers: int = typer.Option(os.cpu_count() or 2, help="Local worker processes started for --queue (0 = only external workers, see src/agent/worker.py)")
 ):
     """
     Starts the Autonomous AI Student Agent.
@@ -22,24 +49,46 @@ def start(
     console.print(f"[bold green]Starting AI Student Agent using {provider} ({model})...[/bold green]")
     
     # 1. Scan
-    hz_list = scan_directory(data_dir)
+    hz_list = HZIndex(data_dir).snapshot()
     if not hz_list:
         console.print("[red]No Handlungsziele (HZ) found in data directory.[/red]")
         return
 
-    agent = Agent(provider=provider, model=model)
+    def make_agent(limits=None) -> Agent:
+        return Agent(provider=provider, model=model, max_concurrency=max_concurrency, cache_mode=cache_mode, use_retrieval=retrieval, context_token_budget=context_budget, qa_mode=qa_mode, qa_candidates=qa_candidates, summarize_inputs=summarize_inputs, summary_model=summary_model, limits=limits)
+
+    if queue and (async_engine or batch or parallel_hz > 1):
+        console.print("[red]--queue cannot be combined with --async-engine, --batch or --parallel-hz.[/red]")
+        raise typer.Exit(1)
+
+    if parallel_hz > 1:
+        if async_engine:
+            console.print("[red]--parallel-hz runs each HZ on the threaded engine (or --batch); drop --async-engine.[/red]")
+            raise typer.Exit(1)
+        # One limit for all HZs together, not one per HZ
+        limits = RunLimits(max_concurrency=resolve_concurrency(max_concurrency))
+        run_parallel(hz_list, lambda: make_agent(limits), limits, parallel_hz, resume=resume, batch=batch)
+        return
+
+    agent = make_agent()
     agent.console = console
 
+    if queue:
+        job_queue = JobQueue(queue_path)
+        # Spread the concurrency limit over the worker processes
+        threads = split_threads(agent.max_concurrency, queue_workers) if queue_workers > 0 else []
+        workers = start_workers(len(threads), queue_path, threads=threads)
+        atexit.register(stop_workers, workers)
+        console.print(f"Job queue {queue_path}: {len(workers)} local worker(s) with {sum(threads)} thread(s) in total.")
+
     for hz in hz_list:
         console.rule(f"[bold blue]Processing: {hz.name}[/bold blue]")
         
-        # Load Inputs
-        input_texts = {}
+        # Load Inputs (cached, parsed in parallel)
         for file_path in hz.input_files:
             console.print(f"Reading Input: {os.path.basename(file_path)}")
-            content = load_file_content(file_path)
-            if content:
-                input_texts[file_path] = content
+        with agent.tracer.span("load.inputs", files=len(hz.input_files)):
+            input_texts = load_inputs(hz)
 
         # Load Assignments
         # We don't need to read them all into one string anymore, just pass paths
@@ -59,23 +108,127 @@ def start(
             task = progress.add_task(description=f"Agent working on {hz.name}...", total=None)
             
             # Run with list of paths
-            result = agent.run(
+            run_args = dict(
                 hz_name=hz.name, 
                 assignment_paths=hz.assignment_files, 
                 input_texts=input_texts,
-                custom_prompt=""
+                custom_prompt="",
+                resume=resume
             )
+            if queue:
+                result = agent.run_queued(**run_args, queue=job_queue)
+            elif batch:
+                result = agent.run_batch(**run_args)
+            elif async_engine:
+                result = asyncio.run(agent.arun(**run_args))
+            else:
+                result = agent.run(**run_args)
 
         # Save Output (Summary Report)
-        output_dir = os.path.join("output", hz.name)
-        # Note: Individual DOCX files are already saved by agent.run
-        # We also save the summary markdown
-        output_file = os.path.join(output_dir, "summary_report.md")
-        
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(result)
-            
+        output_file = save_report(hz.name, result)
         console.print(f"[bold green]Finished {hz.name}. Summary saved to {output_file}[/bold green]")
+        if agent.cache_stats["hits"]:
+            console.print(f"Cache hits: {agent.cache_stats['hits']} (saved ${agent.cache_stats['saved_cost']:.4f})")
+
+def save_report(hz_name: str, result: str) -> str:
+    # Note: Individual DOCX files are already saved by agent.run
+    # We also save the summary markdown
+    output_dir = os.path.join("output", hz_name)
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, "summary_report.md")
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(result)
+    return output_file
+
+def load_inputs(hz: HZData) -> Dict[str, str]:
+    return {path: content for path, content in load_many(hz.input_files).items() if content}
+
+def apply_event(board_hz: Dict, event):
+    """
+    Folds one agent event into the progress board of its HZ.
+    """
+    if event.kind == "cost":
+        board_hz["cost"] = event.data["total_cost"]
+        return
+    if event.kind == "plan":
+        board_hz["assignments"][event.assignment] = {"total": len(event.data["tasks"]), "done": 0, "status": "planned"}
+        return
+    ass = board_hz["assignments"].get(event.assignment)
+    if ass is None:
+        return
+    if event.kind == "section":
+        ass["status"] = f"task {event.data['index'] + 1} running"
+    elif event.kind == "qa":
+        ass["status"] = f"QA: {event.data['text'].splitlines()[0][:40]}" if event.data["text"] else "QA"
+    elif event.kind == "finished":
+        ass["done"] += 1
+        ass["status"] = f"task {event.data['index'] + 1} done"
+
+def progress_table(board: Dict[str, Dict], limits: RunLimits) -> Table:
+    table = Table(title=f"HZ progress (total ${limits.total_cost:.4f})")
+    table.add_column("HZ")
+    table.add_column("Assignment")
+    table.add_column("Tasks", justify="right")
+    table.add_column("Status")
+    table.add_column("Cost", justify="right")
+    for hz_name, hz in board.items():
+        assignments = list(hz["assignments"].items())
+        done, total = sum(a["done"] for _, a in assignments), sum(a["total"] for _, a in assignments)
+        table.add_row(f"[bold]{hz_name}[/bold]", "", f"{done}/{total}" if total else "", hz["status"], f"${hz['cost']:.4f}")
+        for ass_name, ass in assignments:
+            table.add_row("", ass_name, f"{ass['done']}/{ass['total']}", ass["status"], "")
+    return table
+
+def run_parallel(hz_list: List[HZData], make_agent: Callable[[], Agent], limits: RunLimits, parallel: int, resume: bool = False, batch: bool = False):
+    """
+    Runs up to `parallel` HZs at once, one agent each; the agents share
+    `limits` (budget and LLM call slots). A single background thread loads
+    the inputs of all HZs in order, so the next HZ's material is ready when a
+    slot frees up. Per-HZ agent logs go to output/<HZ>/agent.log, the terminal
+    shows one live table per HZ and assignment.
+    """
+    hz_list = [hz for hz in hz_list if hz.assignment_files]
+    board = {hz.name: {"status": "queued", "cost": 0.0, "assignments": {}} for hz in hz_list}
+    queues: Dict[str, EventQueue] = {}
+    loads = {}
+
+    def run_one(hz: HZData) -> str:
+        board[hz.name]["status"] = "loading inputs"
+        input_texts = loads[hz.name].result()
+        agent = make_agent()
+        output_dir = os.path.join("output", hz.name)
+        os.makedirs(output_dir, exist_ok=True)
+        with open(os.path.join(output_dir, "agent.log"), "w", encoding="utf-8") as log_file:
+            agent.console = Console(file=log_file, width=160)
+            queue = EventQueue()
+            queue.connect(agent)
+            queues[hz.name] = queue
+            board[hz.name]["status"] = "running"
+            run_args = dict(hz_name=hz.name, assignment_paths=hz.assignment_files, input_texts=input_texts, custom_prompt="", resume=resume)
+            result = agent.run_batch(**run_args) if batch else agent.run(**run_args)
+        return save_report(hz.name, result)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=1) as loader, ThreadPoolExecutor(max_workers=parallel) as pool:
+        loads.update({hz.name: loader.submit(load_inputs, hz) for hz in hz_list})
+        futures = {hz.name: pool.submit(run_one, hz) for hz in hz_list}
+        with Live(console=console, refresh_per_second=4) as live:
+            while True:
+                for name, queue in list(queues.items()):
+                    for event in queue.drain():
+                        apply_event(board[name], event)
+                for name, future in futures.items():
+                    if future.done() and board[name]["status"] == "running":
+                        error = future.exception()
+                        board[name]["status"] = f"[red]failed: {error}[/red]" if error else "[green]done[/green]"
+                    elif future.done() and future.exception() and board[name]["status"] == "loading inputs":
+                        board[name]["status"] = f"[red]failed: {future.exception()}[/red]"
+                live.update(progress_table(board, limits))
+                if all(f.done() for f in futures.values()):
+                    break
+                time.sleep(0.5)
+
+    console.print(f"[bold green]Finished {len(hz_list)} HZ(s) in {time.monotonic() - start:.1f}s (${limits.total_cost:.4f}). Summaries in output/<HZ>/summary_report.md[/bold green]")
 
 if __name__ == "__main__":
     app()
@@ -1,24 +1,49 @@
+import functools
 import tiktoken
+from typing import Dict, Optional
 from src.utils.pricing_data import PRICING_REGISTRY
 
-def count_tokens(text: str, model: str = "gpt-4o") -> int:
+# Above this length count_tokens estimates instead of encoding the whole text
+EXACT_COUNT_MAX_CHARS = 20_000
+CHARS_PER_TOKEN = 4
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model: str):
     """
-    Counts tokens for a given text. 
-    Uses tiktoken for OpenAI models. 
-    For others, falls back to a rough character approximation (4 chars ~= 1 token) 
-    or uses tiktoken as a proxy.
+    tiktoken encoder for a model, loaded once per process.
+    None for non-OpenAI or unknown models.
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        return tiktoken.encoding_for_model(model)
     except KeyError:
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast approximation (4 chars ~= 1 token), O(1).
+    """
+    return len(text) // CHARS_PER_TOKEN
+
+def count_tokens(text: str, model: str = "gpt-4o", exact: bool = False) -> int:
+    """
+    Counts tokens for a given text. 
+    Uses tiktoken for OpenAI models. 
+    For others, and for texts longer than EXACT_COUNT_MAX_CHARS unless
+    exact=True, falls back to a rough character approximation.
+    Prefer the provider-reported usage on LLMResponse where available.
+    """
+    if not exact and len(text) > EXACT_COUNT_MAX_CHARS:
+        return estimate_tokens(text)
+    encoding = get_encoding(model)
+    if encoding is None:
         # Fallback for non-OpenAI models or unknown models
-        # generic approximation
-        return len(text) // 4
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
 
-def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+@functools.lru_cache(maxsize=None)
+def get_rates(model: str) -> Optional[Dict[str, float]]:
     """
-    Calculates cost in USD.
+    Pricing entry for a model, resolved once per model name.
     """
     # Normalize model name slightly
     model_key = model.lower()
@@ -34,10 +59,24 @@ def calculate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
                 rates = val
                 break
     
+    return rates
+
+def calculate_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0) -> float:
+    """
+    Calculates cost in USD.
+    `cached_tokens` is the part of `input_tokens` served from the provider's
+    prompt cache and billed at the cached input rate, `cache_write_tokens`
+    the part written to it and billed at the cache write rate.
+    """
+    rates = get_rates(model)
     if not rates:
         return 0.0
     
-    input_cost = (input_tokens / 1_000_000) * rates["input"]
+    cached_tokens = min(cached_tokens, input_tokens)
+    cache_write_tokens = min(cache_write_tokens, input_tokens - cached_tokens)
+    input_cost = ((input_tokens - cached_tokens - cache_write_tokens) / 1_000_000) * rates["input"]
+    cached_cost = (cached_tokens / 1_000_000) * rates.get("cached_input", rates["input"])
+    write_cost = (cache_write_tokens / 1_000_000) * rates.get("cache_write", rates["input"])
     output_cost = (output_tokens / 1_000_000) * rates["output"]
     
-    return input_cost + output_cost
+    return input_cost + cached_cost + write_cost + output_cost
@@ -1,94 +1,209 @@
 from docx import Document
+from docx.oxml.table import CT_Tbl
+from docx.oxml.text.paragraph import CT_P
 from docx.shared import RGBColor
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
 import os
 import re
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import Any, List, Dict, Optional, Set, Tuple, Union
 
 DARK_BLUE = RGBColor(0x00, 0x00, 0x8B)
 
-def integrate_solution_to_docx(original_path: str, output_path: str, task_results: List[Dict[str, str]]):
+# "Teilaufgabe 3", "Aufgabe 3", "Auftrag 3" or "3." inside a short table cell
+CELL_ANCHOR = re.compile(r'(?:teilaufgabe|aufgabe|auftrag)\s*(\d+)|(?<!\d)(\d+)\.')
+# Paragraphs starting with "Teilaufgabe 3" / "Aufgabe 3"
+PARAGRAPH_ANCHOR = re.compile(r'(?:teil)?aufgabe\s*(\d+)')
+LOOK_AHEAD = 9
+
+def get_task_number(title: str) -> Optional[str]:
+    match = re.search(r'(\d+)', title)
+    return match.group(1) if match else None
+
+def _is_placeholder_cell(text: str) -> bool:
+    text = text.lower()
+    return not text.strip() or "lösung" in text or "..." in text
+
+def _is_answer_paragraph(text: str) -> bool:
+    return "lösung" in text or "antwort" in text or text == "..."
+
+@dataclass
+class DocIndex:
+    """
+    Positions of everything the integration needs, collected in one walk
+    over the document body.
     """
-    Robustly integrates AI solutions into the original DOCX.
-    Uses strict matching for 'Teilaufgabe X' and placeholders.
+    # Table rows as (anchor numbers per cell, cells)
+    rows: List[Tuple[List[Set[str]], List[_Cell]]] = field(default_factory=list)
+    # Top-level paragraphs and their stripped, lowercased text
+    paragraphs: List[Paragraph] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    # Task number -> index of the first paragraph starting with it
+    paragraph_anchors: Dict[str, int] = field(default_factory=dict)
+
+def build_index(doc) -> DocIndex:
+    index = DocIndex()
+    for child in doc.element.body.iterchildren():
+        if isinstance(child, CT_P):
+            paragraph = Paragraph(child, doc)
+            text = paragraph.text.strip().lower()
+            match = PARAGRAPH_ANCHOR.match(text)
+            if match:
+                index.paragraph_anchors.setdefault(match.group(1), len(index.paragraphs))
+            index.paragraphs.append(paragraph)
+            index.texts.append(text)
+        elif isinstance(child, CT_Tbl):
+            for row in Table(child, doc).rows:
+                cells = list(row.cells)
+                anchors = []
+                for cell in cells:
+                    ctext = cell.text.strip().lower()
+                    anchors.append({a or b for a, b in CELL_ANCHOR.findall(ctext)} if len(ctext) < 20 else set())
+                index.rows.append((anchors, cells))
+    return index
+
+def _paragraph_target(index: DocIndex, num: str) -> int:
+    """
+    Paragraph after which the solution for task `num` goes: the first answer
+    placeholder below its heading, else the end of its section, else the heading.
+    """
+    start = index.paragraph_anchors.get(num)
+    if start is None:
+        return -1
+    next_match = PARAGRAPH_ANCHOR.match
+    next_num = str(int(num) + 1)
+    for look_ahead in range(start + 1, min(start + 1 + LOOK_AHEAD, len(index.texts))):
+        text = index.texts[look_ahead]
+        if _is_answer_paragraph(text):
+            return look_ahead
+        match = next_match(text)
+        if match and match.group(1) == next_num:
+            return look_ahead - 1
+    return start
+
+@dataclass
+class Placement:
+    kind: str  # "table", "paragraph" or "appended"
+    # Cell or paragraph holding the solution
+    element: Union[_Cell, Paragraph]
+
+@dataclass
+class DocxIntegration:
+    """
+    An integrated document kept in memory, with where each task (by index
+    into task_results) was placed. Saved once by `save_docx`.
+    """
+    doc: Any
+    placements: Dict[int, Placement] = field(default_factory=dict)
+
+def _write_cell(cell: _Cell, content: str):
+    cell.text = ""
+    run = cell.paragraphs[0].add_run(content)
+    run.font.color.rgb = DARK_BLUE
+
+def _append_task(doc, res: Dict[str, str], title: str) -> Paragraph:
+    p = doc.add_paragraph()
+    p.add_run(title).bold = True
+    run = p.add_run(res['content'])
+    run.font.color.rgb = DARK_BLUE
+    return p
+
+def integrate_solution(original_path: str, task_results: List[Dict[str, str]]) -> Optional[DocxIntegration]:
+    """
+    Robustly integrates AI solutions into the original DOCX, in memory.
+    Indexes 'Teilaufgabe X' anchors and placeholders once, then places all
+    solutions: table cells first, then paragraphs, the rest at the end.
+    Returns None if the document could not be read.
     """
     print(f"DEBUG: Integrating {len(task_results)} tasks into {original_path}")
     
     try:
         if not os.path.exists(original_path):
-            return False
+            return None
             
         doc = Document(original_path)
-        
-        def get_task_number(title):
-            match = re.search(r'(\d+)', title)
-            return match.group(1) if match else None
-
-        used_tasks = set()
+        index = build_index(doc)
+        integration = DocxIntegration(doc)
+        placements = integration.placements
 
-        # 1. Stricter Table Integration
-        for table in doc.tables:
-            for row in table.rows:
-                for i, cell in enumerate(row.cells):
-                    ctext = cell.text.strip().lower()
-                    for idx, res in enumerate(task_results):
-                        if idx in used_tasks: continue
-                        num = get_task_number(res['task'])
-                        
-                        patterns = [f"teilaufgabe {num}", f"aufgabe {num}", f"{num}.", f"auftrag {num}"]
-                        if num and any(p == ctext or p in ctext for p in patterns if len(ctext) < 20):
-                            for j in range(i + 1, len(row.cells)):
-                                target = row.cells[j]
-                                t_text = target.text.lower()
-                                if not t_text.strip() or "lösung" in t_text or "..." in t_text:
-                                    target.text = "" 
-                                    p = target.paragraphs[0]
-                                    run = p.add_run(res['content'])
-                                    run.font.color.rgb = DARK_BLUE
-                                    used_tasks.add(idx)
-                                    break
-                        if idx in used_tasks: break
-
-        # 2. Strict Paragraph Integration
+        # Task number -> result indices still waiting for a place (in task order)
+        pending: Dict[str, List[int]] = {}
         for idx, res in enumerate(task_results):
-            if idx in used_tasks: continue
             num = get_task_number(res['task'])
-            if not num: continue
-
-            target_p_idx = -1
-            for p_idx, p in enumerate(doc.paragraphs):
-                p_text = p.text.strip().lower()
-                if p_text.startswith(f"teilaufgabe {num}") or p_text.startswith(f"aufgabe {num}"):
-                    target_p_idx = p_idx
-                    for look_ahead in range(p_idx + 1, min(p_idx + 10, len(doc.paragraphs))):
-                        ahead_text = doc.paragraphs[look_ahead].text.strip().lower()
-                        if "lösung" in ahead_text or "antwort" in ahead_text or ahead_text == "...":
-                            target_p_idx = look_ahead
-                            break
-                        next_num = str(int(num) + 1)
-                        if ahead_text.startswith(f"teilaufgabe {next_num}") or ahead_text.startswith(f"aufgabe {next_num}"):
-                            target_p_idx = look_ahead - 1
-                            break
+            if num:
+                pending.setdefault(num, []).append(idx)
+
+        # 1. Table Integration: the first free placeholder right of an anchor cell
+        for anchors, cells in index.rows:
+            filled = set()
+            for i, nums in enumerate(anchors):
+                for num in sorted(nums, key=int):
+                    if not pending.get(num):
+                        continue
+                    target = next((j for j in range(i + 1, len(cells)) if j not in filled and _is_placeholder_cell(cells[j].text)), None)
+                    if target is None:
+                        continue
+                    idx = pending[num].pop(0)
+                    _write_cell(cells[target], task_results[idx]['content'])
+                    filled.add(target)
+                    placements[idx] = Placement("table", cells[target])
                     break
-            
-            if target_p_idx != -1:
-                anchor_p = doc.paragraphs[target_p_idx]
+
+        # 2. Paragraph Integration: below the task's heading / answer placeholder
+        last_inserted: Dict[int, Any] = {}
+        for num, indices in pending.items():
+            if not indices:
+                continue
+            target_p_idx = _paragraph_target(index, num)
+            if target_p_idx == -1:
+                continue
+            for idx in indices:
                 new_p = doc.add_paragraph()
-                anchor_p._element.addnext(new_p._element)
-                run = new_p.add_run(res['content'])
+                # Several results for one anchor keep their order
+                last_inserted.get(target_p_idx, index.paragraphs[target_p_idx]._element).addnext(new_p._element)
+                last_inserted[target_p_idx] = new_p._element
+                run = new_p.add_run(task_results[idx]['content'])
                 run.font.color.rgb = DARK_BLUE
-                used_tasks.add(idx)
+                placements[idx] = Placement("paragraph", new_p)
 
         # 3. Fallback: Append remaining tasks at the end
-        remaining = [res for i, res in enumerate(task_results) if i not in used_tasks]
-        if remaining:
+        for idx, res in enumerate(task_results):
+            if idx in placements:
+                continue
             # We no longer add a special section header
-            for res in remaining:
-                p = doc.add_paragraph()
-                p.add_run(f"**{res['task']}**\n").bold = True
-                run = p.add_run(res['content'])
-                run.font.color.rgb = DARK_BLUE
-                doc.add_paragraph("")
+            placements[idx] = Placement("appended", _append_task(doc, res, f"**{res['task']}**\n"))
+            doc.add_paragraph("")
 
+        return integration
+    except Exception as e:
+        print(f"Error: {e}")
+        return None
+
+def verify_integration(integration: DocxIntegration, task_results: List[Dict[str, str]]) -> List[int]:
+    """
+    Checks each task's recorded placement still holds its content.
+    Returns a list of indices of MISSING tasks.
+    """
+    missing_indices = []
+    for i, res in enumerate(task_results):
+        # Check for a unique snippet of the content (first 50 chars)
+        snippet = res['content'][:50].strip()
+        placement = integration.placements.get(i)
+        if snippet and (placement is None or snippet not in placement.element.text):
+            missing_indices.append(i)
+    return missing_indices
+
+def force_append_tasks(integration: DocxIntegration, task_results: List[Dict[str, str]], indices: List[int]):
+    """
+    Simplest possible append (in memory) to ensure content is there.
+    """
+    for i in indices:
+        res = task_results[i]
+        integration.placements[i] = Placement("appended", _append_task(integration.doc, res, f"{res['task']}\n"))
+
+def save_docx(doc, output_path: str) -> bool:
+    try:
         directory = os.path.dirname(output_path)
         if directory: os.makedirs(directory, exist_ok=True)
         doc.save(output_path)
@@ -97,9 +212,16 @@ def integrate_solution_to_docx(original_path: str, output_path: str, task_result
         print(f"Error: {e}")
         return False
 
+def integrate_solution_to_docx(original_path: str, output_path: str, task_results: List[Dict[str, str]]):
+    """
+    Integrates and saves in one step (see `integrate_solution`).
+    """
+    integration = integrate_solution(original_path, task_results)
+    return integration is not None and save_docx(integration.doc, output_path)
+
 def verify_docx_integration(file_path: str, task_results: List[Dict[str, str]]) -> List[int]:
     """
-    Checks if each task's content is present in the DOCX file.
+    Checks if each task's content is present in a saved DOCX file.
     Returns a list of indices of MISSING tasks.
     """
     if not os.path.exists(file_path):
@@ -108,13 +230,11 @@ def verify_docx_integration(file_path: str, task_results: List[Dict[str, str]])
     try:
         doc = Document(file_path)
         # Combine all text from paragraphs and tables
-        full_text = ""
-        for p in doc.paragraphs:
-            full_text += p.text + "\n"
+        parts = [p.text for p in doc.paragraphs]
         for table in doc.tables:
             for row in table.rows:
-                for cell in row.cells:
-                    full_text += cell.text + " "
+                parts.extend(cell.text for cell in row.cells)
+        full_text = "\n".join(parts)
         
         missing_indices = []
         for i, res in enumerate(task_results):
@@ -132,16 +252,11 @@ def force_append_all_tasks(file_path: str, task_results: List[Dict[str, str]]):
     Simplest possible append to ensure content is there.
     """
     try:
-        doc = Document(file_path)
-        for res in task_results:
-            p = doc.add_paragraph()
-            p.add_run(f"{res['task']}\n").bold = True
-            run = p.add_run(res['content'])
-            run.font.color.rgb = DARK_BLUE
-        doc.save(file_path)
-        return True
+        integration = DocxIntegration(Document(file_path))
+        force_append_tasks(integration, task_results, list(range(len(task_results))))
+        return save_docx(integration.doc, file_path)
     except:
         return False
 
 def append_solution_to_docx(original_path: str, output_path: str, task_results: List[Dict[str, str]]):
-    return integrate_solution_to_docx(original_path, output_path, task_results)
\ No newline at end of file
+    return integrate_solution_to_docx(original_path, output_path, task_results)
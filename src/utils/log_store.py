@@ -0,0 +1,81 @@
+import os
+import re
+import threading
+from array import array
+from collections import deque
+from typing import Deque, Dict, List
+
+class LogStore:
+    """
+    Per-assignment log messages with bounded memory: the newest `capacity`
+    messages of each key stay in a ring buffer, every message is also
+    appended to <directory>/<key>.log. An index of byte offsets (8 bytes per
+    message) lets `page()` read older messages straight from the file.
+    Files are started fresh for each store.
+    """
+
+    def __init__(self, directory: str, capacity: int = 200):
+        self.directory = directory
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.buffers: Dict[str, Deque[str]] = {}
+        self.offsets: Dict[str, array] = {}
+        self.ends: Dict[str, int] = {}
+        self.files: Dict[str, object] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        name = re.sub(r"[^\w.-]+", "_", key) or "_run"
+        return os.path.join(self.directory, f"{name}.log")
+
+    def append(self, key: str, message: str):
+        data = message.encode("utf-8") + b"\n"
+        with self.lock:
+            if key not in self.offsets:
+                self.files[key] = open(self.path(key), "wb")
+                self.buffers[key] = deque(maxlen=self.capacity)
+                self.offsets[key] = array("Q")
+                self.ends[key] = 0
+            elif key not in self.files:
+                # Appending after close()
+                self.files[key] = open(self.path(key), "ab")
+            f = self.files[key]
+            self.offsets[key].append(self.ends[key])
+            f.write(data)
+            f.flush()
+            self.ends[key] += len(data)
+            self.buffers[key].append(message)
+
+    def count(self, key: str) -> int:
+        with self.lock:
+            return len(self.offsets.get(key, ()))
+
+    def page(self, key: str, page: int = 0, page_size: int = 50) -> List[str]:
+        """
+        Messages of one page in chronological order; page 0 holds the newest.
+        """
+        with self.lock:
+            offsets = self.offsets.get(key)
+            if not offsets:
+                return []
+            total = len(offsets)
+            end = max(0, total - page * page_size)
+            start = max(0, end - page_size)
+            buffer = self.buffers[key]
+            first_buffered = total - len(buffer)
+            if start >= first_buffered:
+                return [buffer[i - first_buffered] for i in range(start, end)]
+            begin = offsets[start]
+            stop = offsets[end] if end < total else self.ends[key]
+            bounds = [offsets[i] - begin for i in range(start, end)] + [stop - begin]
+        with open(self.path(key), "rb") as f:
+            f.seek(begin)
+            data = f.read(stop - begin)
+        # Each message ends with the newline separator
+        return [data[bounds[i]:bounds[i + 1] - 1].decode("utf-8", errors="replace") for i in range(len(bounds) - 1)]
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files = {}
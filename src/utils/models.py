@@ -1,7 +1,6 @@
 import os
-import openai
-from google import genai
 from dotenv import load_dotenv
+from src.llm.connections import get_client, provider_endpoint
 
 load_dotenv()
 
@@ -16,7 +15,7 @@ def get_available_models(provider: str) -> list[str]:
         if provider == "openai":
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key: return ["gpt-4o", "gpt-4-turbo", "gpt-3.5-turbo"]
-            client = openai.OpenAI(api_key=api_key)
+            client = get_client(provider, *provider_endpoint(provider))
             models = client.models.list()
             # Filter for likely chat models to reduce noise
             return sorted([m.id for m in models.data if "gpt" in m.id])
@@ -34,7 +33,7 @@ def get_available_models(provider: str) -> list[str]:
         elif provider == "gemini":
             api_key = os.getenv("GEMINI_API_KEY")
             if not api_key: return ["gemini-1.5-pro", "gemini-1.5-flash"]
-            client = genai.Client(api_key=api_key)
+            client = get_client(provider, *provider_endpoint(provider))
             models = client.models.list()
             # Filter for generateContent support
             return sorted([m.name.replace("models/", "") for m in models if m.supported_actions and "generateContent" in m.supported_actions])
@@ -42,10 +41,7 @@ def get_available_models(provider: str) -> list[str]:
         elif provider == "deepseek":
             api_key = os.getenv("DEEPSEEK_API_KEY")
             if not api_key: return ["deepseek-chat", "deepseek-coder"]
-            client = openai.OpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com"
-            )
+            client = get_client(provider, *provider_endpoint(provider))
             models = client.models.list()
             return sorted([m.id for m in models.data])
 
@@ -56,10 +52,7 @@ def get_available_models(provider: str) -> list[str]:
             api_key = os.getenv("OPENROUTER_API_KEY")
             if not api_key: return ["openai/gpt-4o", "anthropic/claude-3.5-sonnet", "google/gemini-pro-1.5"]
             
-            client = openai.OpenAI(
-                api_key=api_key,
-                base_url="https://openrouter.ai/api/v1"
-            )
+            client = get_client(provider, *provider_endpoint(provider))
             models = client.models.list()
             # OpenRouter IDs are like "vendor/model-name"
             return sorted([m.id for m in models.data])
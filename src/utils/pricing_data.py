@@ -105,11 +105,33 @@ MODEL_DATA = {
     }
 }
 
+# Share of the input price billed for prompt-cache reads, per provider.
+# A model entry can override this with an explicit "cached_input_price".
+CACHED_INPUT_FACTOR = {
+    "google_gemini": 0.25,
+    "openai": 0.5,
+    "anthropic_claude": 0.1,
+    "openrouter": 0.5,
+    "deepseek": 0.1
+}
+
+# Multiple of the input price billed for prompt-cache writes, per provider
+# (Anthropic's 5-minute cache). A model entry can override this with an
+# explicit "cache_write_price".
+CACHE_WRITE_FACTOR = {
+    "anthropic_claude": 1.25
+}
+
+# Batch APIs (OpenAI, Anthropic) bill at half the regular rate
+BATCH_PRICE_FACTOR = 0.5
+
 # Flatten for easy lookup by ID
 PRICING_REGISTRY = {}
 for provider, models in MODEL_DATA.items():
     for model_id, data in models.items():
         PRICING_REGISTRY[model_id] = {
             "input": data["input_price"],
-            "output": data["output_price"]
+            "output": data["output_price"],
+            "cached_input": data.get("cached_input_price", data["input_price"] * CACHED_INPUT_FACTOR.get(provider, 1.0)),
+            "cache_write": data.get("cache_write_price", data["input_price"] * CACHE_WRITE_FACTOR.get(provider, 1.0))
         }
@@ -1,4 +1,94 @@
 import re
+from functools import lru_cache
+
+# Common German/Latin words where ue/ae/oe should NOT be converted
+# This list can be expanded as needed.
+UMLAUT_EXCEPTIONS = [
+    "manuelle", "aktuell", "quelle", "eventuell", "individuell",
+    "statuen", "neue", "abenteuer", "treue", "feuer", "steuer",
+    "sequenz", "konsequenz", "frequenz", "eloquent",
+    "virtuell", "visuell", "kontextuell", "sexuell", "intellektuell",
+    "audio", "video", "duell", "flue", "qüe", "qüelle"
+]
+UMLAUTS = {"ae": "ä", "oe": "ö", "ue": "ü", "Ae": "Ä", "Oe": "Ö", "Ue": "Ü"}
+
+# Words containing 'qu' or an exception are left alone (matched on the lowercased word)
+_EXCEPTION = re.compile("|".join(["qu"] + sorted(map(re.escape, UMLAUT_EXCEPTIONS), key=len, reverse=True)))
+_SZ = str.maketrans({"ß": "ss", "ẞ": "SS"})
+_DASHES = str.maketrans({"—": "-"})
+# Only words that may change: with an umlaut candidate (or ß), plus em dashes
+_UMLAUT_WORD = re.compile(r"\b\w*?[aouAOU]e\w*")
+_TOKEN = re.compile(r"\b\w*?(?:[aouAOU]e|[ßẞ])\w*|—")
+# What may still change when more text follows: a trailing (partial) word,
+# and trailing whitespace/quotes that get stripped if the text ends there
+_STREAM_TAIL = re.compile(r'[\s"]*\w*\Z')
+
+# Drafts repeat the same words a lot
+@lru_cache(maxsize=8192)
+def _umlauts(word: str) -> str:
+    if _EXCEPTION.search(word.lower()):
+        return word
+    # Patterns cannot overlap, so plain replaces are safe (and cheaper on one word)
+    for old, new in UMLAUTS.items():
+        word = word.replace(old, new)
+    return word
+
+@lru_cache(maxsize=8192)
+def _fix_token(token: str) -> str:
+    if token == "—":
+        return "-"
+    return _umlauts(token.translate(_SZ))
+
+def _fix_words(text: str) -> str:
+    return _TOKEN.sub(lambda m: _fix_token(m.group(0)), text)
+
+def _strip_quotes(text: str) -> str:
+    text = text.strip()
+    if text.startswith('"') and text.endswith('"'):
+        text = text[1:-1]
+    return text.strip()
+
+def clean_text(text: str) -> str:
+    """
+    The full post-processing of a finished task in one pass:
+    clean_ai_artifacts, replace_sz and restore_umlauts.
+    """
+    if not text:
+        return ""
+    return _fix_words(_strip_quotes(text))
+
+class StreamCleaner:
+    """
+    clean_text for token deltas. feed() returns the cleaned text that can no
+    longer change, finish() the rest; together they equal clean_text() of
+    the whole stream. A draft starting with a quote is held back until
+    finish(), since only its end decides whether the quotes are removed.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.started = False
+        self.quoted = False
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        if not self.started:
+            self.buffer = self.buffer.lstrip()
+            if not self.buffer:
+                return ""
+            self.started = True
+            self.quoted = self.buffer.startswith('"')
+        if self.quoted:
+            return ""
+        cut = _STREAM_TAIL.search(self.buffer).start()
+        ready, self.buffer = self.buffer[:cut], self.buffer[cut:]
+        return _fix_words(ready)
+
+    def finish(self) -> str:
+        rest, self.buffer = self.buffer, ""
+        if self.quoted:
+            return clean_text(rest)
+        return _fix_words(rest.rstrip())
 
 def replace_sz(text: str) -> str:
     """
@@ -6,7 +96,7 @@ def replace_sz(text: str) -> str:
     """
     if not text:
         return ""
-    return text.replace("ß", "ss").replace("ẞ", "SS")
+    return text.translate(_SZ)
 
 def restore_umlauts(text: str) -> str:
     """
@@ -15,46 +105,7 @@ def restore_umlauts(text: str) -> str:
     """
     if not text:
         return ""
-    
-    # List of common German/Latin words where ue/ae/oe should NOT be converted
-    # This list can be expanded as needed.
-    exceptions = [
-        "manuelle", "aktuell", "quelle", "eventuell", "individuell",
-        "statuen", "neue", "abenteuer", "treue", "feuer", "steuer",
-        "sequenz", "konsequenz", "frequenz", "eloquent",
-        "virtuell", "visuell", "kontextuell", "sexuell", "intellektuell",
-        "audio", "video", "duell", "flue", "qüe", "qüelle"
-    ]
-    
-    # Simple replacement map
-    mapping = {"ae": "ä", "oe": "ö", "ue": "ü", "Ae": "Ä", "Oe": "Ö", "Ue": "Ü"}
-    
-    # Better approach: split into words, check exceptions, then re-join
-    words = re.split(r'(\W+)', text)
-    processed_words = []
-    
-    for word in words:
-        low_word = word.lower()
-        # Skip if word is in exceptions or contains 'qu'
-        is_exception = False
-        if "qu" in low_word:
-            is_exception = True
-        else:
-            for exc in exceptions:
-                if exc in low_word:
-                    is_exception = True
-                    break
-        
-        if is_exception:
-            processed_words.append(word)
-        else:
-            # Apply mapping
-            new_word = word
-            for old, new in mapping.items():
-                new_word = new_word.replace(old, new)
-            processed_words.append(new_word)
-            
-    return "".join(processed_words)
+    return _UMLAUT_WORD.sub(lambda m: _umlauts(m.group(0)), text)
 
 def clean_ai_artifacts(text: str) -> str:
     """
@@ -62,12 +113,4 @@ def clean_ai_artifacts(text: str) -> str:
     """
     if not text:
         return ""
-    
-    text = text.replace(" — ", " - ")
-    text = text.replace("—", "-")
-    
-    text = text.strip()
-    if text.startswith('"') and text.endswith('"'):
-        text = text[1:-1]
-        
-    return text.strip()
+    return _strip_quotes(text.translate(_DASHES))
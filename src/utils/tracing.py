@@ -0,0 +1,173 @@
+import os
+import math
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Innermost open span of the current thread / asyncio task
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float  # unix time
+    end: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: str = ""
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_s": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class Tracer:
+    """
+    Collects nested timing spans (LLM calls, loading, DOCX steps) of a run.
+    Spans nest across threads and asyncio tasks via contextvars.
+    Export as JSONL or as OTLP/JSON (readable by the OpenTelemetry
+    collector's otlpjsonfile receiver, Jaeger, etc.).
+    """
+
+    def __init__(self, service_name: str = "ailb-agent"):
+        self.service_name = service_name
+        self.lock = threading.Lock()
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Span] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=self.trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attributes=dict(attributes),
+        )
+        token = _current_span.set(span)
+        perf_start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end = span.start + (time.perf_counter() - perf_start)
+            _current_span.reset(token)
+            with self.lock:
+                self.spans.append(span)
+
+    def reset(self):
+        with self.lock:
+            self.spans = []
+            self.trace_id = uuid.uuid4().hex
+
+    # --- Summary ---
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per span name: count, errors, total and p50/p95/p99 of the duration in seconds.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        by_name: Dict[str, List[Span]] = {}
+        for span in spans:
+            by_name.setdefault(span.name, []).append(span)
+        stats = {}
+        for name, group in sorted(by_name.items()):
+            durations = sorted(s.duration for s in group)
+            stats[name] = {
+                "count": len(group),
+                "errors": sum(1 for s in group if s.error),
+                "total": sum(durations),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "p99": percentile(durations, 99),
+            }
+        return stats
+
+    def format_summary(self) -> str:
+        lines = [f"{'phase':<18}{'count':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'total':>10}"]
+        for name, s in self.summary().items():
+            lines.append(f"{name:<18}{s['count']:>7}{s['errors']:>5}{s['p50']:>8.2f}s{s['p95']:>8.2f}s{s['p99']:>8.2f}s{s['total']:>9.1f}s")
+        return "\n".join(lines)
+
+    # --- Export ---
+
+    def export_jsonl(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in sorted(spans, key=lambda s: s.start):
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False) + "\n")
+
+    def export_otlp(self, path: str):
+        """
+        Writes the spans as one OTLP/JSON ExportTraceServiceRequest.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        otlp_spans = []
+        for span in spans:
+            otlp = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(int(span.start * 1e9)),
+                "endTimeUnixNano": str(int(span.end * 1e9)),
+                "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp)
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "src.utils.tracing"}, "spans": otlp_spans}],
+        }]}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)